@@ -1,31 +1,68 @@
 import sys
-import shutil
-from pathlib import Path
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from typing import Optional, List, Dict
-from .schemas import QueryRequest
+from .schemas import QueryRequest, BatchQueryRequest
+from .middleware import TracingMiddleware
+from .uploads import StreamingUploadReceiver, commit_upload, discard_uploads, upload_path
+
+_IMPORT_STARTED = time.perf_counter()
 
 from loguru import logger
 from neo4j import AsyncGraphDatabase
-from langchain_google_genai import ChatGoogleGenerativeAI
-import chromadb
-from chromadb.utils import embedding_functions
-
 
+# Modul berat (ChromaDB, LangChain, sentence-transformers, stack parsing/OCR) diimpor di
+# dalam `lifespan`, sehingga waktu impornya tercatat dan replika kueri tidak memuat stack ingesti.
 from config import (
     NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD,
-    CHROMA_DB_PATH, LLM_MODEL_NAME, GOOGLE_API_KEY, EMBEDDING_MODEL_NAME
+    CHROMA_DB_PATH, LLM_MODEL_NAME, GOOGLE_API_KEY, EMBEDDING_MODEL_NAME,
+    INGESTION_ENABLED, EMBEDDING_WARMUP_ENABLED, EMBEDDING_SERVER_ENABLED, EMBEDDING_SERVER_SOCKET,
+    INGESTION_WORKERS, JOB_QUEUE_MAX_PENDING, BATCH_QUERY_MAX_ITEMS,
+    METRICS_ENABLED, UPLOAD_MAX_FILES, VECTOR_INDEX_LAYOUT
 )
-from ingestion.pipeline import process_document
-from retrieval.hybrid_retriever import get_answer
-from ingestion.ocr_config import configure_tesseract
+from core.job_queue import job_queue, QueueFullError
+from ingestion.graph_builder import ensure_neo4j_schema
+from core.embedding_service import BatchingEmbeddingFunction, LazyEmbeddingFunction
+from core.metrics import registry as metrics_registry
+from core.vector_store import unmigrated_chunk_count
+from core.llm_gateway import llm_gateway
+from retrieval.retrieval_cache import retrieval_cache
+from retrieval.graph_cache import graph_cache
+from retrieval.history_compactor import history_compactor
+from ingestion.parse_cache import parse_cache
+from retrieval.hybrid_retriever import get_answer, stream_answer, speculation_stats
+from retrieval.batch_retriever import get_answers_batch
+
+_IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
 
 logger.remove()
 logger.add(sys.stderr, level="INFO")
 logger.add("logs/backend.log", rotation="10 MB", level="DEBUG")
 
+@contextmanager
+def _timed(timings: Dict[str, float], component: str):
+    """Mencatat durasi satu komponen startup (dalam milidetik) ke `timings`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[component] = round((time.perf_counter() - started) * 1000, 1)
+
+async def _warm_up_embedding(embedding_function):
+    """
+    Memuat model embedding (atau memastikan server model dapat dihubungi) di background.
+    Kegagalan model lokal sudah dicatat oleh `load()`.
+    """
+    try:
+        await asyncio.to_thread(embedding_function.load)
+    except Exception:
+        pass
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -35,41 +72,132 @@ async def lifespan(app: FastAPI):
     sumber daya seperti koneksi database dan model AI diinisialisasi sekali saat
     startup dan dibersihkan dengan benar saat shutdown. Ini mencegah kebocoran
     sumber daya dan memastikan aplikasi selalu dalam keadaan siap.
+
+    Model embedding tidak ditunggu saat startup: model dimuat dan dipanaskan di background,
+    dan `/readyz` melaporkan kapan aplikasi siap menerima kueri. Durasi setiap komponen
+    startup dicatat di log dan tersedia di `/readyz`.
     """
     logger.info("Startup Aplikasi: Menginisialisasi semua sumber daya...")
+    startup_timings = {"imports": _IMPORT_MS}
+    app.state.startup_timings = startup_timings
+    app.state.startup_error = None
+    app.state.worker_pool = None
+    app.state.ingestion_tasks = []
+    app.state.warmup_task = None
+    started = time.perf_counter()
     try:
-        # 1. Konfigurasi Tesseract OCR
-        configure_tesseract()
-        logger.info("Konfigurasi Tesseract OCR berhasil.")
+        # 1. Konfigurasi Tesseract OCR (hanya pada replika yang menjalankan ingesti)
+        if INGESTION_ENABLED:
+            with _timed(startup_timings, "ocr"):
+                from ingestion.ocr_config import configure_tesseract
+                configure_tesseract()
+            logger.info("Konfigurasi Tesseract OCR berhasil.")
 
         # 2. Inisialisasi Driver Neo4j
-        app.state.neo4j_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
-        await app.state.neo4j_driver.verify_connectivity()
-        logger.info("Driver Neo4j berhasil diinisialisasi dan koneksi terverifikasi.")
+        with _timed(startup_timings, "neo4j"):
+            app.state.neo4j_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+            await app.state.neo4j_driver.verify_connectivity()
+            logger.info("Driver Neo4j berhasil diinisialisasi dan koneksi terverifikasi.")
+            await ensure_neo4j_schema(app.state.neo4j_driver)
 
         # 3. Inisialisasi Klien ChromaDB
-        app.state.chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        logger.info(f"Klien ChromaDB diinisialisasi dari path: {CHROMA_DB_PATH}")
+        with _timed(startup_timings, "chroma"):
+            import chromadb
+            app.state.chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+            unmigrated = await asyncio.to_thread(unmigrated_chunk_count, app.state.chroma_client)
+        logger.info(f"Klien ChromaDB diinisialisasi dari path: {CHROMA_DB_PATH} (tata letak indeks: {VECTOR_INDEX_LAYOUT})")
+        if unmigrated:
+            logger.warning(
+                f"{unmigrated} chunk masih tersimpan dalam tata letak lain dan tidak ikut dicari. "
+                f"Jalankan `python -m core.vector_store --to {VECTOR_INDEX_LAYOUT}` untuk memindahkannya."
+            )
 
         # 4. Inisialisasi Model AI
-        app.state.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL_NAME)
-        app.state.chat_model = ChatGoogleGenerativeAI(model=LLM_MODEL_NAME, google_api_key=GOOGLE_API_KEY, temperature=0.1)
+        # Model embedding dibungkus layanan batching agar teks dari seluruh permintaan
+        # yang berjalan bersamaan diproses dalam micro-batch di thread worker. Model itu
+        # sendiri baru dimuat oleh warm-up di background atau saat pertama kali dipakai.
+        # Dengan EMBEDDING_SERVER_ENABLED, model dipegang oleh server model bersama di host ini
+        # (batching dilakukan di sana untuk seluruh worker), sehingga tidak dimuat di proses ini.
+        with _timed(startup_timings, "embedding"):
+            if EMBEDDING_SERVER_ENABLED:
+                from core.model_server import RemoteEmbeddingFunction
+                app.state.base_embedding_function = RemoteEmbeddingFunction(EMBEDDING_SERVER_SOCKET)
+                app.state.embedding_function = app.state.base_embedding_function
+                logger.info(f"Memakai server model embedding di '{EMBEDDING_SERVER_SOCKET}'.")
+            else:
+                from chromadb.utils import embedding_functions
+                app.state.base_embedding_function = LazyEmbeddingFunction(
+                    lambda: embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL_NAME)
+                )
+                app.state.embedding_function = BatchingEmbeddingFunction(app.state.base_embedding_function)
+        if EMBEDDING_WARMUP_ENABLED:
+            app.state.warmup_task = asyncio.create_task(_warm_up_embedding(app.state.base_embedding_function))
+        with _timed(startup_timings, "chat_model"):
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            app.state.chat_model = ChatGoogleGenerativeAI(model=LLM_MODEL_NAME, google_api_key=GOOGLE_API_KEY, temperature=0.1)
         logger.info("Model AI (Embedding dan Chat) berhasil diinisialisasi.")
 
+        # 5. Antrean Ingesti
+        # Job yang ditinggalkan prosesnya (lease habis atau pemiliknya mati) dikembalikan ke
+        # antrean saat startup dan secara berkala sesudahnya; job milik worker uvicorn lain
+        # yang masih hidup tidak disentuh. Tahap parse/extract/chunk dijalankan oleh proses
+        # worker terpisah; tahap indeksasi dijalankan di proses ini. Dengan INGESTION_WORKERS=0, seluruh tahap berjalan di sini.
+        # Replika khusus kueri (INGESTION_ENABLED=false) melewati langkah ini sepenuhnya.
+        app.state.ingestion_stopping = False
+        if INGESTION_ENABLED:
+            with _timed(startup_timings, "ingestion"):
+                from ingestion.worker import IngestionWorkerPool, index_loop, recovery_loop, worker_loop
+
+                await asyncio.to_thread(job_queue.recover)
+                should_stop = lambda: app.state.ingestion_stopping
+                app.state.ingestion_tasks.append(asyncio.create_task(recovery_loop(should_stop)))
+                if INGESTION_WORKERS > 0:
+                    app.state.worker_pool = IngestionWorkerPool(INGESTION_WORKERS)
+                    app.state.worker_pool.start()
+                else:
+                    app.state.ingestion_tasks.append(asyncio.create_task(
+                        worker_loop("api-inline", app.state.neo4j_driver, app.state.chat_model, should_stop)
+                    ))
+                app.state.ingestion_tasks.append(asyncio.create_task(index_loop(
+                    app.state.chroma_client,
+                    app.state.embedding_function,
+                    should_stop,
+                    on_idle=app.state.worker_pool.ensure_alive if app.state.worker_pool else None
+                )))
+            logger.info("Antrean ingesti berhasil diinisialisasi.")
+        else:
+            logger.info("Replika khusus kueri: stack ingesti tidak dimuat.")
+
     except Exception as e:
         logger.critical(f"GAGAL TOTAL SAAT STARTUP: {e}", exc_info=True)
+        app.state.startup_error = str(e)
         # Reset state jika terjadi kegagalan untuk mencegah kondisi tidak menentu
         app.state.neo4j_driver = None
         app.state.chroma_client = None
         app.state.embedding_function = None
         app.state.chat_model = None
 
+    startup_timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    breakdown = ", ".join(f"{component}: {ms} ms" for component, ms in startup_timings.items() if component != "total")
+    logger.info(f"Startup selesai dalam {startup_timings['total']} ms ({breakdown}).")
+
     yield
 
     logger.info("Shutdown Aplikasi: Menutup koneksi dan membersihkan sumber daya...")
+    app.state.ingestion_stopping = True
+    for task in getattr(app.state, 'ingestion_tasks', []):
+        task.cancel()
+    if getattr(app.state, 'worker_pool', None):
+        await asyncio.to_thread(app.state.worker_pool.stop)
     if hasattr(app.state, 'neo4j_driver') and app.state.neo4j_driver:
         await app.state.neo4j_driver.close()
         logger.info("Koneksi driver Neo4j berhasil ditutup.")
+    if getattr(app.state, 'embedding_function', None):
+        app.state.embedding_function.close()
+        logger.info("Layanan embedding berhasil dihentikan.")
+    if INGESTION_ENABLED:
+        from ingestion.parser import shutdown_parser_pool
+        shutdown_parser_pool()
     logger.info("Pembersihan sumber daya selesai.")
 
 app = FastAPI(title="CogniGraph RAG API", lifespan=lifespan)
@@ -81,54 +209,230 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
+)
+app.add_middleware(TracingMiddleware)
+
+def _cache_stats() -> Dict[str, dict]:
+    retrieval = retrieval_cache.stats()
+    return {
+        "query_embedding": retrieval["query_embeddings"],
+        "search_results": retrieval["search_results"],
+        "parse": parse_cache.stats(),
+        "graph": graph_cache.stats(),
+        **({"llm_prompt": llm_gateway.cache.stats()} if llm_gateway.cache is not None else {})
+    }
+
+def _hit_ratio(stats: dict) -> float:
+    total = stats["hits"] + stats["misses"]
+    return stats["hits"] / total if total else 0.0
+
+# Metrik yang nilainya sudah dihitung di tempat lain dibaca saat `/metrics` di-scrape,
+# sehingga tidak menambah biaya apa pun di jalur permintaan.
+metrics_registry.callback(
+    "cognigraph_ingestion_jobs", "Jumlah job ingesti per status.",
+    job_queue.counts, ["status"]
 )
+metrics_registry.callback(
+    "cognigraph_ingestion_workers_alive", "Jumlah proses worker ingesti yang hidup.",
+    lambda: app.state.worker_pool.alive() if getattr(app.state, "worker_pool", None) else 0
+)
+metrics_registry.callback(
+    "cognigraph_embedding_queue_depth", "Jumlah teks yang menunggu di antrean embedding proses ini.",
+    lambda: getattr(getattr(app.state, "embedding_function", None), "pending", 0)
+)
+metrics_registry.callback(
+    "cognigraph_cache_hits_total", "Jumlah hit per cache.",
+    lambda: {name: stats["hits"] for name, stats in _cache_stats().items()}, ["cache"], metric_type="counter"
+)
+metrics_registry.callback(
+    "cognigraph_cache_misses_total", "Jumlah miss per cache.",
+    lambda: {name: stats["misses"] for name, stats in _cache_stats().items()}, ["cache"], metric_type="counter"
+)
+metrics_registry.callback(
+    "cognigraph_cache_hit_ratio", "Proporsi hit per cache sejak proses dimulai.",
+    lambda: {name: _hit_ratio(stats) for name, stats in _cache_stats().items()}, ["cache"]
+)
+metrics_registry.callback(
+    "cognigraph_history_tokens_total", "Jumlah token riwayat percakapan sebelum dan sesudah dipadatkan.",
+    lambda: {kind: history_compactor.stats()[f"{kind}_tokens"] for kind in ("original", "compacted")}, ["kind"], metric_type="counter"
+)
+metrics_registry.callback(
+    "cognigraph_speculation_total", "Jumlah giliran percakapan per outcome retrieval spekulatif.",
+    lambda: dict(speculation_stats.counts), ["outcome"], metric_type="counter"
+)
+metrics_registry.callback(
+    "cognigraph_llm_coalesced_total", "Jumlah panggilan LLM yang digabung dengan panggilan identik yang sedang berjalan.",
+    lambda: llm_gateway.coalesced, metric_type="counter"
+)
+metrics_registry.callback(
+    "cognigraph_llm_in_flight", "Jumlah panggilan LLM yang sedang berjalan per kelas.",
+    lambda: dict(llm_gateway.in_flight), ["call_class"]
+)
+metrics_registry.callback(
+    "cognigraph_llm_waiting", "Jumlah panggilan LLM yang menunggu slot konkurensi atau token rate limit per kelas.",
+    lambda: dict(llm_gateway.waiting), ["call_class"]
+)
+
+async def _ingest_uploads(request: Request, max_files: int) -> List[dict]:
+    """
+    Menerima file dari body permintaan secara streaming lalu menjadwalkan ingestinya.
+
+    File yang isinya identik (hash SHA-256 sama) dengan versi terakhir dokumen bernama sama
+    yang belum gagal tidak diingesti ulang; job sebelumnya dikembalikan dengan
+    `duplicate: true`. File lain dipindahkan ke `UPLOAD_DIR/<sha256>/<filename>` dan seluruh
+    job-nya dimasukkan ke antrean dalam transaksi yang sama dengan pemeriksaan duplikatnya.
+    """
+    if not INGESTION_ENABLED:
+        raise HTTPException(status_code=503, detail="Ingesti dinonaktifkan pada server ini. Unggah dokumen melalui server ingesti.")
+
+    # Menolak lebih awal sebelum membaca body jika antrean sudah penuh.
+    if await asyncio.to_thread(job_queue.active_count) >= JOB_QUEUE_MAX_PENDING:
+        raise _queue_full_error()
+
+    uploads = await StreamingUploadReceiver(request, max_files).receive()
+    filenames = [upload.filename for upload in uploads]
+    if len(set(filenames)) != len(filenames):
+        await asyncio.to_thread(discard_uploads, uploads)
+        raise HTTPException(status_code=400, detail="Nama file dalam satu unggahan harus unik.")
 
-@app.post("/uploadfile/", summary="Unggah dan Proses Dokumen")
-async def create_upload_file(request: Request, file: UploadFile, background_tasks: BackgroundTasks):
+    def commit_new(indices: List[int]):
+        for i in indices:
+            commit_upload(uploads[i])
+
+    def schedule() -> List[dict]:
+        # Pemeriksaan duplikat dan penyisipan job berjalan dalam satu transaksi antrean; file
+        # dipindahkan ke path khusus hash-nya di dalam transaksi itu, sebelum job terlihat worker.
+        scheduled = job_queue.enqueue_changed(
+            [(upload.filename, str(upload_path(upload)), upload.content_hash) for upload in uploads],
+            before_insert=commit_new
+        )
+        results = []
+        for upload, (job, duplicate) in zip(uploads, scheduled):
+            if duplicate:
+                upload.temp_path.unlink(missing_ok=True)
+            results.append({**job, "duplicate": duplicate})
+        return results
+
+    try:
+        jobs = await asyncio.to_thread(schedule)
+    except QueueFullError:
+        await asyncio.to_thread(discard_uploads, uploads)
+        raise _queue_full_error()
+    except Exception as e:
+        await asyncio.to_thread(discard_uploads, uploads)
+        logger.error(f"Gagal menjadwalkan proses untuk {filenames}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Tidak dapat menyimpan atau memproses file: {str(e)}")
+
+    responses = []
+    for upload, job in zip(uploads, jobs):
+        if job["duplicate"]:
+            logger.info(f"File '{upload.filename}' identik dengan versi terakhirnya (job {job['id']}); ingesti dilewati.")
+            message = "Isi file identik dengan versi yang sudah diunggah; ingesti ulang dilewati."
+        else:
+            logger.info(f"File '{upload.filename}' ({upload.size} bytes) disimpan; job ingesti {job['id']} dimasukkan ke antrean.")
+            message = "File berhasil diunggah dan proses ingesti telah dijadwalkan."
+        responses.append({
+            "filename": upload.filename,
+            "job_id": job["id"],
+            "status": job["status"],
+            "size": upload.size,
+            "content_hash": upload.content_hash,
+            "duplicate": job["duplicate"],
+            "message": message
+        })
+    return responses
+
+# Body dibaca langsung oleh `StreamingUploadReceiver`; `openapi_extra` hanya mendokumentasikan
+# bentuk form-nya di OpenAPI.
+def _upload_openapi(field: str, multiple: bool) -> dict:
+    file_schema = {"type": "string", "format": "binary"}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {field: {"type": "array", "items": file_schema} if multiple else file_schema},
+        "required": [field]
+    }}}}}
+
+@app.post("/uploadfile/", summary="Unggah dan Proses Dokumen", openapi_extra=_upload_openapi("file", multiple=False))
+async def create_upload_file(request: Request):
     """
-    Menerima unggahan file, menyimpannya, dan memulai proses ingesti di latar belakang.
+    Menerima unggahan file, menyimpannya, dan memasukkannya ke antrean ingesti.
 
     Proses ingesti (parsing, ekstraksi graph, vektorisasi) adalah operasi yang intensif.
-    Dengan menjalankannya sebagai background task, endpoint ini dapat segera mengembalikan
-    respons ke klien tanpa harus menunggu seluruh proses selesai.
+    Job dimasukkan ke antrean persisten dan dikerjakan oleh worker di proses terpisah,
+    sehingga endpoint ini segera mengembalikan respons dan lonjakan unggahan tidak
+    memperlambat kueri. Progres job dapat dipantau melalui `GET /jobs/{job_id}`.
+
+    File diterima secara streaming (ditulis ke disk dan di-hash di thread terpisah). Jika
+    isinya identik dengan versi terakhir dokumen bernama sama, ingesti dilewati dan job
+    sebelumnya dikembalikan dengan `duplicate: true`.
 
     Args:
-        request (Request): Objek request FastAPI.
-        file (UploadFile): File yang diunggah oleh pengguna.
-        background_tasks (BackgroundTasks): Mekanisme FastAPI untuk tugas latar belakang.
+        request (Request): Objek request FastAPI berisi satu file (field `file`).
 
     Returns:
-        dict: Konfirmasi bahwa file telah diterima dan proses dimulai.
+        dict: Konfirmasi bahwa file telah diterima beserta ID job ingestinya.
+
+    Raises:
+        HTTPException: 413 jika file melebihi batas ukuran, 429 jika antrean ingesti sedang
+            penuh, 503 jika ingesti dinonaktifkan pada replika ini (`INGESTION_ENABLED=false`).
     """
-    # Sanitasi nama file untuk keamanan, hanya menggunakan nama file dasar.
-    sanitized_filename = Path(file.filename).name
-    upload_dir = Path("data/uploads")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    file_path = upload_dir / sanitized_filename
+    return (await _ingest_uploads(request, max_files=1))[0]
 
-    try:
-        # Menyimpan file yang diunggah ke direktori lokal.
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.info(f"File '{sanitized_filename}' berhasil disimpan di '{file_path}'")
-
-        # Menjadwalkan tugas ingesti dokumen untuk berjalan di latar belakang.
-        # Semua state yang dibutuhkan (koneksi DB, model) diambil dari app.state.
-        background_tasks.add_task(
-            process_document,
-            file_path=str(file_path),
-            neo4j_driver=request.app.state.neo4j_driver,
-            chroma_client=request.app.state.chroma_client,
-            embedding_function=request.app.state.embedding_function,
-            llm_model=request.app.state.chat_model
-        )
-        
-        logger.info(f"Proses ingesti untuk '{sanitized_filename}' telah dijadwalkan.")
-        return {"filename": sanitized_filename, "message": "File berhasil diunggah dan proses ingesti telah dimulai."}
+@app.post("/uploadfiles/", summary="Unggah dan Proses Beberapa Dokumen", openapi_extra=_upload_openapi("files", multiple=True))
+async def create_upload_files(request: Request):
+    """
+    Menerima beberapa file dalam satu permintaan dan memasukkan seluruhnya ke antrean ingesti.
 
-    except Exception as e:
-        logger.error(f"Gagal saat mengunggah atau menjadwalkan proses untuk '{sanitized_filename}': {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Tidak dapat menyimpan atau memproses file: {str(e)}")
+    Seluruh job dijadwalkan dalam satu transaksi: jika antrean tidak cukup untuk semua file
+    baru, permintaan ditolak seluruhnya dengan HTTP 429. File yang identik dengan versi
+    terakhirnya tidak dihitung dan tidak diingesti ulang.
+
+    Args:
+        request (Request): Objek request FastAPI berisi hingga `UPLOAD_MAX_FILES` file.
+
+    Returns:
+        dict: `{"files": [...]}` dengan satu entri per file, sesuai urutan unggahan.
+    """
+    return {"files": await _ingest_uploads(request, max_files=UPLOAD_MAX_FILES)}
+
+def _queue_full_error() -> HTTPException:
+    logger.warning("Antrean ingesti penuh, unggahan ditolak.")
+    return HTTPException(
+        status_code=429,
+        detail="Antrean ingesti sedang penuh. Silakan coba lagi beberapa saat lagi.",
+        headers={"Retry-After": "30"}
+    )
+
+@app.get("/jobs/{job_id}", summary="Status Job Ingesti")
+async def get_job_status(job_id: str):
+    """
+    Mengembalikan status job ingesti beserta progres per tahap (parse/extract/chunk/index).
+
+    Args:
+        job_id (str): ID job yang dikembalikan oleh `/uploadfile/`.
+
+    Returns:
+        dict: Data job, termasuk status, tahap saat ini, dan detail setiap tahap.
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' tidak ditemukan.")
+    return job
+
+@app.get("/jobs", summary="Daftar Job Ingesti")
+async def list_jobs(limit: int = 50):
+    """
+    Mengembalikan job ingesti terbaru dan jumlah job per status.
+
+    Returns:
+        dict: `{"counts": {...}, "jobs": [...]}`.
+    """
+    counts, jobs = await asyncio.gather(
+        asyncio.to_thread(job_queue.counts),
+        asyncio.to_thread(job_queue.recent, limit)
+    )
+    return {"counts": counts, "jobs": jobs}
 
 @app.post("/query/", summary="Ajukan Pertanyaan ke Dokumen")
 async def answer_query(request: Request, item: QueryRequest):
@@ -155,9 +459,199 @@ async def answer_query(request: Request, item: QueryRequest):
             chat_history=item.chat_history,
             chat_model=request.app.state.chat_model,
             chroma_client=request.app.state.chroma_client,
-            embedding_function=request.app.state.embedding_function
+            embedding_function=request.app.state.embedding_function,
+            neo4j_driver=request.app.state.neo4j_driver,
+            conversation_id=item.conversation_id
         )
         return {"answer": answer}
     except Exception as e:
         logger.error(f"Gagal memproses kueri '{item.query}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Terjadi kesalahan internal saat memproses permintaan Anda.")
+
+@app.post("/query/batch", summary="Ajukan Banyak Pertanyaan Sekaligus")
+async def answer_query_batch(request: Request, item: BatchQueryRequest):
+    """
+    Menjawab banyak pertanyaan dalam satu permintaan, misalnya untuk evaluasi massal.
+
+    Embedding seluruh pertanyaan dihitung dalam satu batch dan pencarian vektor dengan
+    filter file yang sama digabung menjadi satu panggilan ChromaDB. Formulasi ulang dan
+    pembangkitan jawaban berjalan konkuren dengan batas tertentu.
+
+    Args:
+        request (Request): Objek request FastAPI.
+        item (BatchQueryRequest): Daftar pertanyaan yang divalidasi oleh Pydantic.
+
+    Returns:
+        dict: `{"results": [...]}` dengan urutan yang sama seperti `queries`. Setiap hasil
+            memuat `answer`, atau `error` jika pertanyaan tersebut gagal diproses.
+    """
+    if len(item.queries) > BATCH_QUERY_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Jumlah pertanyaan melebihi batas {BATCH_QUERY_MAX_ITEMS} per permintaan.")
+
+    logger.info(f"Menerima kueri batch berisi {len(item.queries)} pertanyaan.")
+    try:
+        results = await get_answers_batch(
+            [
+                {"query": query.query, "filenames": query.filenames, "chat_history": query.chat_history, "conversation_id": query.conversation_id}
+                for query in item.queries
+            ],
+            chat_model=request.app.state.chat_model,
+            chroma_client=request.app.state.chroma_client,
+            embedding_function=request.app.state.embedding_function,
+            neo4j_driver=request.app.state.neo4j_driver
+        )
+        return {"results": results}
+    except Exception as e:
+        logger.error(f"Gagal memproses kueri batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Terjadi kesalahan internal saat memproses permintaan Anda.")
+
+def _format_sse(event: str, data: dict) -> str:
+    """Memformat satu event Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/query/stream", summary="Ajukan Pertanyaan dengan Jawaban Streaming")
+async def answer_query_stream(request: Request, item: QueryRequest):
+    """
+    Varian streaming dari `/query/` yang mengirim jawaban sebagai Server-Sent Events.
+
+    Event `context` (kueri hasil formulasi ulang dan ID chunk sumber) dikirim segera setelah
+    retrieval selesai, diikuti event `token` untuk setiap potongan jawaban dari LLM, dan
+    diakhiri event `done` berisi metadata waktu per tahap.
+
+    Args:
+        request (Request): Objek request FastAPI.
+        item (QueryRequest): Data permintaan yang divalidasi oleh Pydantic.
+
+    Returns:
+        StreamingResponse: Aliran `text/event-stream`.
+    """
+    logger.info(f"Menerima kueri (streaming): '{item.query}' pada dokumen: {item.filenames}")
+
+    async def event_stream():
+        try:
+            async for event, data in stream_answer(
+                query=item.query,
+                filenames=item.filenames,
+                chat_history=item.chat_history,
+                chat_model=request.app.state.chat_model,
+                chroma_client=request.app.state.chroma_client,
+                embedding_function=request.app.state.embedding_function,
+                neo4j_driver=request.app.state.neo4j_driver,
+                conversation_id=item.conversation_id
+            ):
+                yield _format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Gagal memproses kueri streaming '{item.query}': {e}", exc_info=True)
+            yield _format_sse("error", {"message": "Terjadi kesalahan internal saat memproses permintaan Anda."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stats/cache", summary="Statistik Cache")
+async def cache_stats():
+    """
+    Mengembalikan statistik hit/miss dari cache retrieval (embedding kueri dan hasil
+    pencarian vektor), cache parsing dokumen, cache graf, ringkasan riwayat percakapan
+    (termasuk ukuran prompt yang dihemat), dan gateway LLM (cache prompt, panggilan yang
+    digabung, serta panggilan yang berjalan/menunggu per kelas).
+
+    Returns:
+        dict: Statistik per cache.
+    """
+    return {"retrieval": retrieval_cache.stats(), "parsing": parse_cache.stats(), "graph": graph_cache.stats(), "history": history_compactor.stats(), "llm": llm_gateway.stats()}
+
+@app.get("/stats/speculation", summary="Statistik Retrieval Spekulatif")
+async def speculation_statistics():
+    """
+    Mengembalikan seberapa sering retrieval spekulatif dipakai pada percakapan lanjutan
+    (formulasi ulang dilewati, hasil spekulatif dipakai, atau retrieval diulang).
+
+    Returns:
+        dict: Jumlah per outcome dan proporsi giliran yang memakai jalur spekulatif.
+    """
+    return speculation_stats.stats()
+
+@app.get("/metrics", summary="Metrik Prometheus", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Mengekspor metrik proses ini dalam format teks Prometheus.
+
+    Berisi histogram durasi per tahap ingesti dan kueri serta per route HTTP, jumlah
+    panggilan dan token LLM per keperluan, kedalaman antrean ingesti dan embedding, serta
+    hit/miss cache. Tahap yang dijalankan proses worker ingesti ikut tercatat di sini
+    setelah job-nya selesai diindeks. Dengan beberapa worker uvicorn, setiap worker
+    memiliki metriknya sendiri (scrape per worker atau jumlahkan di Prometheus).
+    """
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrik dinonaktifkan (METRICS_ENABLED=false).")
+    # Dirender di thread terpisah karena sebagian metrik membaca SQLite (antrean ingesti).
+    body = await asyncio.to_thread(metrics_registry.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/healthz", summary="Liveness Probe")
+async def healthz():
+    """
+    Liveness probe: hanya memastikan proses dan event loop masih merespons.
+
+    Endpoint ini tidak memeriksa dependensi apa pun, sehingga tidak pernah gagal hanya
+    karena model masih dimuat atau database sedang tidak tersedia.
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz", summary="Readiness Probe")
+async def readyz(request: Request):
+    """
+    Readiness probe: memeriksa apakah aplikasi siap melayani kueri.
+
+    Aplikasi dianggap siap jika Neo4j dan ChromaDB dapat dihubungi, model chat sudah
+    dibuat, dan model embedding sudah dimuat (kecuali warm-up dinonaktifkan, di mana model
+    dimuat saat kueri pertama).
+
+    Returns:
+        JSONResponse: Status per komponen dan durasi startup; kode 503 jika belum siap.
+    """
+    state = request.app.state
+    checks = {}
+
+    async def check(name: str, probe):
+        try:
+            await asyncio.wait_for(probe(), timeout=5)
+            checks[name] = "ok"
+        except Exception as e:
+            checks[name] = f"error: {e}"
+
+    neo4j_driver = getattr(state, "neo4j_driver", None)
+    chroma_client = getattr(state, "chroma_client", None)
+    await asyncio.gather(
+        check("neo4j", neo4j_driver.verify_connectivity) if neo4j_driver else asyncio.sleep(0),
+        check("chroma", lambda: asyncio.to_thread(chroma_client.heartbeat)) if chroma_client else asyncio.sleep(0)
+    )
+    checks.setdefault("neo4j", "unavailable")
+    checks.setdefault("chroma", "unavailable")
+    checks["chat_model"] = "ok" if getattr(state, "chat_model", None) else "unavailable"
+
+    embedding = getattr(state, "base_embedding_function", None)
+    if embedding is None or getattr(state, "embedding_function", None) is None:
+        checks["embedding"] = "unavailable"
+    elif await asyncio.to_thread(lambda: embedding.loaded):
+        checks["embedding"] = "ok"
+    elif embedding.error:
+        checks["embedding"] = f"error: {embedding.error}"
+    else:
+        checks["embedding"] = "loading" if EMBEDDING_WARMUP_ENABLED else "deferred"
+
+    ready = all(status in ("ok", "deferred") for status in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "ingestion_enabled": INGESTION_ENABLED,
+            "startup_ms": getattr(state, "startup_timings", {}),
+            "embedding_load_ms": embedding.load_ms if embedding else None,
+            "startup_error": getattr(state, "startup_error", None)
+        }
+    )
@@ -0,0 +1,56 @@
+import time
+
+from config import METRICS_ENABLED, SERVER_TIMING_ENABLED, SERVER_TIMING_REQUEST_HEADER
+from core.metrics import http_request_duration, start_trace
+
+_REQUEST_ID_HEADER = b"x-request-id"
+_TIMING_HEADER = SERVER_TIMING_REQUEST_HEADER.encode("latin-1")
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI yang membuka trace untuk setiap permintaan HTTP.
+
+    ID korelasi diambil dari header `X-Request-ID` (atau dibuat baru) dan dikembalikan di
+    respons, sehingga baris log trace dapat dicocokkan dengan permintaan klien. Durasi
+    permintaan dicatat per route template (bukan path mentah) agar jumlah seri metrik tetap
+    kecil. Jika diminta, header `Server-Timing` berisi durasi tahap yang sudah selesai saat
+    header respons dikirim; untuk respons streaming, tahap pembangkitan tercatat di event
+    `done` dan di log trace, bukan di header.
+
+    Ditulis sebagai middleware ASGI murni (bukan `BaseHTTPMiddleware`) agar tidak menambah
+    task dan antrean per permintaan, dan agar durasi respons streaming terukur hingga akhir.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        request_id = headers.get(_REQUEST_ID_HEADER, b"").decode("latin-1")[:64] or None
+        server_timing = SERVER_TIMING_ENABLED or headers.get(_TIMING_HEADER, b"").lower() in (b"1", b"true")
+        started = time.perf_counter()
+        status = 500
+
+        with start_trace(f"{scope['method']} {scope['path']}", request_id) as trace:
+            async def send_with_headers(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    extra = [(_REQUEST_ID_HEADER, trace.trace_id.encode("latin-1"))]
+                    if server_timing:
+                        total_ms = round((time.perf_counter() - started) * 1000, 1)
+                        timing = ", ".join(filter(None, [trace.server_timing(), f"total;dur={total_ms}"]))
+                        extra.append((b"server-timing", timing.encode("latin-1")))
+                    message = {**message, "headers": [*message.get("headers", ()), *extra]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                http_request_duration.observe(time.perf_counter() - started, method=scope["method"], route=route, status=status)
@@ -18,7 +18,19 @@ class QueryRequest(BaseModel):
         filenames (List[str]): Daftar nama file yang akan dijadikan sumber konteks.
         chat_history (Optional[List[Dict[str, str]]]): Riwayat percakapan sebelumnya
             untuk mendukung pertanyaan lanjutan. Format: `[{"role": "user/assistant", "content": "..."}]`
+        conversation_id (Optional[str]): ID percakapan. Jika diisi, pesan-pesan lama di
+            `chat_history` diringkas secara inkremental di server alih-alih dikirim utuh ke LLM.
     """
     query: str
     filenames: List[str]
     chat_history: Optional[List[Dict[str, str]]] = None
+    conversation_id: Optional[str] = None
+
+class BatchQueryRequest(BaseModel):
+    """
+    Skema untuk validasi data pada endpoint /query/batch.
+
+    Attributes:
+        queries (List[QueryRequest]): Daftar pertanyaan yang dijawab sekaligus.
+    """
+    queries: List[QueryRequest]
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, List, Optional
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from config import UPLOAD_DIR, UPLOAD_MAX_FILE_BYTES, UPLOAD_MAX_REQUEST_BYTES, UPLOAD_MAX_FILES, UPLOAD_CHUNK_BYTES
+
+# Field non-file (jika ada) tidak dipakai, tetapi tetap dibatasi agar tidak menumpuk di memori.
+_MAX_FIELD_BYTES = 64 * 1024
+
+
+@dataclass
+class ReceivedUpload:
+    """
+    File yang sudah diterima utuh di direktori unggahan, sebelum dipindahkan ke nama akhirnya.
+
+    Attributes:
+        filename (str): Nama file dasar (tanpa komponen direktori) dari klien.
+        temp_path (Path): Lokasi file sementara di `UPLOAD_DIR`.
+        size (int): Ukuran file dalam bytes.
+        content_hash (str): Digest SHA-256 isi file (heksadesimal).
+    """
+    filename: str
+    temp_path: Path
+    size: int
+    content_hash: str
+
+
+@dataclass
+class _Part:
+    filename: Optional[str] = None
+    temp_path: Optional[Path] = None
+    file: Optional[BinaryIO] = None
+    size: int = 0
+    field_bytes: int = 0
+    buffer: bytearray = field(default_factory=bytearray)
+    hasher: Any = field(default_factory=hashlib.sha256)
+
+
+class StreamingUploadReceiver:
+    """
+    Penerima unggahan multipart yang menulis file ke disk selagi body diterima.
+
+    Berbeda dengan `UploadFile` yang menampung seluruh body di file sementara sebelum
+    handler berjalan, penerima ini mem-parsing `request.stream()` secara inkremental. Data
+    setiap file dikumpulkan hingga `UPLOAD_CHUNK_BYTES`, lalu hash SHA-256 dan penulisan ke
+    disk dilakukan bersama di thread terpisah, sehingga event loop tidak terblokir dan isi
+    file hanya dibaca satu kali. Batas ukuran diperiksa dari header `Content-Length` sebelum
+    body dibaca, dan ulang selama streaming; pelanggaran langsung menghentikan penerimaan.
+
+    File ditulis ke nama sementara di `UPLOAD_DIR` (satu filesystem dengan tujuan akhirnya),
+    sehingga pemanggil dapat memindahkannya dengan `os.replace` secara atomik. Jika
+    penerimaan gagal di tengah jalan, seluruh file sementara dihapus.
+
+    Args:
+        request (Request): Permintaan `multipart/form-data`.
+        max_files (int): Jumlah file maksimum per permintaan.
+    """
+
+    def __init__(self, request: Request, max_files: int = UPLOAD_MAX_FILES):
+        self.request = request
+        self.max_files = max_files
+        self.upload_dir = Path(UPLOAD_DIR)
+        self._parts: List[_Part] = []
+        self._current: Optional[_Part] = None
+        self._header_name = b""
+        self._header_value = b""
+        self._headers = {}
+        self._received_bytes = 0
+
+    # --- Callback parser (dipanggil sinkron di event loop; hanya menyalin ke buffer) ---
+
+    def _on_part_begin(self):
+        self._current = _Part()
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # Browser mengirim `filename=""` untuk input file yang kosong; bagian itu diabaikan.
+        filename = Path(options.get(b"filename", b"").decode("utf-8", errors="replace")).name
+        if not filename:
+            return
+        if len(self._parts) >= self.max_files:
+            raise HTTPException(status_code=413, detail=f"Terlalu banyak file. Maksimum {self.max_files} file per unggahan.")
+        self._current.filename = filename
+        self._current.temp_path = self.upload_dir / f".{uuid.uuid4().hex}.part"
+        self._parts.append(self._current)
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        part = self._current
+        if part.filename is None:
+            part.field_bytes += end - start
+            if part.field_bytes > _MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail="Field formulir terlalu besar.")
+            return
+        part.size += end - start
+        if part.size > UPLOAD_MAX_FILE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File '{part.filename}' melebihi batas ukuran {UPLOAD_MAX_FILE_BYTES // (1024 * 1024)} MB."
+            )
+        part.buffer += data[start:end]
+
+    # --- Operasi disk (dijalankan di thread) ---
+
+    @staticmethod
+    def _flush(part: _Part, data: bytes):
+        if part.file is None:
+            part.file = open(part.temp_path, "wb")
+        part.hasher.update(data)
+        part.file.write(data)
+
+    @staticmethod
+    def _close(part: _Part):
+        if part.file is None:
+            # File kosong tetap dibuat agar pemanggil selalu memiliki file untuk dipindahkan.
+            part.file = open(part.temp_path, "wb")
+        part.file.close()
+
+    def _discard(self):
+        for part in self._parts:
+            if part.file is not None:
+                part.file.close()
+            if part.temp_path is not None:
+                part.temp_path.unlink(missing_ok=True)
+
+    async def _flush_pending(self, final: bool = False):
+        for part in self._parts:
+            if part.buffer and (final or part is not self._current or len(part.buffer) >= UPLOAD_CHUNK_BYTES):
+                data = bytes(part.buffer)
+                part.buffer.clear()
+                await asyncio.to_thread(self._flush, part, data)
+
+    async def receive(self) -> List[ReceivedUpload]:
+        """
+        Menerima seluruh file dari body permintaan.
+
+        Returns:
+            List[ReceivedUpload]: File yang diterima, sesuai urutan di body.
+
+        Raises:
+            HTTPException: 400 jika body bukan multipart yang valid atau tidak berisi file,
+                413 jika jumlah atau ukuran file melebihi batas.
+        """
+        content_type, params = parse_options_header(self.request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=400, detail="Unggahan harus berupa multipart/form-data.")
+        content_length = self.request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > UPLOAD_MAX_REQUEST_BYTES:
+            raise HTTPException(status_code=413, detail=f"Unggahan melebihi batas {UPLOAD_MAX_REQUEST_BYTES // (1024 * 1024)} MB per permintaan.")
+
+        parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+        await asyncio.to_thread(self.upload_dir.mkdir, parents=True, exist_ok=True)
+        try:
+            async for chunk in self.request.stream():
+                self._received_bytes += len(chunk)
+                if self._received_bytes > UPLOAD_MAX_REQUEST_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Unggahan melebihi batas {UPLOAD_MAX_REQUEST_BYTES // (1024 * 1024)} MB per permintaan.")
+                try:
+                    parser.write(chunk)
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Body multipart tidak valid: {e}")
+                await self._flush_pending()
+            parser.finalize()
+            await self._flush_pending(final=True)
+            for part in self._parts:
+                await asyncio.to_thread(self._close, part)
+        except BaseException:
+            # Termasuk pembatalan (klien memutus koneksi): file sementara tidak boleh tertinggal.
+            await asyncio.shield(asyncio.to_thread(self._discard))
+            raise
+
+        if not self._parts:
+            raise HTTPException(status_code=400, detail="Tidak ada file dalam unggahan.")
+        return [ReceivedUpload(part.filename, part.temp_path, part.size, part.hasher.hexdigest()) for part in self._parts]
+
+
+def discard_uploads(uploads: List[ReceivedUpload]):
+    """Menghapus file sementara dari unggahan yang tidak jadi dipakai."""
+    for upload in uploads:
+        upload.temp_path.unlink(missing_ok=True)
+
+
+def upload_path(upload: ReceivedUpload) -> Path:
+    """
+    Mengembalikan lokasi akhir sebuah unggahan: `UPLOAD_DIR/<sha256>/<filename>`.
+
+    Setiap versi isi file mendapat path sendiri, sehingga unggahan baru tidak pernah menimpa
+    file yang masih akan dibaca job lama yang mengantre untuk dokumen bernama sama.
+    """
+    return Path(UPLOAD_DIR) / upload.content_hash / upload.filename
+
+
+def commit_upload(upload: ReceivedUpload) -> Path:
+    """Memindahkan file sementara ke `upload_path(upload)` secara atomik dan mengembalikan path akhirnya."""
+    final_path = upload_path(upload)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(upload.temp_path, final_path)
+    return final_path
@@ -0,0 +1,62 @@
+"""
+Membandingkan dua hasil `benchmarks.run`.
+
+    python -m benchmarks.compare sebelum.json sesudah.json
+
+Menampilkan throughput ingesti per tahap dan latensi kueri per (ukuran korpus, konkurensi)
+beserta perubahannya dalam persen.
+"""
+
+import argparse
+import json
+from typing import Optional
+
+
+def _change(before: Optional[float], after: Optional[float]) -> str:
+    if before in (None, 0) or after is None:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def _row(label: str, before: Optional[float], after: Optional[float]) -> str:
+    return f"  {label:<28} {str(before):>12} {str(after):>12} {_change(before, after):>9}"
+
+
+def compare(before: dict, after: dict) -> str:
+    """Menyusun laporan perbandingan dalam bentuk teks."""
+    lines = []
+    corpora_after = {corpus["documents"]: corpus for corpus in after["corpora"]}
+    for corpus in before["corpora"]:
+        other = corpora_after.get(corpus["documents"])
+        if other is None:
+            continue
+        lines.append(f"Korpus {corpus['documents']} dokumen ({corpus['pages']} halaman)")
+        for phase, data in corpus["ingestion"]["phases"].items():
+            metric = next(key for key in data if key.endswith("_per_s"))
+            lines.append(_row(f"ingesti {phase} ({metric})", data[metric], other["ingestion"]["phases"][phase][metric]))
+
+        queries_after = {result["concurrency"]: result for result in other["queries"]}
+        for result in corpus["queries"]:
+            counterpart = queries_after.get(result["concurrency"])
+            if counterpart is None:
+                continue
+            for percentile in ("p50", "p95", "p99"):
+                lines.append(_row(f"kueri c={result['concurrency']} {percentile} (ms)", result["latency_ms"][percentile], counterpart["latency_ms"][percentile]))
+            lines.append(_row(f"kueri c={result['concurrency']} qps", result["throughput_qps"], counterpart["throughput_qps"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bandingkan dua hasil benchmark.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args(argv)
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    print(compare(before, after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import random
+import textwrap
+from pathlib import Path
+from typing import Dict, List
+
+_FIRST_NAMES = ["Andi", "Budi", "Citra", "Dewi", "Eko", "Fajar", "Gita", "Hendra", "Indah", "Joko", "Kartika", "Lestari",
+                "Mulyadi", "Nadia", "Oki", "Putri", "Rahmat", "Sari", "Taufik", "Wulan"]
+_LAST_NAMES = ["Pratama", "Santoso", "Wibowo", "Saputra", "Hidayat", "Kurniawan", "Lestari", "Nugroho", "Permana", "Setiawan"]
+_ROLES = ["Manajer Operasional", "Direktur Keuangan", "Kepala Divisi Riset", "Koordinator Proyek", "Analis Data",
+          "Sekretaris Jenderal", "Kepala Bagian Hukum", "Staf Ahli Teknologi"]
+_ORGANIZATIONS = ["PT Nusantara Digital", "CV Sinar Abadi", "Yayasan Cendekia", "Koperasi Maju Bersama", "PT Samudra Data",
+                  "Dinas Komunikasi", "Lembaga Riset Terapan", "PT Arunika Teknologi"]
+_LOCATIONS = ["Jember", "Surabaya", "Bandung", "Yogyakarta", "Makassar", "Medan", "Denpasar", "Malang"]
+_PROJECTS = ["Presensi Wajah", "Gudang Data Terpadu", "Portal Layanan Publik", "Sistem Antrean Pintar", "Peta Risiko Banjir",
+             "Arsip Digital", "Dasbor Anggaran", "Asisten Dokumen"]
+_MONTHS = ["Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli", "Agustus", "September", "Oktober", "November", "Desember"]
+_FILLER = [
+    "Dokumen ini disusun sebagai bagian dari laporan berkala dan wajib disimpan sesuai ketentuan yang berlaku.",
+    "Seluruh kegiatan dilaksanakan dengan memperhatikan prinsip akuntabilitas dan transparansi.",
+    "Evaluasi dilakukan setiap triwulan dan hasilnya dilaporkan kepada pimpinan.",
+    "Anggaran kegiatan bersumber dari dana operasional tahun berjalan.",
+    "Perubahan jadwal akan diumumkan paling lambat tujuh hari sebelum pelaksanaan.",
+]
+
+_LINE_WIDTH = 90
+_LINES_PER_PAGE = 45
+
+
+def _person(rng: random.Random) -> str:
+    return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+
+
+def generate_pages(rng: random.Random, pages: int, facts_per_page: int) -> Dict[str, list]:
+    """
+    Membuat isi dokumen sintetis halaman demi halaman.
+
+    Setiap halaman berisi `facts_per_page` kalimat fakta (jabatan dan proyek) yang dapat
+    diekstrak oleh `FakeChatModel`, diselingi kalimat pengisi agar kepadatan fakta realistis.
+
+    Returns:
+        dict: `{"pages": List[str], "facts": List[dict]}`. Setiap fakta menyimpan entitasnya
+            untuk membangun kueri benchmark.
+    """
+    page_texts, facts = [], []
+    for _ in range(pages):
+        sentences = []
+        for _ in range(facts_per_page):
+            person = _person(rng)
+            if rng.random() < 0.7:
+                fact = {"person": person, "role": rng.choice(_ROLES), "organization": rng.choice(_ORGANIZATIONS),
+                        "location": rng.choice(_LOCATIONS)}
+                sentences.append(f"{person} menjabat sebagai {fact['role']} di {fact['organization']} yang berlokasi di {fact['location']}.")
+            else:
+                fact = {"person": person, "project": rng.choice(_PROJECTS),
+                        "date": f"{rng.randint(1, 28)} {rng.choice(_MONTHS)} {rng.randint(2018, 2025)}"}
+                sentences.append(f"Proyek {fact['project']} dipimpin oleh {person} sejak {fact['date']}.")
+            facts.append(fact)
+            sentences.extend(rng.sample(_FILLER, 2))
+        page_texts.append(" ".join(sentences))
+    return {"pages": page_texts, "facts": facts}
+
+
+def _wrap_page(text: str) -> List[str]:
+    return textwrap.wrap(text, _LINE_WIDTH)[:_LINES_PER_PAGE]
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_digital_pdf(path: Path, pages: List[str]):
+    """Menulis PDF dengan lapisan teks (Helvetica) tanpa dependensi tambahan."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        lines = [f"({_pdf_escape(line)}) Tj T*" for line in _wrap_page(text)]
+        stream = "BT /F1 10 Tf 14 TL 50 800 Td " + " ".join(lines) + " ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(output))
+
+
+def write_scanned_pdf(path: Path, pages: List[str], dpi: int = 150):
+    """Menulis PDF berisi gambar halaman tanpa lapisan teks, seperti hasil pindaian (membutuhkan Pillow)."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    try:
+        font = ImageFont.load_default(size=max(12, dpi // 8))
+    except TypeError:
+        # Pillow < 10.1 tidak mendukung ukuran font bawaan.
+        font = ImageFont.load_default()
+    images = []
+    for text in pages:
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        for line in _wrap_page(text):
+            draw.text((dpi // 2, y), line, fill=0, font=font)
+            y += int(dpi / 5)
+        images.append(image)
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+
+
+def generate_corpus(directory: Path, documents: int, pages: int, facts_per_page: int = 4, scanned_ratio: float = 0.25,
+                    seed: int = 0, prefix: str = "doc") -> List[dict]:
+    """
+    Membuat korpus PDF sintetis (digital dan hasil pindaian) di `directory`.
+
+    Returns:
+        List[dict]: Satu entri per dokumen: `filename`, `path`, `kind` (`digital`/`scanned`),
+            `pages`, `text` (teks asli, dipakai jika parsing tidak tersedia), dan `facts`.
+    """
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    scanned = round(documents * scanned_ratio)
+    corpus = []
+    for index in range(documents):
+        content = generate_pages(rng, pages, facts_per_page)
+        kind = "scanned" if index < scanned else "digital"
+        filename = f"{prefix}-{index:04d}-{kind}.pdf"
+        path = directory / filename
+        if kind == "scanned":
+            write_scanned_pdf(path, content["pages"])
+        else:
+            write_digital_pdf(path, content["pages"])
+        corpus.append({
+            "filename": filename,
+            "path": str(path),
+            "kind": kind,
+            "pages": pages,
+            "text": "\n\n".join(content["pages"]),
+            "facts": content["facts"]
+        })
+    return corpus
+
+
+def generate_chat_history(rng: random.Random, facts: List[dict], turns: int) -> List[Dict[str, str]]:
+    """Membuat riwayat percakapan panjang (`turns` pasang tanya-jawab) tentang fakta korpus."""
+    history = []
+    for _ in range(turns):
+        fact = rng.choice(facts)
+        if "role" in fact:
+            question = f"Apa jabatan {fact['person']}?"
+            answer = f"{fact['person']} menjabat sebagai {fact['role']} di {fact['organization']}."
+        else:
+            question = f"Siapa yang memimpin proyek {fact['project']}?"
+            answer = f"Proyek {fact['project']} dipimpin oleh {fact['person']} sejak {fact['date']}."
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+    return history
+
+
+def generate_queries(rng: random.Random, corpus: List[dict], count: int, history_ratio: float = 0.0, history_turns: int = 0,
+                     max_documents: int = 3) -> List[dict]:
+    """
+    Membuat kueri benchmark dari fakta korpus.
+
+    Sebagian kueri (`history_ratio`) berupa pertanyaan lanjutan dengan riwayat percakapan
+    `history_turns` pasang pesan dan `conversation_id`, sehingga jalur formulasi ulang dan
+    peringkasan riwayat ikut terukur.
+
+    Returns:
+        List[dict]: Item dengan kunci `query`, `filenames`, `chat_history`, dan `conversation_id`.
+    """
+    queries = []
+    for index in range(count):
+        documents = rng.sample(corpus, min(len(corpus), rng.randint(1, max_documents)))
+        fact = rng.choice(documents[0]["facts"])
+        if "role" in fact:
+            query = rng.choice([
+                f"Siapa yang menjabat sebagai {fact['role']} di {fact['organization']}?",
+                f"Di mana {fact['organization']} berlokasi?",
+                f"Apa jabatan {fact['person']}?"
+            ])
+        else:
+            query = rng.choice([
+                f"Siapa yang memimpin proyek {fact['project']}?",
+                f"Kapan proyek {fact['project']} dimulai?"
+            ])
+        item = {"query": query, "filenames": [document["filename"] for document in documents], "chat_history": None, "conversation_id": None}
+        if history_turns and rng.random() < history_ratio:
+            item["chat_history"] = generate_chat_history(rng, documents[0]["facts"], history_turns)
+            item["conversation_id"] = f"bench-{index}"
+            item["query"] = "Lalu di mana kantornya?" if "role" in fact else "Kapan proyek itu dimulai?"
+        queries.append(item)
+    return queries
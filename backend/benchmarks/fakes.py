@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Pola kalimat korpus sintetis (lihat `benchmarks.corpus`). Model palsu "mengekstrak" triplet
+# dengan mencocokkan pola ini, sehingga jumlah triplet per dokumen bersifat deterministik.
+_ROLE_SENTENCE = re.compile(r"([A-Z][\w ]+?) menjabat sebagai ([\w ]+?) di ([A-Z][\w ]+?) yang berlokasi di ([A-Z][\w ]+?)\.")
+_PROJECT_SENTENCE = re.compile(r"Proyek ([A-Z][\w ]+?) dipimpin oleh ([A-Z][\w ]+?) sejak ([\w ]+?)\.")
+_EXTRACTION_TEXT = re.compile(r"Teks untuk dianalisis:\n---\n(.*)\n---", re.DOTALL)
+_FOLLOW_UP = re.compile(r"Follow Up Input: (.*)\n")
+_LAST_QUESTION = re.compile(r"^Human: (.*)$", re.MULTILINE)
+
+
+def extract_synthetic_triplets(text: str) -> List[list]:
+    """Mengembalikan triplet `[head, head_label, relation, tail, tail_label]` dari teks korpus sintetis."""
+    # Teks hasil parsing PDF memuat pemenggalan baris di tengah kalimat.
+    text = " ".join(text.split())
+    triplets = []
+    for person, role, organization, location in _ROLE_SENTENCE.findall(text):
+        triplets.append([person, "PERSON", "MEMILIKI_JABATAN", role, "ROLE"])
+        triplets.append([person, "PERSON", "BEKERJA_DI", organization, "ORGANIZATION"])
+        triplets.append([organization, "ORGANIZATION", "BERLOKASI_DI", location, "LOCATION"])
+    for project, person, date in _PROJECT_SENTENCE.findall(text):
+        triplets.append([project, "PROJECT", "DIPIMPIN_OLEH", person, "PERSON"])
+        triplets.append([project, "PROJECT", "DIMULAI_PADA", date, "DATE"])
+    return triplets
+
+
+@dataclass
+class FakeMessage:
+    content: str
+
+
+class FakeChatModel:
+    """
+    Pengganti `ChatGoogleGenerativeAI` yang deterministik untuk benchmark.
+
+    Jenis prompt dikenali dari isinya: ekstraksi knowledge graph mengembalikan triplet dari
+    pola korpus sintetis, formulasi ulang menggabungkan pertanyaan lanjutan dengan pertanyaan
+    terakhir di riwayat,
+    ringkasan riwayat mengembalikan ringkasan tetap, dan prompt lain dijawab dengan jawaban
+    kaleng sepanjang `answer_tokens` kata. Setiap panggilan ditunda `latency_ms` (± jitter
+    yang deterministik per `seed`), dan `astream` menunda `token_latency_ms` per token.
+
+    Args:
+        latency_ms (float): Latensi dasar per panggilan.
+        jitter_ms (float): Variasi latensi maksimum.
+        token_latency_ms (float): Jeda antar token pada `astream`.
+        answer_tokens (int): Jumlah kata pada jawaban kaleng.
+        seed (int): Seed untuk jitter.
+    """
+
+    def __init__(self, latency_ms: float = 300, jitter_ms: float = 50, token_latency_ms: float = 0,
+                 answer_tokens: int = 80, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_latency_ms = token_latency_ms
+        self.answer_tokens = answer_tokens
+        self._random = random.Random(seed)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.prompt_chars: Dict[str, int] = defaultdict(int)
+
+    async def _delay(self):
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def _respond(self, prompt: str) -> Tuple[str, str]:
+        extraction = _EXTRACTION_TEXT.search(prompt)
+        if extraction:
+            return "extraction", f"```json\n{json.dumps(extract_synthetic_triplets(extraction.group(1)))}\n```"
+        follow_up = _FOLLOW_UP.search(prompt)
+        if follow_up:
+            # Pertanyaan mandiri tiruan: pertanyaan lanjutan ditambah pertanyaan terakhir di riwayat.
+            questions = _LAST_QUESTION.findall(prompt[:follow_up.start()])
+            context = f" ({questions[-1]})" if questions else ""
+            return "rephrase", f"{follow_up.group(1).strip()}{context}"
+        if prompt.startswith("Progressively summarize"):
+            return "summary", "Pengguna menanyakan jabatan, organisasi, dan proyek dari dokumen yang diunggah."
+        words = " ".join(f"kata{i}" for i in range(self.answer_tokens))
+        return "answer", f"Berdasarkan dokumen, {words}."
+
+    async def ainvoke(self, prompt: str) -> FakeMessage:
+        kind, content = self._respond(prompt)
+        self.calls[kind] += 1
+        self.prompt_chars[kind] += len(prompt)
+        await self._delay()
+        return FakeMessage(content)
+
+    async def astream(self, prompt: str):
+        kind, content = self._respond(prompt)
+        self.calls[kind] += 1
+        self.prompt_chars[kind] += len(prompt)
+        await self._delay()
+        for token in re.findall(r"\S+\s*", content):
+            if self.token_latency_ms > 0:
+                await asyncio.sleep(self.token_latency_ms / 1000)
+            yield FakeMessage(token)
+
+    def stats(self) -> dict:
+        return {"calls": dict(self.calls), "prompt_chars": dict(self.prompt_chars)}
+
+
+# --- Pengganti Neo4j di dalam proses ---
+_MERGE_QUERY = re.compile(r"MERGE \(h:(\w+) .*MERGE \(t:(\w+) .*MERGE \(h\)-\[:`([^`]+)`\]->\(t\)")
+_DELETE_QUERY = re.compile(r"MATCH \(h:(\w+) .*-\[r:`([^`]+)`\]->\(t:(\w+) .*DELETE r")
+_HOPS = re.compile(r"\[\*1\.\.(\d+)\]")
+
+
+class _FakeResult:
+    def __init__(self, records: Optional[List[dict]] = None):
+        self._records = records or []
+
+    async def data(self) -> List[dict]:
+        return self._records
+
+    async def consume(self):
+        return None
+
+
+class _FakeSession:
+    def __init__(self, driver: "FakeNeo4jDriver"):
+        self._driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query: str, **params) -> _FakeResult:
+        return await self._driver.execute(query, params)
+
+    async def execute_write(self, work, *args, **kwargs):
+        return await work(self, *args, **kwargs)
+
+    execute_read = execute_write
+
+
+class FakeNeo4jDriver:
+    """
+    Pengganti `AsyncGraphDatabase.driver` di dalam proses untuk benchmark.
+
+    Hanya mendukung kueri yang dipakai aplikasi (MERGE/DELETE berbasis `UNWIND`, pembacaan
+    triplet per dokumen, dan pencarian lingkungan full-text), yang dikenali dari bentuk
+    kuerinya. Setiap kueri dapat ditunda `latency_ms` untuk mensimulasikan round trip jaringan.
+    Untuk pengukuran dengan Neo4j sungguhan, jalankan benchmark dengan `--neo4j-uri`.
+
+    Args:
+        latency_ms (float): Latensi per kueri.
+    """
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        # filename -> {(head, head_label, relation, tail, tail_label)}
+        self._edges: Dict[str, set] = defaultdict(set)
+        self.queries = 0
+
+    def session(self, **kwargs) -> _FakeSession:
+        return _FakeSession(self)
+
+    async def verify_connectivity(self):
+        return None
+
+    async def close(self):
+        return None
+
+    async def execute(self, query: str, params: dict) -> _FakeResult:
+        self.queries += 1
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        filename = params.get("filename")
+        merge = _MERGE_QUERY.search(query)
+        if merge:
+            head_label, tail_label, relation = merge.groups()
+            for row in params["rows"]:
+                self._edges[filename].add((row["head"], head_label, relation, row["tail"], tail_label))
+            return _FakeResult()
+        delete = _DELETE_QUERY.search(query)
+        if delete:
+            head_label, relation, tail_label = delete.groups()
+            for row in params["rows"]:
+                self._edges[filename].discard((row["head"], head_label, relation, row["tail"], tail_label))
+            return _FakeResult()
+        if query.startswith("MATCH (h {filename: $filename})"):
+            return _FakeResult([
+                {"head": head, "head_label": head_label, "relation": relation, "tail": tail, "tail_label": tail_label}
+                for head, head_label, relation, tail, tail_label in self._edges.get(filename, ())
+            ])
+        if "db.index.fulltext.queryNodes" in query:
+            return _FakeResult(self._neighborhood(query, params))
+        # CREATE INDEX dan penghapusan node yatim tidak berpengaruh pada penyimpanan ini.
+        return _FakeResult()
+
+    def _neighborhood(self, query: str, params: dict) -> List[dict]:
+        terms = {term.casefold() for term in re.findall(r"\w+", params["search"]) if term.isalnum()}
+        edges = [edge for filename in params["filenames"] for edge in self._edges.get(filename, ())]
+        frontier = {
+            name for head, _, _, tail, _ in edges for name in (head, tail)
+            if terms & {token.casefold() for token in re.findall(r"\w+", name)}
+        }
+        frontier = set(sorted(frontier)[:params["max_entities"]])
+        hops = int(_HOPS.search(query).group(1)) if _HOPS.search(query) else 1
+
+        facts = {}
+        for _ in range(hops):
+            reached = set()
+            for head, _, relation, tail, _ in edges:
+                if head in frontier or tail in frontier:
+                    facts[(head, relation, tail)] = None
+                    reached.update((head, tail))
+            frontier = reached
+        return [{"head": head, "relation": relation, "tail": tail} for head, relation, tail in list(facts)[:params["max_facts"]]]
+
+    def triplet_count(self) -> int:
+        return sum(len(edges) for edges in self._edges.values())
+
+
+class HashEmbeddingFunction:
+    """
+    Fungsi embedding deterministik berbasis feature hashing, tanpa model.
+
+    Dipakai sebagai default benchmark agar hasil tidak bergantung pada unduhan model dan
+    waktu inferensi embedding tidak mendominasi pengukuran. Gunakan `--embedding-model`
+    untuk mengukur dengan model sungguhan.
+
+    Args:
+        dimensions (int): Dimensi vektor.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.casefold()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in input]
+
+    # Metadata yang diperiksa ChromaDB saat membuka koleksi. Fungsi ini tidak terdaftar di
+    # ChromaDB, sehingga ditandai legacy agar konfigurasinya tidak disimpan di koleksi.
+    @staticmethod
+    def name() -> str:
+        return "benchmark_hash"
+
+    def is_legacy(self) -> bool:
+        return True
@@ -0,0 +1,318 @@
+"""
+Benchmark end-to-end untuk pipeline ingesti dan alur tanya-jawab.
+
+Contoh (dari direktori `backend`):
+
+    python -m benchmarks.run --corpus-sizes 2,8,32 --pages 4 --concurrency 1,8,32 --output hasil.json
+
+Secara default LLM, Neo4j, dan model embedding diganti dengan tiruan deterministik
+(`benchmarks.fakes`), sedangkan ChromaDB, indeks leksikal, manifest, dan cache memakai
+direktori sementara. Parsing memakai `unstructured` sungguhan; jika tidak tersedia (misalnya
+Tesseract belum terpasang untuk PDF hasil pindaian), teks asli korpus dipakai dan jumlah
+fallback dicatat di hasil.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.fakes import FakeChatModel, FakeNeo4jDriver, HashEmbeddingFunction
+
+logger = logging.getLogger("benchmarks")
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return round(ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower), 2)
+
+
+def summarize_latencies(latencies_ms: List[float]) -> dict:
+    """Meringkas daftar latensi menjadi rata-rata dan persentil."""
+    return {
+        "mean": round(sum(latencies_ms) / len(latencies_ms), 2) if latencies_ms else None,
+        "p50": _percentile(latencies_ms, 50),
+        "p90": _percentile(latencies_ms, 90),
+        "p95": _percentile(latencies_ms, 95),
+        "p99": _percentile(latencies_ms, 99),
+        "max": round(max(latencies_ms), 2) if latencies_ms else None
+    }
+
+
+def _rate(units: float, seconds: float) -> Optional[float]:
+    return round(units / seconds, 2) if seconds > 0 else None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip()
+    except Exception:
+        return None
+
+
+async def _timed(coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    return result, time.perf_counter() - started
+
+
+async def ingest_corpus(corpus: List[dict], neo4j_driver, chat_model, chroma_client, embedding_function, concurrency: int) -> dict:
+    """
+    Mengingesti korpus tahap demi tahap dan mengukur throughput per tahap.
+
+    Returns:
+        dict: Durasi total dan throughput setiap tahap (`parse`: halaman/detik, `extract`:
+            triplet/detik, `chunk` dan `index`: potongan/detik).
+    """
+    from ingestion.pipeline import parse_stage, extract_stage, chunk_stage, index_stage
+
+    phases = {phase: {"seconds": 0.0, "units": 0} for phase in ("parse", "extract", "chunk", "index")}
+    errors = {"parse_fallback": 0, "extract": 0, "index": 0}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def ingest(document: dict):
+        async with semaphore:
+            try:
+                text, seconds = await _timed(parse_stage(document["path"]))
+                if not text or not text.strip():
+                    raise ValueError("Teks kosong.")
+            except Exception as e:
+                logger.warning(f"Parsing '{document['filename']}' gagal ({e}); memakai teks asli korpus.")
+                errors["parse_fallback"] += 1
+                text, seconds = document["text"], 0.0
+            else:
+                phases["parse"]["seconds"] += seconds
+                phases["parse"]["units"] += document["pages"]
+
+            (structured_data, stored_triplets), seconds = await _timed(
+                extract_stage(text, document["filename"], neo4j_driver, chat_model, previous_triplets=None)
+            )
+            phases["extract"]["seconds"] += seconds
+            phases["extract"]["units"] += len(structured_data or [])
+            if structured_data is None:
+                errors["extract"] += 1
+
+            started = time.perf_counter()
+            chunks = chunk_stage(text, document["filename"], structured_data)
+            phases["chunk"]["seconds"] += time.perf_counter() - started
+            phases["chunk"]["units"] += len(chunks)
+
+            try:
+                _, seconds = await _timed(index_stage(document["filename"], chunks, stored_triplets, None, chroma_client, embedding_function))
+            except Exception as e:
+                logger.error(f"Indeksasi '{document['filename']}' gagal: {e}", exc_info=True)
+                errors["index"] += 1
+                return
+            phases["index"]["seconds"] += seconds
+            phases["index"]["units"] += len(chunks)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[ingest(document) for document in corpus])
+    wall = time.perf_counter() - started
+
+    units = {"parse": "pages_per_s", "extract": "triplets_per_s", "chunk": "chunks_per_s", "index": "chunks_per_s"}
+    return {
+        "wall_s": round(wall, 3),
+        "documents_per_s": _rate(len(corpus), wall),
+        "phases": {
+            phase: {"seconds": round(data["seconds"], 3), "units": data["units"], units[phase]: _rate(data["units"], data["seconds"])}
+            for phase, data in phases.items()
+        },
+        "errors": errors
+    }
+
+
+async def run_queries(queries: List[dict], concurrency: int, chat_model, chroma_client, embedding_function, neo4j_driver) -> dict:
+    """Menjalankan `get_answer` untuk setiap kueri dengan batas konkurensi dan meringkas latensinya."""
+    from retrieval.hybrid_retriever import get_answer
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies, errors = [], 0
+
+    async def answer(item: dict):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await get_answer(item["query"], item["filenames"], item["chat_history"], chat_model, chroma_client,
+                                 embedding_function, neo4j_driver, item["conversation_id"])
+            except Exception as e:
+                errors += 1
+                logger.error(f"Kueri '{item['query']}' gagal: {e}")
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[answer(item) for item in queries])
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_qps": _rate(len(latencies), wall),
+        "latency_ms": summarize_latencies(latencies)
+    }
+
+
+def _build_embedding_function(model_name: Optional[str]):
+    from core.embedding_service import BatchingEmbeddingFunction, LazyEmbeddingFunction
+
+    if model_name:
+        from chromadb.utils import embedding_functions
+        base = LazyEmbeddingFunction(lambda: embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name))
+        base.load()
+    else:
+        base = HashEmbeddingFunction()
+    return BatchingEmbeddingFunction(base)
+
+
+async def run_benchmark(args) -> dict:
+    import chromadb
+    from core.llm_gateway import llm_gateway
+
+    llm_gateway.rate_limit_rpm = args.llm_rpm
+    workdir = Path(os.getcwd())
+    chat_model = FakeChatModel(args.llm_latency_ms, args.llm_jitter_ms, args.llm_token_ms, seed=args.seed)
+    if args.neo4j_uri:
+        from neo4j import AsyncGraphDatabase
+        from ingestion.graph_builder import ensure_neo4j_schema
+        neo4j_driver = AsyncGraphDatabase.driver(args.neo4j_uri, auth=(args.neo4j_user, args.neo4j_password))
+        await ensure_neo4j_schema(neo4j_driver)
+    else:
+        neo4j_driver = FakeNeo4jDriver(args.neo4j_latency_ms)
+    chroma_client = chromadb.PersistentClient(path=str(workdir / "chroma"), settings=chromadb.Settings(anonymized_telemetry=False))
+    embedding_function = _build_embedding_function(args.embedding_model)
+
+    results = []
+    try:
+        for size in args.corpus_sizes:
+            logger.info(f"Membuat korpus {size} dokumen x {args.pages} halaman...")
+            corpus = generate_corpus(workdir / "corpus", size, args.pages, args.facts_per_page, args.scanned_ratio,
+                                     seed=args.seed + size, prefix=f"c{size}")
+            ingestion = await ingest_corpus(corpus, neo4j_driver, chat_model, chroma_client, embedding_function, args.ingest_concurrency)
+            logger.info(f"Ingesti {size} dokumen selesai dalam {ingestion['wall_s']} detik.")
+
+            query_results = []
+            for concurrency in args.concurrency:
+                queries = generate_queries(random.Random(args.seed + concurrency), corpus, args.queries,
+                                           args.history_ratio, args.history_turns)
+                summary = await run_queries(queries, concurrency, chat_model, chroma_client, embedding_function, neo4j_driver)
+                logger.info(f"Korpus {size}, konkurensi {concurrency}: p50 {summary['latency_ms']['p50']} ms, p95 {summary['latency_ms']['p95']} ms.")
+                query_results.append(summary)
+
+            results.append({
+                "documents": size,
+                "pages": size * args.pages,
+                "scanned_documents": sum(1 for document in corpus if document["kind"] == "scanned"),
+                "facts": sum(len(document["facts"]) for document in corpus),
+                "ingestion": ingestion,
+                "queries": query_results
+            })
+    finally:
+        embedding_function.close()
+        await neo4j_driver.close()
+
+    return {"corpora": results, "llm": chat_model.stats()}
+
+
+def _config_snapshot() -> dict:
+    import config
+
+    names = ["CHUNK_SIZE", "CHUNK_OVERLAP", "VECTOR_SEARCH_TOP_K", "HYBRID_CANDIDATES", "LEXICAL_SEARCH_ENABLED",
+             "RETRIEVAL_CACHE_ENABLED", "GRAPH_RETRIEVAL_ENABLED", "GRAPH_CACHE_ENABLED", "SPECULATIVE_RETRIEVAL_ENABLED",
+             "CONTEXT_BUILDER_ENABLED", "CONTEXT_TOKEN_BUDGET", "PARSER_FAST_PATH_ENABLED", "PARSE_CACHE_ENABLED",
+             "EMBEDDING_MAX_BATCH_SIZE", "EMBEDDING_MAX_WAIT_MS"]
+    return {name: getattr(config, name) for name in names if hasattr(config, name)}
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingesti dan kueri CogniGraph RAG.")
+    parser.add_argument("--corpus-sizes", type=_int_list, default=[2, 8, 32], help="Jumlah dokumen per korpus, dipisah koma.")
+    parser.add_argument("--pages", type=int, default=4, help="Jumlah halaman per dokumen.")
+    parser.add_argument("--facts-per-page", type=int, default=4)
+    parser.add_argument("--scanned-ratio", type=float, default=0.25, help="Proporsi dokumen hasil pindaian (tanpa lapisan teks).")
+    parser.add_argument("--ingest-concurrency", type=int, default=1)
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32], help="Tingkat konkurensi kueri, dipisah koma.")
+    parser.add_argument("--queries", type=int, default=100, help="Jumlah kueri per tingkat konkurensi.")
+    parser.add_argument("--history-ratio", type=float, default=0.3, help="Proporsi kueri lanjutan dengan riwayat percakapan.")
+    parser.add_argument("--history-turns", type=int, default=20, help="Jumlah pasang tanya-jawab pada riwayat percakapan.")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50)
+    parser.add_argument("--llm-token-ms", type=float, default=0)
+    parser.add_argument("--llm-rpm", type=float, default=0,
+                        help="Rate limit gateway LLM (request per menit); default 0 agar LLM tiruan tidak dibatasi.")
+    parser.add_argument("--neo4j-latency-ms", type=float, default=1, help="Latensi per kueri Neo4j tiruan.")
+    parser.add_argument("--neo4j-uri", help="Pakai Neo4j sungguhan (misalnya container) alih-alih tiruan di dalam proses.")
+    parser.add_argument("--neo4j-user", default="neo4j")
+    parser.add_argument("--neo4j-password", default="password")
+    parser.add_argument("--embedding-model", help="Nama model SentenceTransformer; default memakai embedding hashing tanpa model.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Direktori kerja; default direktori sementara yang dihapus setelah selesai.")
+    parser.add_argument("--output", default="benchmark-results.json", help="Berkas JSON hasil benchmark.")
+    parser.add_argument("--verbose", action="store_true", help="Tampilkan log aplikasi.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if not args.verbose:
+        # Log per permintaan dari modul aplikasi akan mendominasi waktu pada konkurensi tinggi.
+        logging.getLogger().setLevel(logging.WARNING)
+        logger.setLevel(logging.INFO)
+
+    output = Path(args.output).resolve()
+    original_cwd = os.getcwd()
+    workdir = Path(args.workdir).resolve() if args.workdir else Path(tempfile.mkdtemp(prefix="cognigraph-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    # Seluruh path data aplikasi bersifat relatif (`data/...`), sehingga cukup berpindah direktori.
+    os.chdir(workdir)
+    started_at = datetime.now(timezone.utc).isoformat()
+    try:
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        os.chdir(original_cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "started_at": started_at,
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "config": _config_snapshot()
+        },
+        **results
+    }
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    logger.info(f"Hasil benchmark disimpan di '{output}'.")
+
+
+if __name__ == "__main__":
+    main()
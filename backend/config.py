@@ -33,12 +33,250 @@ if not all([NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD]):
 # --- Konfigurasi Vector Store (ChromaDB) ---
 CHROMA_DB_PATH = "data/chroma_db"
 CHROMA_COLLECTION_NAME = "cognigraph_rag"
+# Tata letak indeks vektor:
+# - "global" (default): satu koleksi CHROMA_COLLECTION_NAME dengan filter metadata `source_document`.
+# - "partitioned" (opt-in): satu koleksi per dokumen (nama diturunkan dari CHROMA_COLLECTION_NAME
+#   dan hash nama file). Kueri hanya menyentuh koleksi dokumen yang dipilih, dijalankan paralel
+#   (maksimal VECTOR_SEARCH_MAX_FANOUT sekaligus), lalu top-k digabung berdasarkan jarak.
+# Kueri hanya membaca tata letak yang aktif, jadi pindahkan data lama dengan
+# `python -m core.vector_store --to <tata letak>` sebelum mengganti nilai ini; chunk yang
+# belum dipindahkan dilaporkan saat startup.
+VECTOR_INDEX_LAYOUT = os.getenv("VECTOR_INDEX_LAYOUT", "global").lower()
+VECTOR_SEARCH_MAX_FANOUT = int(os.getenv("VECTOR_SEARCH_MAX_FANOUT", "8"))
+
+# --- Konfigurasi Manifest Dokumen ---
+# Setiap dokumen yang diindeks memiliki manifest (ID chunk berbasis hash isi dan triplet
+# yang tersimpan) agar ingesti ulang hanya memproses perubahan (diff), bukan seluruh dokumen.
+MANIFEST_DIR = "data/manifests"
 
 # --- Konfigurasi Model AI ---
 # Nama model yang digunakan untuk tugas LLM dan embedding.
 LLM_MODEL_NAME = "gemini-2.5-flash"
 EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-large"
 
+# --- Konfigurasi Gateway LLM ---
+# Seluruh panggilan chat model melewati gateway bersama (`core.llm_gateway`). Panggilan
+# dibagi ke dua kelas: `interactive` (formulasi ulang, jawaban) dan `background` (ekstraksi
+# graf, ringkasan riwayat), masing-masing dengan batas konkurensi sendiri. Kuota request
+# per menit dibagi lewat token bucket yang disimpan di SQLite (LLM_RATE_LIMIT_PATH), sehingga
+# proses API dan seluruh worker ingesti di host yang sama memakai satu kuota; 0 menonaktifkan
+# rate limit. Di dalam satu proses, penunggu interaktif dilayani lebih dahulu. Antar proses,
+# kelas background hanya boleh mengambil token selama sisa token melebihi
+# LLM_RATE_LIMIT_INTERACTIVE_RESERVE, sehingga cadangan itu selalu tersedia bagi kueri.
+# Batasan: bucket tidak dibagi antar host; jika beberapa host berbagi satu API key, bagi
+# LLM_RATE_LIMIT_RPM sesuai jumlah host. Prompt identik yang sedang berjalan digabung
+# menjadi satu panggilan, dan respons panggilan deterministik (ekstraksi) disimpan di
+# cache SQLite yang dibatasi ukurannya.
+LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "120"))
+LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+LLM_RATE_LIMIT_INTERACTIVE_RESERVE = int(os.getenv("LLM_RATE_LIMIT_INTERACTIVE_RESERVE", "3"))
+LLM_RATE_LIMIT_PATH = "data/llm_rate_limit.sqlite3"
+LLM_INTERACTIVE_MAX_CONCURRENCY = int(os.getenv("LLM_INTERACTIVE_MAX_CONCURRENCY", "16"))
+LLM_BACKGROUND_MAX_CONCURRENCY = int(os.getenv("LLM_BACKGROUND_MAX_CONCURRENCY", "4"))
+LLM_COALESCING_ENABLED = os.getenv("LLM_COALESCING_ENABLED", "true").lower() == "true"
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = "data/llm_cache.sqlite3"
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Keperluan panggilan yang responsnya boleh disimpan di cache.
+LLM_CACHE_PURPOSES = ["extraction"]
+
+# --- Konfigurasi Layanan Embedding ---
+# Model embedding dijalankan di thread worker tersendiri. Teks dari seluruh permintaan
+# yang berjalan bersamaan (unggahan dan kueri) dikumpulkan menjadi micro-batch dengan
+# ukuran maksimum dan waktu tunggu maksimum tertentu. Kueri selalu didahulukan.
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+
+# --- Konfigurasi Server Model Embedding ---
+# Opsional: satu proses server model per host (`python -m core.model_server`) memegang model
+# embedding, dan setiap worker uvicorn mengirim teks melalui Unix domain socket. Dengan
+# begitu, memori model tidak bertambah seiring jumlah worker.
+EMBEDDING_SERVER_ENABLED = os.getenv("EMBEDDING_SERVER_ENABLED", "false").lower() == "true"
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "/tmp/cognigraph-embedding.sock")
+EMBEDDING_SERVER_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_SERVER_TIMEOUT_SECONDS", "60"))
+
+# --- Konfigurasi Startup ---
+# Model embedding dimuat secara malas: server langsung menerima trafik, sementara model
+# dimuat dan dipanaskan (satu forward pass dummy) di background. `/readyz` baru melaporkan
+# siap setelah model dan database siap. Replika khusus kueri (INGESTION_ENABLED=false)
+# tidak pernah mengimpor stack parsing/OCR dan tidak menjalankan antrean ingesti.
+INGESTION_ENABLED = os.getenv("INGESTION_ENABLED", "true").lower() == "true"
+EMBEDDING_WARMUP_ENABLED = os.getenv("EMBEDDING_WARMUP_ENABLED", "true").lower() == "true"
+EMBEDDING_WARMUP_TEXT = "query: warmup"
+
+# --- Konfigurasi Observabilitas ---
+# Setiap tahap ingesti dan kueri dibungkus span waktu yang membawa ID korelasi (ID job
+# untuk dokumen, ID permintaan untuk kueri). Durasinya dikumpulkan ke histogram yang
+# diekspor di `/metrics` (format teks Prometheus) bersama jumlah token LLM, kedalaman
+# antrean, dan hit rate cache. Header `Server-Timing` bersifat opt-in: aktif untuk semua
+# respons dengan SERVER_TIMING_ENABLED, atau per permintaan dengan header `X-Server-Timing: 1`.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+SERVER_TIMING_REQUEST_HEADER = "x-server-timing"
+# Ringkasan span per permintaan/job dicatat sebagai satu baris log.
+TRACE_LOG_ENABLED = os.getenv("TRACE_LOG_ENABLED", "true").lower() == "true"
+# Batas atas bucket histogram latensi, dalam detik.
+METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+
+# --- Konfigurasi Parsing Dokumen ---
+# Parsing 'hi_res' (layout model + OCR) sangat intensif CPU. Dokumen PDF dipecah per
+# halaman dan dipartisi secara paralel di dalam process pool agar event loop FastAPI
+# tetap bebas dan seluruh core CPU termanfaatkan.
+PARSER_STRATEGY = "hi_res"
+PARSER_LANGUAGES = ["ind", "eng"]
+PARSER_MAX_WORKERS = int(os.getenv("PARSER_MAX_WORKERS", os.cpu_count() or 1))
+# Jumlah halaman yang diproses oleh satu tugas di dalam pool.
+PARSER_PAGES_PER_TASK = int(os.getenv("PARSER_PAGES_PER_TASK", "2"))
+# Jalur cepat: halaman yang sudah memiliki lapisan teks (PDF digital) dipartisi dengan
+# strategi 'fast' tanpa layout model/OCR. Hanya halaman dengan teks minim atau gambar
+# berukuran besar (misalnya hasil pindaian) yang dikirim ke strategi 'hi_res'.
+PARSER_FAST_PATH_ENABLED = os.getenv("PARSER_FAST_PATH_ENABLED", "true").lower() == "true"
+PARSER_FAST_STRATEGY = "fast"
+PARSER_MIN_TEXT_CHARS = int(os.getenv("PARSER_MIN_TEXT_CHARS", "100"))
+PARSER_LARGE_IMAGE_PIXELS = int(os.getenv("PARSER_LARGE_IMAGE_PIXELS", "1000000"))
+
+# --- Konfigurasi Cache Parsing ---
+# Hasil partisi disimpan di disk dengan kunci hash isi halaman + pengaturan parser,
+# sehingga halaman yang tidak berubah (misalnya template kontrak yang diunggah ulang)
+# tidak perlu di-OCR ulang. Cache dibatasi ukurannya dengan eviksi LRU.
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "true").lower() == "true"
+PARSE_CACHE_DIR = "data/parse_cache"
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# --- Konfigurasi Antrean Ingesti ---
+# Unggahan dimasukkan ke antrean persisten (SQLite) dan diproses oleh sejumlah worker di
+# proses terpisah (parsing, ekstraksi graf, chunking). Tahap indeksasi dijalankan di proses
+# API karena ChromaDB dan model embedding hidup di sana. Tahap yang gagal diulang hingga
+# JOB_MAX_ATTEMPTS kali, dimulai dari tahap yang gagal (hasil tahap sebelumnya disimpan di
+# JOB_ARTIFACT_DIR). Jika antrean penuh, unggahan baru ditolak dengan HTTP 429.
+JOB_QUEUE_PATH = "data/jobs.sqlite3"
+JOB_ARTIFACT_DIR = "data/jobs"
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+JOB_QUEUE_MAX_PENDING = int(os.getenv("JOB_QUEUE_MAX_PENDING", "20"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+# Job yang sedang dikerjakan memegang lease yang diperpanjang setiap
+# JOB_HEARTBEAT_INTERVAL_SECONDS. Job yang lease-nya habis, atau yang proses pemiliknya di
+# host yang sama sudah mati, dikembalikan ke antrean (dihitung sebagai satu percobaan gagal).
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("JOB_HEARTBEAT_INTERVAL_SECONDS", "30"))
+
+# --- Konfigurasi Unggahan ---
+# Body unggahan dibaca secara streaming dan ditulis ke disk per blok UPLOAD_CHUNK_BYTES di
+# thread terpisah, sambil menghitung hash SHA-256 isinya. Unggahan yang melebihi batas
+# ukuran ditolak dengan HTTP 413 segera setelah batas terlampaui (atau langsung dari header
+# Content-Length). File yang isinya identik dengan versi terakhir dokumen bernama sama
+# tidak diingesti ulang. Setiap versi disimpan di `UPLOAD_DIR/<sha256>/<filename>`.
+UPLOAD_DIR = "data/uploads"
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "20"))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+# --- Konfigurasi Chunking ---
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Jika True, pencocokan entitas saat pengayaan chunk tidak peka huruf besar/kecil dan spasi.
+ENRICHMENT_CASE_INSENSITIVE = os.getenv("ENRICHMENT_CASE_INSENSITIVE", "false").lower() == "true"
+# Penanda footer fakta graf yang ditambahkan ke chunk. ID chunk dihitung dari teks sebelum
+# penanda ini, sehingga perubahan fakta graf tidak mengubah ID chunk yang isinya sama.
+ENRICHMENT_MARKER = "\n\n[Konteks dari Knowledge Graph]:\n"
+
+# --- Konfigurasi Ekstraksi Knowledge Graph ---
+# Dokumen panjang dipecah menjadi beberapa jendela teks yang diekstrak secara konkuren
+# (dibatasi semaphore) agar tidak melebihi batas konteks LLM. Kegagalan API ditangani
+# dengan backoff eksponensial non-blocking ditambah jitter.
+GRAPH_EXTRACTION_WINDOW_SIZE = int(os.getenv("GRAPH_EXTRACTION_WINDOW_SIZE", "6000"))
+GRAPH_EXTRACTION_WINDOW_OVERLAP = int(os.getenv("GRAPH_EXTRACTION_WINDOW_OVERLAP", "300"))
+GRAPH_EXTRACTION_MAX_CONCURRENCY = int(os.getenv("GRAPH_EXTRACTION_MAX_CONCURRENCY", "4"))
+GRAPH_EXTRACTION_BACKOFF_BASE = 1.0
+GRAPH_EXTRACTION_BACKOFF_MAX = 30.0
+
+# --- Konfigurasi Retrieval ---
+VECTOR_SEARCH_TOP_K = 5
+# Cache dua tingkat untuk pencarian vektor: teks kueri -> embedding, dan
+# (embedding, daftar file, k) -> hasil. Entri kedaluwarsa setelah TTL dan dibatasi
+# jumlahnya dengan eviksi LRU; hasil untuk sebuah dokumen dibuang saat dokumen diindeks ulang.
+# Cache ini per proses; setiap hasil disimpan bersama versi manifest dokumennya, sehingga
+# ingesti ulang oleh proses mana pun (yang berbagi MANIFEST_DIR) langsung membuat hasil lama tidak terpakai.
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+RETRIEVAL_CACHE_MAX_QUERIES = int(os.getenv("RETRIEVAL_CACHE_MAX_QUERIES", "2048"))
+RETRIEVAL_CACHE_MAX_RESULTS = int(os.getenv("RETRIEVAL_CACHE_MAX_RESULTS", "1024"))
+
+# --- Konfigurasi Hybrid Retrieval (BM25 + Vektor) ---
+# Indeks leksikal BM25 (SQLite FTS5) dibangun bersamaan dengan indeks vektor untuk
+# menangkap identifier eksak (nomor kontrak, NIK, nama dengan ejaan langka). Hasil
+# pencarian leksikal dan vektor digabung dengan Reciprocal Rank Fusion (RRF).
+LEXICAL_SEARCH_ENABLED = os.getenv("LEXICAL_SEARCH_ENABLED", "true").lower() == "true"
+LEXICAL_INDEX_PATH = "data/lexical_index.sqlite3"
+LEXICAL_INDEX_MMAP_BYTES = int(os.getenv("LEXICAL_INDEX_MMAP_BYTES", str(256 * 1024 * 1024)))
+# Jumlah kandidat yang diambil dari masing-masing retriever sebelum digabung.
+HYBRID_CANDIDATES = 10
+RRF_K = 60
+
+# --- Konfigurasi Penyusunan Konteks ---
+# Konteks untuk jawaban akhir disusun dalam anggaran token: potongan dipilih dengan Maximal
+# Marginal Relevance (relevansi vs. kemiripan leksikal dengan potongan yang sudah dipilih),
+# potongan bertetangga yang tumpang tindih (akibat CHUNK_OVERLAP) digabung, dan baris fakta
+# graf yang berulang di footer potongan ditulis sekali saja.
+CONTEXT_BUILDER_ENABLED = os.getenv("CONTEXT_BUILDER_ENABLED", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Porsi maksimum anggaran untuk baris fakta graf; sisanya (dan porsi fakta yang tidak terpakai) untuk potongan teks.
+CONTEXT_FACT_BUDGET_SHARE = 0.25
+CONTEXT_MMR_LAMBDA = 0.7
+# Panjang minimum tumpang tindih (karakter) agar dua potongan dianggap bersambung.
+CONTEXT_MIN_OVERLAP_CHARS = 40
+
+# --- Konfigurasi Graph Retrieval ---
+# Saat kueri, entitas yang disebut dalam pertanyaan dicari melalui full-text index Neo4j
+# (tanpa panggilan LLM tambahan), lalu lingkungan 1-2 hop-nya diambil dan digabung ke konteks.
+GRAPH_RETRIEVAL_ENABLED = os.getenv("GRAPH_RETRIEVAL_ENABLED", "true").lower() == "true"
+GRAPH_RETRIEVAL_HOPS = int(os.getenv("GRAPH_RETRIEVAL_HOPS", "2"))
+GRAPH_RETRIEVAL_MAX_ENTITIES = 5
+GRAPH_RETRIEVAL_MAX_FACTS = 30
+
+# Cache adjacency graf per dokumen di memori proses API. Jika aktif, pencarian entitas dan
+# traversal lingkungan dilakukan secara lokal; Neo4j hanya dibaca sekali per dokumen saat
+# grafnya belum ada di cache. Graf dimuat ulang jika manifest dokumen berubah sejak graf
+# disimpan (ingesti ulang oleh proses API lain yang berbagi MANIFEST_DIR), atau setelah
+# GRAPH_CACHE_TTL_SECONDS untuk perubahan yang tidak tercermin di manifest (0 = tanpa TTL).
+GRAPH_CACHE_ENABLED = os.getenv("GRAPH_CACHE_ENABLED", "true").lower() == "true"
+GRAPH_CACHE_MAX_DOCUMENTS = int(os.getenv("GRAPH_CACHE_MAX_DOCUMENTS", "64"))
+GRAPH_CACHE_TTL_SECONDS = float(os.getenv("GRAPH_CACHE_TTL_SECONDS", "600"))
+
+# --- Konfigurasi Retrieval Spekulatif ---
+# Pada percakapan lanjutan, retrieval dengan kueri asli dijalankan paralel dengan formulasi
+# ulang. Hasilnya dipakai jika kueri hasil formulasi ulang setara (kemiripan token >=
+# REPHRASE_EQUIVALENCE_THRESHOLD); jika tidak, retrieval diulang dengan kueri baru.
+# Formulasi ulang dilewati sepenuhnya jika pertanyaan tidak mengandung kata rujukan
+# (dia, itu, -nya, ...) dan sudah cukup lengkap atau banyak beririsan dengan riwayat.
+SPECULATIVE_RETRIEVAL_ENABLED = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "true").lower() == "true"
+REPHRASE_MIN_CONTENT_TOKENS = 3
+REPHRASE_SKIP_OVERLAP = 0.5
+REPHRASE_EQUIVALENCE_THRESHOLD = 0.8
+
+# --- Konfigurasi Kueri Batch ---
+# `/query/batch` memproses banyak pertanyaan sekaligus: formulasi ulang, pencarian leksikal
+# dan graph retrieval per kueri, serta pembangkitan jawaban dibatasi konkurensinya, sedangkan
+# embedding dan pencarian vektor dibagi bersama. Batas retrieval mencegah satu batch besar
+# membuka ratusan sesi Neo4j atau menghabiskan thread pool sekaligus.
+BATCH_QUERY_MAX_ITEMS = int(os.getenv("BATCH_QUERY_MAX_ITEMS", "500"))
+BATCH_REPHRASE_CONCURRENCY = int(os.getenv("BATCH_REPHRASE_CONCURRENCY", "8"))
+BATCH_RETRIEVAL_CONCURRENCY = int(os.getenv("BATCH_RETRIEVAL_CONCURRENCY", "16"))
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "8"))
+
+# --- Konfigurasi Riwayat Percakapan ---
+# Riwayat yang dikirim ke prompt formulasi ulang dibatasi: hanya HISTORY_VERBATIM_MESSAGES
+# pesan terakhir yang disertakan apa adanya, sedangkan pesan yang lebih lama diringkas
+# secara inkremental dan ringkasannya disimpan di server per `conversation_id`.
+# Total riwayat (ringkasan + pesan verbatim) dibatasi HISTORY_TOKEN_BUDGET token (estimasi).
+HISTORY_VERBATIM_MESSAGES = int(os.getenv("HISTORY_VERBATIM_MESSAGES", "6"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_SUMMARY_MAX_CONVERSATIONS = int(os.getenv("HISTORY_SUMMARY_MAX_CONVERSATIONS", "1024"))
+HISTORY_SUMMARY_TTL_SECONDS = float(os.getenv("HISTORY_SUMMARY_TTL_SECONDS", "86400"))
+
 # ==============================================================================
 # SECTION 3: TEMPLATE PROMPT UNTUK LLM
 # ==============================================================================
@@ -89,6 +327,19 @@ Follow Up Input: {query}
 
 Standalone question:"""
 
+# --- 2b. Prompt Ringkasan Riwayat Percakapan ---
+# Pesan-pesan lama dilipat ke dalam ringkasan berjalan (rolling summary) secara inkremental:
+# LLM hanya menerima ringkasan sebelumnya dan pesan yang belum diringkas, bukan seluruh riwayat.
+HISTORY_SUMMARY_PROMPT = """Progressively summarize the conversation below, building on the existing summary. Keep every name, number, date, document and entity that a later question might refer to. Write the summary in the same language as the conversation, in at most {max_words} words.
+
+Existing summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
 # --- 3. Prompt Pembangkitan Kueri Cypher ---
 # Prompt ini mengubah pertanyaan dalam bahasa alami menjadi kueri Cypher yang sintaktis.
 # Ini adalah jembatan antara pertanyaan pengguna dan knowledge graph. Instruksi untuk tidak
@@ -132,11 +383,79 @@ JAWABAN ANDA:
 # ==============================================================================
 
 # --- Kueri MERGE untuk Neo4j ---
-# Kueri ini digunakan untuk menyimpan triplet ke Neo4j.
-# `MERGE` akan membuat node atau relasi hanya jika belum ada, mencegah duplikasi
-# data jika dokumen yang sama diproses ulang. Properti `filename` memastikan data dari dokumen yang berbeda tetap terisolasi.
-NEO4J_MERGE_QUERY = (
-    "MERGE (h:{head_label} {{name: $head, filename: $filename}}) "
-    "MERGE (t:{tail_label} {{name: $tail, filename: $filename}}) "
+# Kueri ini digunakan untuk menyimpan triplet ke Neo4j secara batch.
+# Triplet dikelompokkan berdasarkan (label subjek, relasi, label objek) karena label dan
+# tipe relasi tidak dapat diparameterisasi di Cypher; setiap kelompok ditulis dengan satu
+# `UNWIND $rows` dalam satu transaksi. `MERGE` akan membuat node atau relasi hanya jika
+# belum ada, mencegah duplikasi data jika dokumen yang sama diproses ulang. Properti
+# `filename` memastikan data dari dokumen yang berbeda tetap terisolasi.
+# Setiap node juga diberi label bersama NEO4J_DOCUMENT_NODE_LABEL agar seluruh node milik
+# satu dokumen dapat dibaca lewat indeks `filename` tanpa mengetahui label entitasnya.
+NEO4J_DOCUMENT_NODE_LABEL = "DocumentEntity"
+NEO4J_UNWIND_MERGE_QUERY = (
+    "UNWIND $rows AS row "
+    "MERGE (h:{head_label} {{name: row.head, filename: $filename}}) "
+    "MERGE (t:{tail_label} {{name: row.tail, filename: $filename}}) "
+    "SET h:" + NEO4J_DOCUMENT_NODE_LABEL + ", t:" + NEO4J_DOCUMENT_NODE_LABEL + " "
     "MERGE (h)-[:`{relation}`]->(t)"
 )
+NEO4J_WRITE_BATCH_SIZE = int(os.getenv("NEO4J_WRITE_BATCH_SIZE", "1000"))
+
+# --- Kueri Penghapusan & Pembacaan Triplet ---
+# Dipakai saat ingesti ulang: relasi yang tidak lagi muncul di revisi dokumen dihapus,
+# lalu node milik dokumen tersebut yang tidak lagi memiliki relasi ikut dibersihkan.
+NEO4J_UNWIND_DELETE_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (h:{head_label} {{name: row.head, filename: $filename}})"
+    "-[r:`{relation}`]->"
+    "(t:{tail_label} {{name: row.tail, filename: $filename}}) "
+    "DELETE r"
+)
+NEO4J_DELETE_ORPHANS_QUERY = "MATCH (n:{label} {{filename: $filename}}) WHERE NOT (n)--() DELETE n"
+NEO4J_FETCH_DOCUMENT_TRIPLETS_QUERY = (
+    "MATCH (h:" + NEO4J_DOCUMENT_NODE_LABEL + " {filename: $filename})-[r]->(t:" + NEO4J_DOCUMENT_NODE_LABEL + " {filename: $filename}) "
+    "RETURN h.name AS head, [l IN labels(h) WHERE l <> '" + NEO4J_DOCUMENT_NODE_LABEL + "'][0] AS head_label, "
+    "type(r) AS relation, t.name AS tail, [l IN labels(t) WHERE l <> '" + NEO4J_DOCUMENT_NODE_LABEL + "'][0] AS tail_label"
+)
+
+# --- Skema Neo4j ---
+# Indeks komposit (name, filename) untuk setiap label entitas agar `MERGE` memakai index
+# seek alih-alih label scan. Label dari LLM di luar daftar ini dipetakan ke `ENTITY` saat
+# ingesti, sehingga jumlah label (dan indeksnya) tetap terbatas.
+NEO4J_ENTITY_LABELS = ["PERSON", "ORGANIZATION", "ROLE", "PROJECT", "LOCATION", "DATE", "DOCUMENT", "ENTITY"]
+NEO4J_ENTITY_INDEX_QUERY = (
+    "CREATE INDEX entity_{label_lower}_name_filename IF NOT EXISTS "
+    "FOR (n:{label}) ON (n.name, n.filename)"
+)
+NEO4J_DOCUMENT_NODE_INDEX_QUERY = (
+    "CREATE INDEX document_entity_filename IF NOT EXISTS "
+    "FOR (n:" + NEO4J_DOCUMENT_NODE_LABEL + ") ON (n.filename)"
+)
+# Node dari versi sebelumnya (tanpa label bersama) diberi label secara bertahap saat startup.
+NEO4J_DOCUMENT_NODE_BACKFILL_QUERY = (
+    "MATCH (n) WHERE n.filename IS NOT NULL AND NOT n:" + NEO4J_DOCUMENT_NODE_LABEL + " "
+    "WITH n LIMIT $batch_size SET n:" + NEO4J_DOCUMENT_NODE_LABEL + " RETURN count(n) AS labelled"
+)
+# Full-text index nama entitas dibangun di atas label dokumen bersama, sehingga mencakup
+# setiap node apa pun label entitasnya. Index versi sebelumnya (per label entitas) dihapus.
+NEO4J_FULLTEXT_INDEX_NAME = "document_entity_name_fulltext"
+NEO4J_FULLTEXT_INDEX_QUERY = (
+    "CREATE FULLTEXT INDEX " + NEO4J_FULLTEXT_INDEX_NAME + " IF NOT EXISTS "
+    "FOR (n:" + NEO4J_DOCUMENT_NODE_LABEL + ") ON EACH [n.name]"
+)
+NEO4J_LEGACY_FULLTEXT_INDEX_DROP_QUERY = "DROP INDEX entity_name_fulltext IF EXISTS"
+
+# --- Kueri Graph Retrieval ---
+# Mencari entitas melalui full-text index, membatasinya pada dokumen yang dipilih, lalu
+# mengembangkan lingkungan hingga `{hops}` hop dalam satu round trip. Jumlah hop tidak
+# dapat diparameterisasi di Cypher, sehingga template dibentuk sekali per nilai hop.
+NEO4J_GRAPH_NEIGHBORHOOD_QUERY = (
+    "CALL db.index.fulltext.queryNodes($index_name, $search) YIELD node, score "
+    "WHERE node.filename IN $filenames "
+    "WITH node ORDER BY score DESC LIMIT $max_entities "
+    "MATCH path = (node)-[*1..{hops}]-() "
+    "UNWIND relationships(path) AS r "
+    "WITH DISTINCT r "
+    "RETURN startNode(r).name AS head, type(r) AS relation, endNode(r).name AS tail "
+    "LIMIT $max_facts"
+)
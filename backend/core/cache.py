@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache in-memory dengan batas jumlah entri (eviksi LRU) dan masa berlaku (TTL) per entri.
+
+    Aman dipakai dari beberapa thread. Statistik hit/miss dicatat untuk keperluan observabilitas.
+
+    Args:
+        maxsize (int): Jumlah entri maksimum sebelum entri yang paling lama tidak dipakai dibuang.
+        ttl_seconds (float): Masa berlaku entri dalam detik. `0` berarti tanpa kedaluwarsa.
+        on_evict (Optional[Callable]): Dipanggil dengan `(key, value)` setiap kali entri
+            dibuang karena eviksi, kedaluwarsa, atau dihapus secara eksplisit.
+        lock (Optional[threading.RLock]): Lock yang dipakai bersama struktur data lain yang
+            diperbarui dari `on_evict`, agar urutan penguncian selalu konsisten.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float = 0, on_evict: Optional[Callable[[Hashable, Any], None]] = None, lock: Optional[threading.RLock] = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = lock or threading.RLock()
+
+    def _expired(self, expires_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.monotonic() >= expires_at
+
+    def _remove(self, key: Hashable):
+        _, value = self._data.pop(key)
+        if self.on_evict:
+            self.on_evict(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Mengambil nilai untuk `key`, atau `default` jika tidak ada atau sudah kedaluwarsa."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or self._expired(entry[0]):
+                if entry is not _MISSING:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Menyimpan nilai untuk `key` dan membuang entri tertua jika kapasitas terlampaui."""
+        with self._lock:
+            if key in self._data:
+                self._data.pop(key)
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key: Hashable):
+        """Menghapus `key` dari cache jika ada."""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        """Mengosongkan seluruh isi cache."""
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        """Mengembalikan statistik hit, miss, hit rate, dan ukuran cache saat ini."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
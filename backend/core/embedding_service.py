@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from config import EMBEDDING_MAX_BATCH_SIZE, EMBEDDING_MAX_WAIT_MS, EMBEDDING_WARMUP_TEXT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Prioritas permintaan embedding: angka lebih kecil diproses lebih dahulu.
+QUERY_PRIORITY = 0
+INGESTION_PRIORITY = 1
+
+
+class LazyEmbeddingFunction:
+    """
+    Fungsi embedding yang baru memuat model saat pertama kali dibutuhkan.
+
+    Memuat model embedding (dan mengimpor `sentence_transformers`) memakan waktu puluhan
+    detik. Dengan pembungkus ini, startup aplikasi tidak menunggu model: model dimuat oleh
+    `load()` (misalnya di background saat warm-up) atau otomatis pada pemanggilan pertama.
+    `load()` aman dipanggil bersamaan; model hanya dimuat sekali.
+
+    Args:
+        factory (Callable[[], object]): Fungsi tanpa argumen yang membuat fungsi embedding dasar.
+        warmup_text (str): Teks dummy untuk forward pass pertama setelah model dimuat.
+    """
+
+    def __init__(self, factory: Callable[[], object], warmup_text: str = EMBEDDING_WARMUP_TEXT):
+        self._factory = factory
+        self._warmup_text = warmup_text
+        self._base = None
+        self._lock = threading.Lock()
+        self.load_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._base is not None
+
+    def load(self):
+        """Memuat model dan menjalankan satu forward pass dummy agar kueri pertama tidak lambat."""
+        if self._base is not None:
+            return self._base
+        with self._lock:
+            if self._base is None:
+                started = time.perf_counter()
+                try:
+                    base = self._factory()
+                    base([self._warmup_text])
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error(f"Gagal memuat model embedding: {e}", exc_info=True)
+                    raise
+                self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+                self.error = None
+                self._base = base
+                logger.info(f"Model embedding dimuat dan dipanaskan dalam {self.load_ms} ms.")
+        return self._base
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __call__(self, input: List[str]) -> list:
+        return self.load()(input)
+
+
+class BatchingEmbeddingFunction:
+    """
+    Pembungkus fungsi embedding yang melakukan dynamic batching lintas permintaan.
+
+    Semua teks yang dikirim oleh permintaan yang berjalan bersamaan dimasukkan ke antrean
+    prioritas. Sebuah thread worker mengambil hingga `max_batch_size` teks (menunggu paling
+    lama `max_wait_ms` agar batch terisi), menjalankan satu forward pass model, lalu
+    menyelesaikan future milik setiap pemanggil. Teks kueri selalu didahulukan dibanding
+    teks ingesti, sehingga unggahan besar tidak menambah latensi kueri lebih dari satu batch.
+
+    Kelas ini tetap dapat dipanggil seperti fungsi embedding ChromaDB biasa (`__call__`),
+    dan atribut lain (misalnya `name()`) diteruskan ke fungsi embedding dasarnya.
+
+    Args:
+        base_embedding_function: Fungsi embedding dasar (misalnya
+            `SentenceTransformerEmbeddingFunction`).
+        max_batch_size (int): Jumlah teks maksimum per forward pass.
+        max_wait_ms (float): Waktu tunggu maksimum untuk mengisi batch, dalam milidetik.
+    """
+
+    def __init__(self, base_embedding_function, max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE, max_wait_ms: float = EMBEDDING_MAX_WAIT_MS):
+        self._base = base_embedding_function
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def __getattr__(self, name):
+        # Hanya dipanggil untuk atribut yang tidak ditemukan pada instance ini.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._base, name)
+
+    @property
+    def pending(self) -> int:
+        """Jumlah teks yang sedang menunggu di antrean."""
+        with self._condition:
+            return len(self._queue)
+
+    def submit(self, texts: List[str], priority: int = INGESTION_PRIORITY) -> List[Future]:
+        """
+        Memasukkan teks ke antrean embedding.
+
+        Args:
+            texts (List[str]): Teks yang akan di-embed.
+            priority (int): `QUERY_PRIORITY` atau `INGESTION_PRIORITY`.
+
+        Returns:
+            List[Future]: Satu future per teks, berisi vektor embedding-nya.
+        """
+        futures = [Future() for _ in texts]
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Layanan embedding sudah dihentikan.")
+            for text, future in zip(texts, futures):
+                heapq.heappush(self._queue, (priority, next(self._sequence), text, future))
+            self._condition.notify()
+        return futures
+
+    async def aembed(self, texts: List[str], priority: int = INGESTION_PRIORITY) -> list:
+        """
+        Versi asinkron dari embedding: menunggu hasil tanpa memblokir event loop.
+
+        Args:
+            texts (List[str]): Teks yang akan di-embed.
+            priority (int): `QUERY_PRIORITY` atau `INGESTION_PRIORITY`.
+
+        Returns:
+            list: Vektor embedding dengan urutan yang sama seperti `texts`.
+        """
+        if not texts:
+            return []
+        futures = self.submit(list(texts), priority)
+        return list(await asyncio.gather(*[asyncio.wrap_future(future) for future in futures]))
+
+    def __call__(self, input: List[str]) -> list:
+        # Antarmuka sinkron yang dipakai ChromaDB. Satu teks diasumsikan sebagai kueri.
+        priority = QUERY_PRIORITY if len(input) == 1 else INGESTION_PRIORITY
+        return [future.result() for future in self.submit(list(input), priority)]
+
+    def _next_batch(self) -> list:
+        with self._condition:
+            while not self._queue and not self._stopped:
+                self._condition.wait()
+            if not self._queue:
+                return []
+
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [heapq.heappop(self._queue) for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            items = [(text, future) for _, _, text, future in batch if future.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            try:
+                embeddings = self._base([text for text, _ in items])
+                for (_, future), embedding in zip(items, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                logger.error(f"Gagal menjalankan batch embedding berisi {len(items)} teks: {e}", exc_info=True)
+                for _, future in items:
+                    future.set_exception(e)
+
+    def close(self):
+        """Menghentikan thread worker setelah antrean yang tersisa selesai diproses."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._worker.join(timeout=30)
+
+
+async def embed_texts(embedding_function, texts: List[str], priority: int = INGESTION_PRIORITY) -> list:
+    """
+    Menghasilkan embedding tanpa memblokir event loop, untuk fungsi embedding jenis apa pun.
+
+    Jika fungsi embedding mendukung batching (`aembed`), antrean prioritasnya dipakai;
+    jika tidak, fungsi dipanggil di thread terpisah.
+
+    Args:
+        embedding_function: Fungsi embedding yang dipakai aplikasi.
+        texts (List[str]): Teks yang akan di-embed.
+        priority (int): `QUERY_PRIORITY` atau `INGESTION_PRIORITY`.
+
+    Returns:
+        list: Vektor embedding dengan urutan yang sama seperti `texts`.
+    """
+    if hasattr(embedding_function, "aembed"):
+        return await embedding_function.aembed(texts, priority=priority)
+    return await asyncio.to_thread(embedding_function, list(texts))
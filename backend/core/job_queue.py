@@ -0,0 +1,406 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from config import JOB_QUEUE_PATH, JOB_QUEUE_MAX_PENDING, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_SECONDS, JOB_LEASE_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Urutan tahap ingesti. Tiga tahap pertama dijalankan worker, tahap indeksasi di proses API.
+STAGES = ("parse", "extract", "chunk", "index")
+WORKER_STAGES = STAGES[:3]
+
+# Status job:
+# queued -> running (worker) -> pending_index -> indexing (proses API) -> succeeded
+# Setiap status dapat berakhir di `failed` jika sebuah tahap gagal melebihi batas percobaan.
+ACTIVE_STATUSES = ("queued", "running", "pending_index", "indexing")
+# Status yang sedang dipegang sebuah proses -> status untuk mengulanginya.
+CLAIMED_STATUSES = {"running": "queued", "indexing": "pending_index"}
+_HOSTNAME = socket.gethostname()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    stages TEXT NOT NULL,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    available_at REAL NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    worker_host TEXT,
+    worker_pid INTEGER,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created_at);
+"""
+# Kolom yang ditambahkan setelah skema awal; database lama diperbarui saat koneksi dibuka.
+_ADDED_COLUMNS = {"content_hash": "TEXT", "worker_host": "TEXT", "worker_pid": "INTEGER", "lease_expires_at": "REAL"}
+# Kolom kepemilikan job, dikosongkan setiap kali job dilepas oleh prosesnya.
+_RELEASED_OWNER = {"worker": None, "worker_host": None, "worker_pid": None, "lease_expires_at": None}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class QueueFullError(Exception):
+    """Dilempar saat jumlah job aktif sudah mencapai batas antrean."""
+
+
+class JobQueue:
+    """
+    Antrean job ingesti yang persisten di SQLite, aman dipakai lintas thread dan proses.
+
+    Pengambilan job (`claim`) dilakukan di dalam transaksi `BEGIN IMMEDIATE`, sehingga
+    beberapa worker di proses berbeda tidak pernah mengambil job yang sama. Progres per
+    tahap disimpan sebagai JSON di kolom `stages`.
+
+    Args:
+        db_path (str): Lokasi berkas database SQLite.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_filename_created ON jobs(filename, created_at)")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["stages"] = json.loads(job["stages"])
+        return job
+
+    def active_count(self) -> int:
+        """Mengembalikan jumlah job yang belum selesai."""
+        placeholders = ",".join("?" * len(ACTIVE_STATUSES))
+        row = self._connection().execute(f"SELECT COUNT(*) FROM jobs WHERE status IN ({placeholders})", ACTIVE_STATUSES).fetchone()
+        return row[0]
+
+    def enqueue(self, filename: str, file_path: str, max_pending: int = JOB_QUEUE_MAX_PENDING,
+                content_hash: Optional[str] = None) -> dict:
+        """
+        Menambahkan job ingesti baru ke antrean.
+
+        Raises:
+            QueueFullError: Jika jumlah job aktif sudah mencapai `max_pending`.
+        """
+        return self.enqueue_many([(filename, file_path, content_hash)], max_pending)[0]
+
+    def enqueue_many(self, items: Sequence[Tuple[str, str, Optional[str]]], max_pending: int = JOB_QUEUE_MAX_PENDING) -> List[dict]:
+        """
+        Menambahkan beberapa job ingesti sekaligus dalam satu transaksi.
+
+        Seluruh job diterima atau seluruhnya ditolak, sehingga unggahan multi-file tidak
+        berakhir setengah terjadwal saat antrean hampir penuh.
+
+        Args:
+            items: Daftar `(filename, file_path, content_hash)`.
+            max_pending (int): Batas jumlah job aktif.
+
+        Raises:
+            QueueFullError: Jika job aktif ditambah job baru melebihi `max_pending`.
+        """
+        with self._transaction() as connection:
+            self._check_capacity_in(connection, len(items), max_pending)
+            job_ids = self._insert_in(connection, items)
+        return [self.get(job_id) for job_id in job_ids]
+
+    def enqueue_changed(self, items: Sequence[Tuple[str, str, str]], max_pending: int = JOB_QUEUE_MAX_PENDING,
+                        before_insert: Optional[Callable[[List[int]], None]] = None) -> List[Tuple[dict, bool]]:
+        """
+        Seperti `enqueue_many`, tetapi melewati file yang isinya identik dengan versi terakhirnya.
+
+        Sebuah item dianggap duplikat jika job terbaru untuk nama file yang sama belum gagal
+        dan memiliki `content_hash` yang sama. Pemeriksaan duplikat, kapasitas, dan penyisipan
+        dilakukan dalam satu transaksi `BEGIN IMMEDIATE`, sehingga dua unggahan serentak atas
+        file yang sama (dari proses mana pun) tidak menghasilkan dua job.
+
+        Args:
+            items: Daftar `(filename, file_path, content_hash)`.
+            max_pending (int): Batas jumlah job aktif.
+            before_insert: Dipanggil di dalam transaksi dengan indeks item yang akan dimasukkan,
+                misalnya untuk memindahkan file ke `file_path`. Jika gagal, tidak ada job yang dibuat.
+
+        Returns:
+            List[Tuple[dict, bool]]: `(job, duplicate)` per item, sesuai urutan `items`. Untuk
+                duplikat, `job` adalah job sebelumnya.
+
+        Raises:
+            QueueFullError: Jika job aktif ditambah job baru melebihi `max_pending`.
+        """
+        results: List[Optional[Tuple[dict, bool]]] = [None] * len(items)
+        new_indices, job_ids = [], []
+        with self._transaction() as connection:
+            for index, (filename, _, content_hash) in enumerate(items):
+                previous = connection.execute(
+                    "SELECT * FROM jobs WHERE filename = ? ORDER BY created_at DESC LIMIT 1", (filename,)
+                ).fetchone()
+                if previous is not None and previous["status"] != "failed" and previous["content_hash"] == content_hash:
+                    results[index] = (self._to_dict(previous), True)
+                else:
+                    new_indices.append(index)
+            if new_indices:
+                self._check_capacity_in(connection, len(new_indices), max_pending)
+                if before_insert is not None:
+                    before_insert(new_indices)
+                job_ids = self._insert_in(connection, [items[index] for index in new_indices])
+        for index, job_id in zip(new_indices, job_ids):
+            results[index] = (self.get(job_id), False)
+        return results
+
+    @staticmethod
+    def _check_capacity_in(connection: sqlite3.Connection, count: int, max_pending: int):
+        placeholders = ",".join("?" * len(ACTIVE_STATUSES))
+        active = connection.execute(f"SELECT COUNT(*) FROM jobs WHERE status IN ({placeholders})", ACTIVE_STATUSES).fetchone()[0]
+        if active + count > max_pending:
+            raise QueueFullError(f"Antrean ingesti penuh ({active} job aktif, {count} job baru).")
+
+    @staticmethod
+    def _insert_in(connection: sqlite3.Connection, items: Sequence[Tuple[str, str, Optional[str]]]) -> List[str]:
+        now = time.time()
+        stages = json.dumps({stage: {"status": "pending", "attempts": 0} for stage in STAGES})
+        job_ids = [uuid.uuid4().hex for _ in items]
+        # Waktu dibuat dibedakan sedikit agar urutan job mengikuti urutan unggahan.
+        connection.executemany(
+            "INSERT INTO jobs(id, filename, file_path, status, stage, stages, created_at, updated_at, content_hash) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+            [
+                (job_id, filename, file_path, STAGES[0], stages, now + index * 1e-6, now, content_hash)
+                for index, (job_id, (filename, file_path, content_hash)) in enumerate(zip(job_ids, items))
+            ]
+        )
+        return job_ids
+
+    def latest_for(self, filename: str) -> Optional[dict]:
+        """Mengambil job terbaru untuk sebuah dokumen, atau `None` jika dokumen belum pernah diunggah."""
+        row = self._connection().execute(
+            "SELECT * FROM jobs WHERE filename = ? ORDER BY created_at DESC LIMIT 1", (filename,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim(self, ready_status: str, running_status: str, worker: str) -> Optional[dict]:
+        """
+        Mengambil job tertua berstatus `ready_status` dan menandainya `running_status` secara atomik.
+
+        Returns:
+            Optional[dict]: Job yang diambil, atau `None` jika antrean kosong.
+        """
+        placeholders = ",".join("?" * len(ACTIVE_STATUSES))
+        with self._transaction() as connection:
+            # Job untuk dokumen yang sama diproses berurutan: job hanya boleh diambil jika
+            # tidak ada job lebih lama untuk file yang sama yang masih aktif.
+            row = connection.execute(
+                f"""
+                SELECT id FROM jobs AS j
+                WHERE j.status = ? AND j.available_at <= ? AND NOT EXISTS (
+                    SELECT 1 FROM jobs AS o
+                    WHERE o.filename = j.filename AND o.created_at < j.created_at AND o.status IN ({placeholders})
+                )
+                ORDER BY j.created_at LIMIT 1
+                """,
+                (ready_status, time.time(), *ACTIVE_STATUSES)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            connection.execute(
+                "UPDATE jobs SET status = ?, worker = ?, worker_host = ?, worker_pid = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (running_status, worker, _HOSTNAME, os.getpid(), now + JOB_LEASE_SECONDS, now, row["id"])
+            )
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str) -> bool:
+        """
+        Memperpanjang lease job yang sedang dikerjakan proses ini.
+
+        Returns:
+            bool: `False` jika job tidak lagi dipegang proses ini (misalnya lease-nya sempat
+                habis dan job sudah dikembalikan ke antrean).
+        """
+        placeholders = ",".join("?" * len(CLAIMED_STATUSES))
+        with self._transaction() as connection:
+            updated = connection.execute(
+                f"UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_host = ? AND worker_pid = ? AND status IN ({placeholders})",
+                (time.time() + JOB_LEASE_SECONDS, job_id, _HOSTNAME, os.getpid(), *CLAIMED_STATUSES)
+            ).rowcount
+        return updated > 0
+
+    def _update_stage(self, job_id: str, stage: str, job_fields: Optional[dict] = None, **stage_fields) -> dict:
+        with self._transaction() as connection:
+            return self._update_stage_in(connection, job_id, stage, job_fields, **stage_fields)
+
+    @staticmethod
+    def _update_stage_in(connection: sqlite3.Connection, job_id: str, stage: str, job_fields: Optional[dict] = None, **stage_fields) -> dict:
+        row = connection.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        stages = json.loads(row["stages"])
+        stages[stage].update(stage_fields)
+        fields = {"stages": json.dumps(stages), "updated_at": time.time(), **(job_fields or {})}
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        return stages
+
+    def _fail_stage_in(self, connection: sqlite3.Connection, job_id: str, stage: str, error: str, retry_status: str, max_attempts: int) -> bool:
+        row = connection.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        attempts = json.loads(row["stages"])[stage].get("attempts", 0) + 1
+        retry = attempts < max_attempts
+        job_fields = {
+            **_RELEASED_OWNER,
+            "status": retry_status,
+            "available_at": time.time() + JOB_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+        } if retry else {**_RELEASED_OWNER, "status": "failed", "error": error, "finished_at": time.time()}
+        self._update_stage_in(connection, job_id, stage, job_fields, status="retrying" if retry else "failed", attempts=attempts, error=error)
+        return retry
+
+    def start_stage(self, job_id: str, stage: str):
+        """Menandai sebuah tahap sedang berjalan."""
+        self._update_stage(job_id, stage, job_fields={"stage": stage}, status="running", started_at=time.time())
+
+    def finish_stage(self, job_id: str, stage: str, duration_ms: float, **details):
+        """Menandai sebuah tahap selesai beserta durasi dan detail hasilnya."""
+        self._update_stage(job_id, stage, status="done", duration_ms=round(duration_ms, 1), error=None, **details)
+
+    def fail_stage(self, job_id: str, stage: str, error: str, retry_status: str, max_attempts: int = JOB_MAX_ATTEMPTS) -> bool:
+        """
+        Mencatat kegagalan sebuah tahap dan menjadwalkan ulang job jika masih ada sisa percobaan.
+
+        Percobaan ulang ditunda dengan backoff eksponensial agar kegagalan sementara (misalnya
+        kuota API) tidak langsung menghabiskan seluruh percobaan.
+
+        Args:
+            retry_status (str): Status job jika tahap akan diulang (`queued` atau `pending_index`).
+
+        Returns:
+            bool: `True` jika tahap akan diulang, `False` jika job dinyatakan gagal.
+        """
+        with self._transaction() as connection:
+            return self._fail_stage_in(connection, job_id, stage, error, retry_status, max_attempts)
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        """Mengubah status job. Status akhir (`succeeded`/`failed`) juga mencatat waktu selesai."""
+        finished_at = time.time() if status in ("succeeded", "failed") else None
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker = NULL, worker_host = NULL, worker_pid = NULL, lease_expires_at = NULL, "
+                "updated_at = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), finished_at, job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Mengambil job berdasarkan ID, atau `None` jika tidak ada."""
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _is_orphaned(row: sqlite3.Row, now: float, dead_pids: Sequence[int] = ()) -> bool:
+        if (row["lease_expires_at"] or 0) < now:
+            return True
+        if row["worker_host"] != _HOSTNAME or row["worker_pid"] is None:
+            return False
+        return row["worker_pid"] in dead_pids or not _pid_alive(row["worker_pid"])
+
+    def recover(self, dead_pids: Sequence[int] = ()) -> int:
+        """
+        Mengembalikan job yang ditinggalkan prosesnya ke antrean.
+
+        Hanya job berstatus `running`/`indexing` yang lease-nya sudah habis, atau yang proses
+        pemiliknya di host ini sudah mati (termasuk `dead_pids`), yang dipulihkan; job milik
+        proses lain yang masih hidup tidak disentuh, sehingga aman dipanggil dari setiap
+        proses API kapan saja. Pemulihan dihitung sebagai satu percobaan gagal untuk tahap
+        yang sedang berjalan, agar dokumen yang selalu membuat worker crash tidak diulang
+        tanpa batas. Tahap yang sudah selesai tidak diulang karena hasilnya tersimpan sebagai artefak.
+
+        Args:
+            dead_pids (Sequence[int]): PID proses worker yang diketahui sudah berhenti.
+
+        Returns:
+            int: Jumlah job yang dipulihkan.
+        """
+        placeholders = ",".join("?" * len(CLAIMED_STATUSES))
+        recovered = 0
+        with self._transaction() as connection:
+            now = time.time()
+            rows = connection.execute(
+                f"SELECT id, status, stages, worker, worker_host, worker_pid, lease_expires_at FROM jobs WHERE status IN ({placeholders})",
+                tuple(CLAIMED_STATUSES)
+            ).fetchall()
+            for row in rows:
+                if not self._is_orphaned(row, now, dead_pids):
+                    continue
+                # Tahap yang terputus adalah tahap pertama yang belum selesai di status tersebut.
+                stages = json.loads(row["stages"])
+                stage = "index" if row["status"] == "indexing" else next((s for s in WORKER_STAGES if stages[s]["status"] != "done"), None)
+                recovered += 1
+                if stage is None:
+                    # Seluruh tahap worker sudah selesai; job tinggal menunggu indeksasi.
+                    connection.execute(
+                        "UPDATE jobs SET status = 'pending_index', worker = NULL, worker_host = NULL, worker_pid = NULL, "
+                        "lease_expires_at = NULL, updated_at = ? WHERE id = ?", (now, row["id"])
+                    )
+                    continue
+                error = f"Proses '{row['worker']}' berhenti atau lease job habis saat tahap '{stage}' berjalan."
+                retry = self._fail_stage_in(connection, row["id"], stage, error, CLAIMED_STATUSES[row["status"]], JOB_MAX_ATTEMPTS)
+                logger.warning(f"Job {row['id']} ditinggalkan oleh '{row['worker']}'. {'Dikembalikan ke antrean.' if retry else 'Job gagal.'}")
+        if recovered:
+            logger.info(f"{recovered} job ingesti yang terputus dipulihkan.")
+        return recovered
+
+    def counts(self) -> dict:
+        """Mengembalikan jumlah job per status."""
+        rows = self._connection().execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["total"] for row in rows}
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        """Mengembalikan job terbaru, dari yang paling baru dibuat."""
+        rows = self._connection().execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+job_queue = JobQueue()
@@ -0,0 +1,159 @@
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List
+
+from config import LEXICAL_INDEX_PATH, LEXICAL_INDEX_MMAP_BYTES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    rowid INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE,
+    source_document TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_source_document ON chunks(source_document);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    content,
+    content='chunks',
+    content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS chunks_after_insert AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_after_delete AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+"""
+
+_SEARCH_QUERY = """
+SELECT c.chunk_id, c.source_document, c.content, bm25(chunks_fts) AS score
+FROM chunks_fts
+JOIN chunks AS c ON c.rowid = chunks_fts.rowid
+WHERE chunks_fts MATCH ? AND c.source_document IN ({placeholders})
+ORDER BY score
+LIMIT ?
+"""
+
+
+def build_match_expression(query: str) -> str:
+    """
+    Mengubah kueri bebas menjadi ekspresi MATCH FTS5 yang aman.
+
+    Setiap token dikutip agar karakter khusus FTS5 tidak ditafsirkan sebagai operator,
+    lalu digabung dengan OR sehingga peringkat diserahkan sepenuhnya ke BM25.
+    """
+    tokens = list(dict.fromkeys(re.findall(r"\w+", query.casefold())))
+    return " OR ".join(f'"{token}"' for token in tokens)
+
+
+class LexicalIndex:
+    """
+    Indeks leksikal BM25 yang persisten di disk, berbasis SQLite FTS5.
+
+    Isi chunk disimpan satu kali di tabel `chunks` dan indeks terbalik FTS5 dipelihara
+    otomatis melalui trigger (external content), sehingga penambahan dan penghapusan
+    bersifat inkremental per chunk. Berkas database dibaca melalui memory-mapped I/O
+    (`PRAGMA mmap_size`), sehingga indeks berukuran jutaan chunk tidak perlu dimuat ke RAM.
+
+    Args:
+        db_path (str): Lokasi berkas database SQLite.
+        mmap_bytes (int): Ukuran maksimum wilayah memory-mapped per koneksi.
+    """
+
+    def __init__(self, db_path: str = LEXICAL_INDEX_PATH, mmap_bytes: int = LEXICAL_INDEX_MMAP_BYTES):
+        self.db_path = db_path
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connection tidak boleh dipakai lintas thread, jadi setiap thread memiliki koneksinya sendiri.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(_SCHEMA)
+                    self._schema_ready = True
+            self._local.connection = connection
+        return connection
+
+    def add(self, ids: List[str], documents: List[str], filenames: List[str]):
+        """
+        Menambahkan (atau menimpa) chunk ke indeks leksikal.
+
+        Args:
+            ids (List[str]): ID chunk.
+            documents (List[str]): Isi chunk.
+            filenames (List[str]): Nama dokumen asal setiap chunk.
+        """
+        if not ids:
+            return
+        connection = self._connection()
+        with connection:
+            connection.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in ids])
+            connection.executemany(
+                "INSERT INTO chunks(chunk_id, source_document, content) VALUES (?, ?, ?)",
+                zip(ids, filenames, documents)
+            )
+
+    def delete(self, ids: Iterable[str]):
+        """Menghapus chunk dari indeks leksikal berdasarkan ID."""
+        ids = list(ids)
+        if not ids:
+            return
+        connection = self._connection()
+        with connection:
+            connection.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in ids])
+
+    def missing_ids(self, ids: List[str]) -> List[str]:
+        """Mengembalikan ID yang belum ada di indeks leksikal, dengan urutan yang sama seperti `ids`."""
+        if not ids:
+            return []
+        connection = self._connection()
+        present = set()
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            rows = connection.execute(
+                f"SELECT chunk_id FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            present.update(row[0] for row in rows)
+        return [chunk_id for chunk_id in ids if chunk_id not in present]
+
+    def search(self, query: str, filenames: List[str], k: int) -> List[dict]:
+        """
+        Mencari chunk dengan peringkat BM25, dibatasi pada dokumen tertentu.
+
+        Args:
+            query (str): Kueri pencarian.
+            filenames (List[str]): Dokumen yang menjadi target pencarian.
+            k (int): Jumlah hasil maksimum.
+
+        Returns:
+            List[dict]: Hasil berurutan berdasarkan relevansi, masing-masing berisi `id`,
+                `document`, `metadata`, dan `score` (semakin besar semakin relevan).
+        """
+        match_expression = build_match_expression(query)
+        if not match_expression or not filenames:
+            return []
+        sql = _SEARCH_QUERY.format(placeholders=",".join("?" * len(filenames)))
+        rows = self._connection().execute(sql, [match_expression, *filenames, k]).fetchall()
+        return [
+            {"id": chunk_id, "document": content, "metadata": {"source_document": source_document}, "score": -score}
+            for chunk_id, source_document, content, score in rows
+        ]
+
+
+lexical_index = LexicalIndex()
@@ -0,0 +1,472 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from config import (
+    LLM_RATE_LIMIT_RPM,
+    LLM_RATE_LIMIT_BURST,
+    LLM_RATE_LIMIT_INTERACTIVE_RESERVE,
+    LLM_RATE_LIMIT_PATH,
+    LLM_INTERACTIVE_MAX_CONCURRENCY,
+    LLM_BACKGROUND_MAX_CONCURRENCY,
+    LLM_COALESCING_ENABLED,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_PURPOSES
+)
+from core.metrics import registry, record_llm_usage, message_text
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Kelas panggilan; angka prioritas lebih kecil dilayani lebih dahulu oleh token bucket.
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+_PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}
+# Keperluan panggilan -> kelasnya. Keperluan yang tidak dikenal dianggap interaktif.
+PURPOSE_CLASSES = {
+    "rephrase": INTERACTIVE,
+    "answer": INTERACTIVE,
+    "summary": BACKGROUND,
+    "extraction": BACKGROUND,
+}
+
+_wait_duration = registry.histogram(
+    "cognigraph_llm_wait_seconds", "Waktu tunggu slot konkurensi dan token rate limit sebelum panggilan LLM.", ["call_class"]
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses(accessed_at);
+"""
+
+
+def prompt_key(chat_model, prompt: str) -> str:
+    """
+    Menghitung kunci prompt dari (model, temperature, hash prompt).
+
+    Model dan temperature dibaca dari atribut chat model (`model`/`model_name` dan
+    `temperature`), sehingga respons dari konfigurasi model yang berbeda tidak tercampur.
+    """
+    model = getattr(chat_model, "model", None) or getattr(chat_model, "model_name", None) or type(chat_model).__name__
+    temperature = getattr(chat_model, "temperature", None)
+    digest = hashlib.sha256(f"{model}|{temperature}|".encode("utf-8"))
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    """Respons LLM dari cache prompt; menyerupai pesan LangChain (atribut `content`)."""
+    content: str
+    usage_metadata: Optional[dict] = None
+
+
+class PromptCache:
+    """
+    Cache respons LLM yang persisten di SQLite, dengan eviksi LRU berbasis ukuran total.
+
+    Database dipakai bersama oleh proses API dan proses worker ingesti (mode WAL), sehingga
+    dokumen yang diunggah ulang di worker mana pun tidak membayar ekstraksi yang sama dua
+    kali. Waktu akses diperbarui setiap kali entri dibaca dan dipakai sebagai urutan eviksi.
+
+    Args:
+        db_path (str): Lokasi berkas database SQLite.
+        max_bytes (int): Ukuran total respons maksimum sebelum eviksi.
+    """
+
+    def __init__(self, db_path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[str]:
+        """Mengambil respons untuk kunci tertentu, atau `None` jika tidak ada di cache."""
+        connection = self._connection()
+        row = connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, response: str):
+        """Menyimpan respons lalu menjalankan eviksi bila ukuran total melebihi batas."""
+        size = len(response.encode("utf-8"))
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            previous = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses(key, response, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time())
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            else:
+                self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(connection)
+
+    def delete(self, key: str):
+        """Menghapus sebuah entri, misalnya respons yang ternyata tidak dapat dipakai."""
+        self._connection().execute("DELETE FROM responses WHERE key = ?", (key,))
+        with self._lock:
+            self._total_bytes = None
+
+    def _evict(self, connection: sqlite3.Connection):
+        """Menghapus entri yang paling lama tidak dipakai hingga ukuran cache di bawah 90% batas."""
+        target = int(self.max_bytes * 0.9)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Total dihitung ulang di dalam transaksi karena proses lain ikut menulis ke cache ini.
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            removed = []
+            for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                if total <= target:
+                    break
+                removed.append((key,))
+                total -= size
+            connection.executemany("DELETE FROM responses WHERE key = ?", removed)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._total_bytes = total
+        logger.info(f"Eviksi cache prompt LLM: {len(removed)} entri dihapus, ukuran cache kini {total} bytes.")
+
+    def stats(self) -> dict:
+        """Mengembalikan statistik hit/miss dan ukuran cache."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size_bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+
+_BUCKET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SharedTokenBucket:
+    """
+    Token bucket yang disimpan di SQLite dan dipakai bersama oleh seluruh proses di host.
+
+    Setiap pengambilan token berjalan dalam transaksi `BEGIN IMMEDIATE`: token diisi ulang
+    berdasarkan waktu sejak pembaruan terakhir (jam dinding, sama untuk semua proses), lalu
+    dikurangi satu jika cukup. Dengan begitu kuota `rate_per_minute` berlaku untuk gabungan
+    proses API dan worker ingesti, bukan untuk masing-masing proses.
+
+    Args:
+        rate_per_minute (float): Laju pengisian token.
+        burst (int): Kapasitas bucket.
+        db_path (str): Lokasi berkas database SQLite.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, db_path: str = LLM_RATE_LIMIT_PATH):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_BUCKET_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def take(self, min_tokens: float = 1) -> float:
+        """
+        Mengambil satu token jika sisa token (setelah diisi ulang) minimal `min_tokens`.
+
+        Returns:
+            float: 0 jika token berhasil diambil, atau perkiraan detik hingga token cukup.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute("SELECT tokens, updated_at FROM bucket WHERE id = 0").fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            wait = 0.0
+            if tokens >= min_tokens:
+                tokens -= 1
+            else:
+                wait = (min_tokens - tokens) / self.rate
+            connection.execute("INSERT OR REPLACE INTO bucket(id, tokens, updated_at) VALUES (0, ?, ?)", (tokens, now))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class _PriorityTokenBucket:
+    """
+    Antrean prioritas lokal di depan `SharedTokenBucket`.
+
+    Selama tidak ada yang mengantre dan token tersedia, `acquire` langsung kembali. Jika
+    tidak, pemanggil menunggu dan satu tugas dispatcher memberikan token berikutnya ke
+    penunggu dengan prioritas terkecil terlebih dahulu (FIFO untuk prioritas yang sama).
+    Prioritas selain 0 hanya mendapat token selama sisa token di bucket bersama melebihi
+    `reserve`, sehingga proses lain tetap dapat melayani kueri interaktif.
+
+    Args:
+        bucket (SharedTokenBucket): Sumber token bersama.
+        reserve (int): Token yang dicadangkan untuk prioritas 0.
+    """
+
+    def __init__(self, bucket: SharedTokenBucket, reserve: int):
+        self.bucket = bucket
+        self.reserve = max(0, min(reserve, bucket.capacity - 1))
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def _min_tokens(self, priority: int) -> float:
+        return 1 if priority == 0 else 1 + self.reserve
+
+    async def _dispatch(self):
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                # Penunggu yang sudah dibatalkan tidak memakai token.
+                heapq.heappop(self._waiters)
+                continue
+            wait = await asyncio.to_thread(self.bucket.take, self._min_tokens(priority))
+            if wait == 0:
+                heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                continue
+            # Penunggu baru (mungkin berprioritas lebih tinggi) membangunkan dispatcher lebih awal.
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire(self, priority: int):
+        if not self._waiters and await asyncio.to_thread(self.bucket.take, self._min_tokens(priority)) == 0:
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+
+class LLMGateway:
+    """
+    Gateway bersama untuk seluruh panggilan chat model di satu proses.
+
+    Setiap panggilan melewati empat langkah:
+    1.  **Cache prompt**: untuk keperluan deterministik (`LLM_CACHE_PURPOSES`, misalnya
+        ekstraksi graf), respons dicari di `PromptCache` dengan kunci (model, temperature,
+        hash prompt).
+    2.  **Penggabungan (single-flight)**: prompt identik yang sedang berjalan tidak dikirim
+        ulang; pemanggil berikutnya menunggu hasil panggilan yang sama.
+    3.  **Batas konkurensi per kelas**: `interactive` dan `background` memiliki semaphore
+        masing-masing, sehingga lonjakan ekstraksi tidak menghabiskan slot kueri.
+    4.  **Rate limit**: token bucket bersama antar proses (request per menit, lihat
+        `SharedTokenBucket`) yang mendahulukan kelas interaktif ketika kuota menipis.
+
+    Primitif asyncio dibuat ulang per event loop, sehingga gateway aman dipakai sebagai
+    singleton di proses API maupun di proses worker.
+
+    Args:
+        rate_limit_rpm (float): Kuota request per menit; 0 menonaktifkan rate limit.
+        burst (int): Kapasitas token bucket.
+        interactive_reserve (int): Token yang tidak boleh dipakai kelas background.
+        rate_limit_path (str): Lokasi database token bucket bersama.
+        max_concurrency (Dict[str, int]): Batas konkurensi per kelas.
+        coalescing (bool): Mengaktifkan penggabungan prompt identik.
+        cache (Optional[PromptCache]): Cache respons; `None` menonaktifkan cache.
+    """
+
+    def __init__(self, rate_limit_rpm: float = LLM_RATE_LIMIT_RPM, burst: int = LLM_RATE_LIMIT_BURST,
+                 interactive_reserve: int = LLM_RATE_LIMIT_INTERACTIVE_RESERVE, rate_limit_path: str = LLM_RATE_LIMIT_PATH,
+                 max_concurrency: Optional[Dict[str, int]] = None, coalescing: bool = LLM_COALESCING_ENABLED,
+                 cache: Optional[PromptCache] = None):
+        self.rate_limit_rpm = rate_limit_rpm
+        self.burst = burst
+        self.interactive_reserve = interactive_reserve
+        self.rate_limit_path = rate_limit_path
+        self.max_concurrency = max_concurrency or {
+            INTERACTIVE: LLM_INTERACTIVE_MAX_CONCURRENCY,
+            BACKGROUND: LLM_BACKGROUND_MAX_CONCURRENCY
+        }
+        self.coalescing = coalescing
+        self.cache = cache
+        self.coalesced = 0
+        self.in_flight = dict.fromkeys(_PRIORITIES, 0)
+        self.waiting = dict.fromkeys(_PRIORITIES, 0)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._bucket: Optional[_PriorityTokenBucket] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphores = {call_class: asyncio.Semaphore(max(1, limit)) for call_class, limit in self.max_concurrency.items()}
+            self._bucket = _PriorityTokenBucket(
+                SharedTokenBucket(self.rate_limit_rpm, self.burst, self.rate_limit_path), self.interactive_reserve
+            ) if self.rate_limit_rpm > 0 else None
+            self._pending = {}
+
+    @asynccontextmanager
+    async def _slot(self, call_class: str):
+        """Menunggu slot konkurensi kelas ini lalu token rate limit."""
+        self._bind_loop()
+        started = time.perf_counter()
+        self.waiting[call_class] += 1
+        try:
+            await self._semaphores[call_class].acquire()
+        finally:
+            self.waiting[call_class] -= 1
+        try:
+            if self._bucket is not None:
+                self.waiting[call_class] += 1
+                try:
+                    await self._bucket.acquire(_PRIORITIES[call_class])
+                finally:
+                    self.waiting[call_class] -= 1
+            _wait_duration.observe(time.perf_counter() - started, call_class=call_class)
+            self.in_flight[call_class] += 1
+            try:
+                yield
+            finally:
+                self.in_flight[call_class] -= 1
+        finally:
+            self._semaphores[call_class].release()
+
+    async def _invoke(self, chat_model, prompt: str, purpose: str, key: str, cacheable: bool):
+        async with self._slot(PURPOSE_CLASSES.get(purpose, INTERACTIVE)):
+            response = await chat_model.ainvoke(prompt)
+        record_llm_usage(purpose, prompt, response)
+        if cacheable:
+            try:
+                await asyncio.to_thread(self.cache.put, key, message_text(response.content))
+            except Exception as e:
+                logger.warning(f"Gagal menyimpan respons LLM ke cache: {e}")
+        return response
+
+    async def ainvoke(self, chat_model, prompt: str, purpose: str = "answer"):
+        """
+        Pengganti `chat_model.ainvoke(prompt)` yang melewati cache, penggabungan, dan rate limit.
+
+        Args:
+            chat_model: Chat model LangChain (atau objek lain dengan `ainvoke`).
+            prompt (str): Prompt yang dikirim.
+            purpose (str): Keperluan panggilan (`extraction`, `rephrase`, `summary`, `answer`);
+                menentukan kelas panggilan, label metrik, dan apakah respons boleh di-cache.
+
+        Returns:
+            Pesan respons chat model, atau `CachedResponse` jika diambil dari cache.
+        """
+        self._bind_loop()
+        cacheable = self.cache is not None and purpose in LLM_CACHE_PURPOSES
+        key = prompt_key(chat_model, prompt) if cacheable or self.coalescing else None
+
+        if cacheable:
+            try:
+                cached = await asyncio.to_thread(self.cache.get, key)
+            except Exception as e:
+                logger.warning(f"Gagal membaca cache prompt LLM: {e}")
+                cached = None
+            if cached is not None:
+                return CachedResponse(cached)
+
+        if not self.coalescing:
+            return await self._invoke(chat_model, prompt, purpose, key, cacheable)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        # Panggilan berjalan sebagai task tersendiri agar pembatalan salah satu penunggu
+        # tidak membatalkan hasil yang juga ditunggu pemanggil lain.
+        task = asyncio.ensure_future(self._invoke(chat_model, prompt, purpose, key, cacheable))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def astream(self, chat_model, prompt: str, purpose: str = "answer") -> AsyncIterator:
+        """
+        Pengganti `chat_model.astream(prompt)` dengan batas konkurensi dan rate limit.
+
+        Streaming tidak digabung maupun di-cache; slot konkurensi dipegang hingga stream selesai.
+        """
+        parts = []
+        async with self._slot(PURPOSE_CLASSES.get(purpose, INTERACTIVE)):
+            async for chunk in chat_model.astream(prompt):
+                parts.append(message_text(chunk.content))
+                yield chunk
+        record_llm_usage(purpose, prompt, completion="".join(parts))
+
+    def forget(self, chat_model, prompt: str):
+        """Menghapus respons sebuah prompt dari cache, misalnya karena respons tersebut tidak valid."""
+        if self.cache is not None:
+            self.cache.delete(prompt_key(chat_model, prompt))
+
+    def stats(self) -> dict:
+        """Mengembalikan jumlah panggilan yang digabung, panggilan berjalan/menunggu per kelas, dan statistik cache."""
+        return {
+            "coalesced": self.coalesced,
+            "in_flight": dict(self.in_flight),
+            "waiting": dict(self.waiting),
+            "cache": self.cache.stats() if self.cache is not None else None
+        }
+
+
+llm_gateway = LLMGateway(cache=PromptCache() if LLM_CACHE_ENABLED else None)
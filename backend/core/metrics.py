@@ -0,0 +1,369 @@
+"""
+Instrumentasi ringan: span waktu per tahap, ID korelasi, dan metrik format Prometheus.
+
+Setiap tahap ingesti dan kueri dibungkus `span(nama_tahap)`. Durasinya masuk ke histogram
+`cognigraph_stage_duration_seconds` dan, jika ada trace aktif (lihat `start_trace`), ke
+trace milik permintaan atau job tersebut. Trace disimpan di `contextvars`, sehingga ikut
+terbawa ke task asyncio yang dibuat di dalamnya tanpa perlu diteruskan sebagai argumen.
+
+Modul ini tidak bergantung pada `prometheus_client`; registry-nya cukup untuk counter,
+histogram, dan gauge berbasis callback, lalu dirender ke format teks Prometheus 0.0.4
+oleh endpoint `/metrics`. Di jalur panas, satu span hanya berupa dua pembacaan
+`perf_counter`, satu `bisect`, dan satu lock singkat.
+"""
+
+import abc
+import bisect
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import METRICS_ENABLED, METRICS_LATENCY_BUCKETS, TRACE_LOG_ENABLED
+from core.tokens import estimate_tokens
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_INF = float("inf")
+
+
+def _format_value(value: float) -> str:
+    if value == _INF:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric(abc.ABC):
+    """Basis metrik: menyimpan nama, dokumentasi, dan label; subclass menyediakan baris sampelnya."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Mengembalikan baris sampel metrik dalam format teks Prometheus."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}", *self._samples()]
+
+
+class Counter(_Metric):
+    """Counter monoton naik dengan label opsional."""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._series.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """
+    Histogram dengan bucket tetap (detik).
+
+    Args:
+        buckets (Sequence[float]): Batas atas bucket; bucket `+Inf` ditambahkan otomatis.
+    """
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = METRICS_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [jumlah per bucket (non-kumulatif), total nilai, jumlah observasi]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip([*self.buckets, _INF], counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(bound))])} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Metrik yang nilainya dibaca dari callback saat `/metrics` di-scrape.
+
+    Dipakai untuk nilai yang sudah dihitung di tempat lain (kedalaman antrean, statistik
+    cache), sehingga jalur panas tidak menanggung biaya tambahan apa pun.
+
+    Args:
+        callback (Callable): Mengembalikan satu angka (tanpa label) atau dict
+            `{nilai_label atau tuple nilai_label: angka}`.
+        metric_type (str): `gauge` atau `counter`.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], object], labelnames: Sequence[str] = (), metric_type: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.metric_type = metric_type
+        self._callback = callback
+
+    def _samples(self) -> List[str]:
+        try:
+            values = self._callback()
+        except Exception as e:
+            logger.warning(f"Gagal membaca metrik '{self.name}': {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class MetricsRegistry:
+    """Kumpulan metrik milik proses ini, dirender ke format teks Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Mendaftarkan metrik; jika namanya sudah terdaftar, metrik lama yang dikembalikan."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = METRICS_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, callback: Callable[[], object], labelnames: Sequence[str] = (), metric_type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, metric_type))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    "cognigraph_stage_duration_seconds", "Durasi setiap tahap ingesti dan kueri.", ["stage"]
+)
+http_request_duration = registry.histogram(
+    "cognigraph_http_request_duration_seconds", "Durasi permintaan HTTP per route.", ["method", "route", "status"]
+)
+llm_calls = registry.counter(
+    "cognigraph_llm_calls_total", "Jumlah panggilan LLM per keperluan.", ["purpose"]
+)
+llm_tokens = registry.counter(
+    "cognigraph_llm_tokens_total",
+    "Jumlah token LLM per keperluan dan arah (dari usage_metadata, atau estimasi ~4 karakter per token).",
+    ["purpose", "direction"]
+)
+
+
+class Trace:
+    """
+    Span dan penggunaan token milik satu permintaan atau satu job ingesti.
+
+    Args:
+        kind (str): Jenis trace untuk log (misalnya path HTTP atau `ingestion`).
+        trace_id (Optional[str]): ID korelasi; dibuat acak jika tidak diberikan.
+    """
+
+    def __init__(self, kind: str, trace_id: Optional[str] = None):
+        self.kind = kind
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.spans: List[Tuple[str, float]] = []
+        self.llm_tokens: List[Tuple[str, int, int]] = []
+
+    def checkpoint(self) -> Tuple[int, int]:
+        """Posisi saat ini, untuk meringkas hanya span yang tercatat setelahnya (lihat `summary`)."""
+        return len(self.spans), len(self.llm_tokens)
+
+    def timings(self, since: int = 0) -> Dict[str, float]:
+        """Total durasi (ms) per tahap; tahap yang berjalan beberapa kali dijumlahkan."""
+        totals: Dict[str, float] = {}
+        for stage, elapsed_ms in self.spans[since:]:
+            totals[stage] = totals.get(stage, 0.0) + elapsed_ms
+        return {stage: round(elapsed_ms, 1) for stage, elapsed_ms in totals.items()}
+
+    def summary(self, since: Tuple[int, int] = (0, 0)) -> dict:
+        """
+        Ringkasan yang dapat diserialisasi: `{"timings_ms": {...}, "llm_tokens": {...}}`.
+
+        Dipakai worker ingesti untuk menitipkan span-nya di detail tahap job, agar proses API
+        dapat memasukkannya ke metrik (lihat `replay_summary`).
+        """
+        tokens: Dict[str, Dict[str, int]] = {}
+        for purpose, prompt_tokens, completion_tokens in self.llm_tokens[since[1]:]:
+            usage = tokens.setdefault(purpose, {"calls": 0, "prompt": 0, "completion": 0})
+            usage["calls"] += 1
+            usage["prompt"] += prompt_tokens
+            usage["completion"] += completion_tokens
+        return {"timings_ms": self.timings(since[0]), "llm_tokens": tokens}
+
+    def server_timing(self) -> str:
+        """Nilai header `Server-Timing` dari span yang sudah selesai."""
+        return ", ".join(f"{stage};dur={elapsed_ms}" for stage, elapsed_ms in self.timings().items())
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("cognigraph_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """Mengembalikan trace aktif pada konteks ini, atau `None`."""
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(kind: str, trace_id: Optional[str] = None):
+    """
+    Memulai trace baru untuk konteks ini (permintaan HTTP atau job ingesti).
+
+    Saat trace berakhir, ringkasan span-nya dicatat sebagai satu baris log beserta ID
+    korelasinya (jika `TRACE_LOG_ENABLED`).
+
+    Yields:
+        Trace: Trace yang aktif.
+    """
+    trace = Trace(kind, trace_id)
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        if TRACE_LOG_ENABLED and trace.spans:
+            total_ms = round((time.perf_counter() - started) * 1000, 1)
+            breakdown = ", ".join(f"{stage}: {elapsed_ms} ms" for stage, elapsed_ms in trace.timings().items())
+            logger.info(f"Trace {trace.kind} [{trace.trace_id}] selesai dalam {total_ms} ms ({breakdown}).")
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Mengukur durasi sebuah tahap, termasuk bila tahap tersebut gagal.
+
+    Args:
+        stage (str): Nama tahap, misalnya `parse`, `vector_search`, atau `generation`.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed * 1000))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[{trace.trace_id}] {stage}: {elapsed * 1000:.1f} ms")
+
+
+async def traced(stage: str, awaitable):
+    """Menunggu `awaitable` di dalam `span(stage)`; berguna untuk coroutine yang dijalankan dengan `asyncio.gather`."""
+    with span(stage):
+        return await awaitable
+
+
+def message_text(content) -> str:
+    """Mengambil teks dari `content` pesan LangChain, yang dapat berupa string atau daftar bagian."""
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content or ())
+
+
+def record_llm_usage(purpose: str, prompt: str, response=None, completion: Optional[str] = None):
+    """
+    Mencatat satu panggilan LLM beserta jumlah token prompt dan jawabannya.
+
+    Jumlah token diambil dari `response.usage_metadata` jika penyedia melaporkannya, dan
+    diestimasi dari panjang teks jika tidak.
+
+    Args:
+        purpose (str): Keperluan panggilan (`extraction`, `rephrase`, `summary`, `answer`).
+        prompt (str): Prompt yang dikirim.
+        response: Pesan hasil `ainvoke` (opsional).
+        completion (Optional[str]): Teks jawaban, untuk streaming di mana tidak ada satu
+            pesan respons utuh.
+    """
+    if not METRICS_ENABLED:
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    if completion is None:
+        completion = message_text(getattr(response, "content", ""))
+    prompt_tokens = usage.get("input_tokens") or estimate_tokens(prompt)
+    completion_tokens = usage.get("output_tokens") or estimate_tokens(completion)
+
+    llm_calls.inc(purpose=purpose)
+    llm_tokens.inc(prompt_tokens, purpose=purpose, direction="prompt")
+    llm_tokens.inc(completion_tokens, purpose=purpose, direction="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.llm_tokens.append((purpose, prompt_tokens, completion_tokens))
+
+
+def replay_summary(summary: Optional[dict]):
+    """
+    Memasukkan ringkasan trace dari proses lain (worker ingesti) ke metrik proses ini.
+
+    Histogram menerima satu observasi per tahap dengan durasi totalnya.
+    """
+    if not METRICS_ENABLED or not summary:
+        return
+    for stage, elapsed_ms in (summary.get("timings_ms") or {}).items():
+        stage_duration.observe(elapsed_ms / 1000, stage=stage)
+    for purpose, usage in (summary.get("llm_tokens") or {}).items():
+        llm_calls.inc(usage.get("calls", 0), purpose=purpose)
+        llm_tokens.inc(usage.get("prompt", 0), purpose=purpose, direction="prompt")
+        llm_tokens.inc(usage.get("completion", 0), purpose=purpose, direction="completion")
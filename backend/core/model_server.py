@@ -0,0 +1,281 @@
+"""
+Server model embedding bersama untuk seluruh worker uvicorn di satu host.
+
+Jalankan sekali per host (dari direktori `backend`):
+
+    python -m core.model_server
+
+lalu aktifkan `EMBEDDING_SERVER_ENABLED=true` pada API. Setiap worker memakai
+`RemoteEmbeddingFunction`, yang mengirim teks melalui Unix domain socket dan menerima
+embedding sebagai array NumPy yang dibangun langsung di atas buffer penerimaan (tanpa
+salinan tambahan).
+
+Protokol: setiap pesan adalah frame `[panjang header (4 byte)][panjang payload (4 byte)]
+[header JSON][payload]`. Respons embedding membawa `shape` dan `dtype` di header dan
+matriks float32 mentah di payload.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_SERVER_SOCKET,
+    EMBEDDING_SERVER_TIMEOUT_SECONDS
+)
+from core.embedding_service import BatchingEmbeddingFunction, LazyEmbeddingFunction, QUERY_PRIORITY, INGESTION_PRIORITY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_FRAME = struct.Struct("!II")
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Koneksi ditutup oleh pihak lain.")
+        received += count
+    return buffer
+
+
+def _send_frame(sock: socket.socket, header: dict, payload=b""):
+    header_bytes = json.dumps(header).encode("utf-8")
+    payload_view = memoryview(payload).cast("B")
+    sock.sendall(_FRAME.pack(len(header_bytes), payload_view.nbytes) + header_bytes)
+    if payload_view.nbytes:
+        sock.sendall(payload_view)
+
+
+def _recv_frame(sock: socket.socket) -> Tuple[dict, bytearray]:
+    header_size, payload_size = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    header = json.loads(_recv_exact(sock, header_size).decode("utf-8"))
+    return header, _recv_exact(sock, payload_size)
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Melayani satu koneksi worker; koneksi dipakai ulang untuk banyak permintaan."""
+
+    def handle(self):
+        while True:
+            try:
+                header, _ = _recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                op = header.get("op")
+                if op == "embed":
+                    futures = self.server.embedding_function.submit(header["texts"], header.get("priority", INGESTION_PRIORITY))
+                    matrix = np.ascontiguousarray([future.result() for future in futures], dtype=np.float32)
+                    _send_frame(self.request, {"shape": list(matrix.shape), "dtype": "float32"}, matrix)
+                elif op == "config":
+                    base = self.server.base_embedding_function
+                    _send_frame(self.request, {"name": base.name(), "config": base.get_config()})
+                elif op == "ping":
+                    _send_frame(self.request, {"loaded": self.server.base_embedding_function.loaded})
+                else:
+                    _send_frame(self.request, {"error": f"Operasi tidak dikenal: {op}"})
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                logger.error(f"Gagal memproses permintaan '{header.get('op')}': {e}", exc_info=True)
+                try:
+                    _send_frame(self.request, {"error": str(e)})
+                except OSError:
+                    return
+
+
+class EmbeddingModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Server Unix socket yang memegang satu instance model embedding.
+
+    Permintaan dari seluruh worker masuk ke `BatchingEmbeddingFunction` yang sama, sehingga
+    teks dari worker yang berbeda ikut digabung ke dalam micro-batch yang sama.
+
+    Args:
+        socket_path (str): Lokasi berkas Unix socket.
+        base_embedding_function (LazyEmbeddingFunction): Model embedding yang dilayani.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, base_embedding_function: LazyEmbeddingFunction):
+        if os.path.exists(socket_path):
+            # Socket sisa proses sebelumnya yang tidak berhenti dengan bersih.
+            os.unlink(socket_path)
+        self.socket_path = socket_path
+        self.base_embedding_function = base_embedding_function
+        self.embedding_function = BatchingEmbeddingFunction(base_embedding_function)
+        super().__init__(socket_path, _EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o660)
+
+    def server_close(self):
+        super().server_close()
+        self.embedding_function.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class RemoteEmbeddingFunction:
+    """
+    Fungsi embedding yang meneruskan teks ke `EmbeddingModelServer`.
+
+    Dapat dipanggil seperti fungsi embedding ChromaDB dan menyediakan `aembed` dengan
+    prioritas seperti `BatchingEmbeddingFunction`; batching dan prioritas kueri ditangani
+    oleh server untuk seluruh worker sekaligus. Atribut `load()`, `loaded`, `load_ms`, dan
+    `error` sama dengan `LazyEmbeddingFunction` sehingga warm-up dan `/readyz` tetap bekerja.
+    Setiap thread memakai koneksi socket-nya sendiri; koneksi yang putus (misalnya karena
+    server dijalankan ulang) dibuka ulang sekali secara otomatis.
+
+    Args:
+        socket_path (str): Lokasi berkas Unix socket server model.
+        timeout (float): Batas waktu per permintaan, dalam detik.
+    """
+
+    def __init__(self, socket_path: str = EMBEDDING_SERVER_SOCKET, timeout: float = EMBEDDING_SERVER_TIMEOUT_SECONDS):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._config: Optional[dict] = None
+        self.load_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, header: dict) -> Tuple[dict, bytearray]:
+        for attempt in range(2):
+            try:
+                sock = self._connect()
+                _send_frame(sock, header)
+                response, payload = _recv_frame(sock)
+                break
+            except socket.timeout as e:
+                # Server mungkin masih memproses permintaan ini; mengulangnya hanya menggandakan beban.
+                self._disconnect()
+                self.error = str(e)
+                raise TimeoutError(f"Server model embedding di '{self.socket_path}' tidak merespons dalam {self.timeout} detik.") from e
+            except OSError as e:
+                self._disconnect()
+                # Hanya kegagalan koneksi (socket belum ada, ditolak, atau koneksi lama terputus)
+                # yang diulang sekali dengan koneksi baru.
+                if attempt == 1 or not isinstance(e, (ConnectionError, FileNotFoundError)):
+                    self.error = str(e)
+                    raise ConnectionError(f"Server model embedding di '{self.socket_path}' tidak dapat dihubungi: {e}") from e
+        if "error" in response:
+            raise RuntimeError(f"Server model embedding mengembalikan kesalahan: {response['error']}")
+        self.error = None
+        return response, payload
+
+    def load(self):
+        """Memastikan server model dapat dihubungi dan modelnya sudah dimuat."""
+        started = time.perf_counter()
+        response, _ = self._request({"op": "ping"})
+        if self.load_ms is None:
+            self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        return response["loaded"]
+
+    @property
+    def loaded(self) -> bool:
+        try:
+            return self.load()
+        except Exception:
+            return False
+
+    def embed(self, texts: List[str], priority: int = INGESTION_PRIORITY) -> np.ndarray:
+        """
+        Mengirim teks ke server model.
+
+        Returns:
+            np.ndarray: Matriks `(len(texts), dimensi)` yang memakai buffer penerimaan secara langsung.
+        """
+        response, payload = self._request({"op": "embed", "texts": list(texts), "priority": priority})
+        return np.frombuffer(payload, dtype=response["dtype"]).reshape(response["shape"])
+
+    async def aembed(self, texts: List[str], priority: int = INGESTION_PRIORITY) -> list:
+        """Versi asinkron dari `embed` yang tidak memblokir event loop."""
+        if not texts:
+            return []
+        return list(await asyncio.to_thread(self.embed, texts, priority))
+
+    def __call__(self, input: List[str]) -> list:
+        # Sama seperti `BatchingEmbeddingFunction`: satu teks diasumsikan sebagai kueri.
+        priority = QUERY_PRIORITY if len(input) == 1 else INGESTION_PRIORITY
+        return list(self.embed(input, priority))
+
+    def close(self):
+        """Menutup koneksi milik thread pemanggil; koneksi thread lain ditutup saat thread berakhir."""
+        self._disconnect()
+
+    # Metadata fungsi embedding untuk ChromaDB, diambil dari model di server agar konfigurasi
+    # koleksi tetap sama dengan mode tanpa server model.
+    @staticmethod
+    def name() -> str:
+        return "sentence_transformer"
+
+    def get_config(self) -> dict:
+        if self._config is None:
+            self._config = self._request({"op": "config"})[0]["config"]
+        return self._config
+
+    def is_legacy(self) -> bool:
+        return False
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def supported_spaces(self) -> List[str]:
+        return ["cosine", "l2", "ip"]
+
+
+def serve(socket_path: str = EMBEDDING_SERVER_SOCKET, model_name: str = EMBEDDING_MODEL_NAME):
+    """Memuat model embedding lalu melayani permintaan hingga menerima SIGTERM/SIGINT."""
+    from chromadb.utils import embedding_functions
+
+    base = LazyEmbeddingFunction(lambda: embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name))
+    base.load()
+    server = EmbeddingModelServer(socket_path, base)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info(f"Server model embedding '{model_name}' siap di '{socket_path}' (pid {os.getpid()}).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("Server model embedding berhenti.")
+
+
+if __name__ == "__main__":
+    serve()
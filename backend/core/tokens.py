@@ -0,0 +1,10 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Mengestimasi jumlah token sebuah teks tanpa memuat tokenizer.
+
+    Memakai pendekatan umum ~4 karakter per token. Cukup akurat untuk menegakkan anggaran
+    prompt, dan jauh lebih murah daripada tokenisasi sesungguhnya di jalur kueri.
+    """
+    if not text:
+        return 0
+    return (len(text) + 3) // 4
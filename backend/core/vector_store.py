@@ -0,0 +1,301 @@
+"""
+Akses ke koleksi ChromaDB sesuai tata letak indeks vektor (`VECTOR_INDEX_LAYOUT`).
+
+Pada tata letak `partitioned`, setiap dokumen memiliki koleksinya sendiri, sehingga
+pencarian pada beberapa dokumen terpilih hanya menyentuh indeks HNSW dokumen-dokumen itu
+(biaya kueri sebanding dengan jumlah dokumen terpilih, bukan ukuran korpus) dan tidak
+bergantung pada filter metadata yang menurunkan recall saat filternya selektif.
+
+Data yang sudah ada dipindahkan antar tata letak tanpa embedding ulang (dari direktori `backend`):
+
+    python -m core.vector_store --to partitioned
+"""
+
+import argparse
+import asyncio
+import hashlib
+import heapq
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from config import CHROMA_DB_PATH, CHROMA_COLLECTION_NAME, VECTOR_INDEX_LAYOUT, VECTOR_SEARCH_MAX_FANOUT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LAYOUTS = ("partitioned", "global")
+# Penanda pada metadata koleksi partisi; dipakai untuk menemukan partisi saat migrasi.
+_PARTITION_METADATA_KEY = "source_document"
+
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def partition_name(filename: str) -> str:
+    """
+    Menurunkan nama koleksi partisi untuk sebuah dokumen.
+
+    Nama file tidak dipakai langsung karena ChromaDB membatasi karakter dan panjang nama
+    koleksi (3-63 karakter alfanumerik, `_`, `-`, `.`); hash nama file selalu memenuhi batas itu.
+    """
+    return f"{CHROMA_COLLECTION_NAME}_doc_{hashlib.sha256(filename.encode('utf-8')).hexdigest()[:24]}"
+
+
+def get_collection(chroma_client, embedding_function):
+    """
+    Mengambil koleksi ChromaDB bersama, dibuat sekali lalu disimpan untuk dipakai ulang.
+
+    `get_or_create_collection` melibatkan pembacaan metadata ke SQLite, sehingga handle
+    koleksi di-cache per pasangan (klien, fungsi embedding) alih-alih dipanggil di setiap kueri.
+    Penggunaan `cosine` sebagai metrik jarak adalah praktik standar untuk model embedding
+    berbasis transformer.
+
+    Args:
+        chroma_client: Instance client ChromaDB yang aktif.
+        embedding_function: Fungsi embedding yang dipakai koleksi.
+
+    Returns:
+        Collection: Handle koleksi `CHROMA_COLLECTION_NAME`.
+    """
+    return _cached_collection(chroma_client, embedding_function, CHROMA_COLLECTION_NAME, {"hnsw:space": "cosine"})
+
+
+def _cached_collection(chroma_client, embedding_function, name: str, metadata: Optional[dict]):
+    """Mengambil handle koleksi dari cache; `metadata=None` berarti koleksi tidak dibuat jika belum ada."""
+    key = (id(chroma_client), id(embedding_function), name)
+    collection = _collections.get(key)
+    if collection is None:
+        with _collections_lock:
+            collection = _collections.get(key)
+            if collection is None:
+                if metadata is None:
+                    from chromadb.errors import NotFoundError
+                    try:
+                        collection = chroma_client.get_collection(name=name, embedding_function=embedding_function)
+                    except NotFoundError:
+                        return None
+                else:
+                    collection = chroma_client.get_or_create_collection(
+                        name=name,
+                        embedding_function=embedding_function,
+                        metadata=metadata
+                    )
+                _collections[key] = collection
+    return collection
+
+
+def forget_collection(name: str):
+    """Membuang handle koleksi yang di-cache, misalnya setelah koleksinya dihapus."""
+    with _collections_lock:
+        for key in [key for key in _collections if key[2] == name]:
+            del _collections[key]
+
+
+def get_document_collection(chroma_client, embedding_function, filename: str, create: bool = True):
+    """
+    Mengambil koleksi tempat chunk sebuah dokumen disimpan, sesuai tata letak indeks.
+
+    Args:
+        chroma_client: Instance client ChromaDB yang aktif.
+        embedding_function: Fungsi embedding yang dipakai koleksi.
+        filename (str): Nama file dokumen.
+        create (bool): Membuat partisi dokumen jika belum ada. Jika `False` dan partisi
+            belum ada, mengembalikan `None`.
+
+    Returns:
+        Optional[Collection]: Partisi dokumen, atau koleksi bersama pada tata letak `global`.
+    """
+    if VECTOR_INDEX_LAYOUT == "global":
+        return get_collection(chroma_client, embedding_function)
+    metadata = {"hnsw:space": "cosine", _PARTITION_METADATA_KEY: filename} if create else None
+    return _cached_collection(chroma_client, embedding_function, partition_name(filename), metadata)
+
+
+def document_filter(filename: str) -> Optional[dict]:
+    """Filter `where` untuk chunk sebuah dokumen di koleksinya; tidak diperlukan pada partisi."""
+    return {"source_document": filename} if VECTOR_INDEX_LAYOUT == "global" else None
+
+
+def _to_hits(results: dict, index: int) -> List[dict]:
+    """Mengubah hasil kueri ChromaDB ke-`index` menjadi daftar hit terstruktur."""
+    if not results or not results["documents"] or len(results["documents"]) <= index or not results["documents"][index]:
+        return []
+    return [
+        {"id": chunk_id, "document": document, "metadata": metadata, "distance": distance}
+        for chunk_id, document, metadata, distance in zip(
+            results["ids"][index], results["documents"][index], results["metadatas"][index], results["distances"][index]
+        )
+    ]
+
+
+async def query_documents(chroma_client, embedding_function, query_embeddings: list, filenames: Sequence[str], k: int) -> List[List[dict]]:
+    """
+    Mencari `k` chunk terdekat untuk setiap embedding kueri di antara dokumen yang dipilih.
+
+    Pada tata letak `partitioned`, partisi setiap dokumen dikueri secara paralel (maksimal
+    `VECTOR_SEARCH_MAX_FANOUT` sekaligus, masing-masing di thread terpisah) dengan seluruh
+    embedding kueri dalam satu panggilan, lalu top-k digabung berdasarkan jarak. Jarak
+    antar-partisi sebanding karena semua partisi memakai model embedding dan metrik
+    `cosine` yang sama. Dokumen yang belum memiliki partisi dianggap tidak punya hasil.
+
+    Args:
+        chroma_client: Instance client ChromaDB.
+        embedding_function: Fungsi embedding yang digunakan.
+        query_embeddings (list): Embedding kueri.
+        filenames (Sequence[str]): Dokumen yang menjadi target pencarian.
+        k (int): Jumlah hasil teratas per kueri.
+
+    Returns:
+        List[List[dict]]: Hasil per embedding kueri, berurutan dari jarak terkecil.
+    """
+    if VECTOR_INDEX_LAYOUT == "global":
+        collection = get_collection(chroma_client, embedding_function)
+        # Melakukan kueri dengan filter 'where' untuk membatasi pencarian
+        # hanya pada dokumen yang metadatanya cocok dengan 'filenames'.
+        results = await asyncio.to_thread(
+            collection.query,
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where={"source_document": {"$in": list(filenames)}}
+        )
+        return [_to_hits(results, i) for i in range(len(query_embeddings))]
+
+    semaphore = asyncio.Semaphore(max(1, VECTOR_SEARCH_MAX_FANOUT))
+
+    def query_partition(filename: str) -> Optional[dict]:
+        from chromadb.errors import NotFoundError
+
+        collection = get_document_collection(chroma_client, embedding_function, filename, create=False)
+        if collection is None:
+            return None
+        try:
+            return collection.query(query_embeddings=query_embeddings, n_results=k)
+        except NotFoundError:
+            # Partisi dihapus setelah handle-nya di-cache (misalnya oleh migrasi).
+            forget_collection(partition_name(filename))
+            return None
+
+    async def bounded(filename: str) -> Optional[dict]:
+        async with semaphore:
+            return await asyncio.to_thread(query_partition, filename)
+
+    partition_results = await asyncio.gather(*(bounded(filename) for filename in dict.fromkeys(filenames)))
+    return [
+        heapq.nsmallest(k, (hit for results in partition_results for hit in _to_hits(results, i)), key=lambda hit: hit["distance"])
+        for i in range(len(query_embeddings))
+    ]
+
+
+def _partition_collections(chroma_client) -> list:
+    """Mengambil seluruh koleksi partisi dokumen (dibuka tanpa fungsi embedding)."""
+    prefix = f"{CHROMA_COLLECTION_NAME}_doc_"
+    return [
+        chroma_client.get_collection(collection.name, embedding_function=None)
+        for collection in chroma_client.list_collections()
+        if collection.name.startswith(prefix) and _PARTITION_METADATA_KEY in (collection.metadata or {})
+    ]
+
+
+def unmigrated_chunk_count(chroma_client) -> int:
+    """Menghitung chunk yang masih tersimpan dalam tata letak selain `VECTOR_INDEX_LAYOUT` (belum dimigrasi)."""
+    from chromadb.errors import NotFoundError
+
+    if VECTOR_INDEX_LAYOUT == "global":
+        return sum(collection.count() for collection in _partition_collections(chroma_client))
+    try:
+        return chroma_client.get_collection(CHROMA_COLLECTION_NAME, embedding_function=None).count()
+    except NotFoundError:
+        return 0
+
+
+def _copy_records(source, target_for, batch_size: int) -> Dict[str, int]:
+    """Menyalin seluruh record (beserta embedding-nya) dari `source` ke koleksi `target_for(metadata)`."""
+    copied = {}
+    offset = 0
+    while True:
+        batch = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        groups = {}
+        for position, metadata in enumerate(batch["metadatas"]):
+            groups.setdefault((metadata or {}).get("source_document"), []).append(position)
+        for filename, positions in groups.items():
+            target = target_for(filename)
+            target.upsert(
+                ids=[batch["ids"][i] for i in positions],
+                embeddings=[batch["embeddings"][i] for i in positions],
+                documents=[batch["documents"][i] for i in positions],
+                metadatas=[batch["metadatas"][i] for i in positions]
+            )
+            copied[target.name] = copied.get(target.name, 0) + len(positions)
+        offset += len(batch["ids"])
+    return copied
+
+
+def migrate_layout(chroma_client, target_layout: str, batch_size: int = 1000, keep_source: bool = False) -> dict:
+    """
+    Memindahkan chunk yang sudah terindeks ke tata letak `target_layout` tanpa embedding ulang.
+
+    Record disalin per batch dengan `upsert` (ID chunk dipertahankan, sehingga manifest
+    dokumen tetap berlaku dan migrasi aman diulang jika terputus). Koleksi sumber dihapus
+    setelah seluruh isinya tersalin, kecuali `keep_source=True`. Jalankan saat API berhenti
+    atau ingesti sedang tidak berjalan, lalu ubah `VECTOR_INDEX_LAYOUT` ke tata letak tujuan.
+
+    Koleksi dibuka tanpa fungsi embedding (embedding disalin apa adanya), sehingga model
+    tidak perlu dimuat dan partisi hasil migrasi tetap dapat dibuka dengan fungsi embedding aplikasi.
+
+    Returns:
+        dict: Jumlah record yang disalin per koleksi tujuan dan koleksi sumber yang dihapus.
+    """
+    from chromadb.errors import NotFoundError
+
+    if target_layout not in LAYOUTS:
+        raise ValueError(f"Tata letak '{target_layout}' tidak dikenal. Pilihan: {', '.join(LAYOUTS)}.")
+
+    if target_layout == "partitioned":
+        try:
+            sources = [chroma_client.get_collection(CHROMA_COLLECTION_NAME, embedding_function=None)]
+        except NotFoundError:
+            sources = []
+
+        def target_for(filename: Optional[str]):
+            if filename is None:
+                raise ValueError("Chunk tanpa metadata 'source_document' tidak dapat dipartisi.")
+            return chroma_client.get_or_create_collection(
+                partition_name(filename), embedding_function=None,
+                metadata={"hnsw:space": "cosine", _PARTITION_METADATA_KEY: filename}
+            )
+    else:
+        sources = _partition_collections(chroma_client)
+        shared = chroma_client.get_or_create_collection(CHROMA_COLLECTION_NAME, embedding_function=None, metadata={"hnsw:space": "cosine"})
+        target_for = lambda _filename: shared
+
+    copied, removed = {}, []
+    for source in sources:
+        logger.info(f"Migrasi koleksi '{source.name}' ({source.count()} chunk) ke tata letak '{target_layout}'...")
+        for name, count in _copy_records(source, target_for, batch_size).items():
+            copied[name] = copied.get(name, 0) + count
+        if not keep_source:
+            chroma_client.delete_collection(source.name)
+            forget_collection(source.name)
+            removed.append(source.name)
+    logger.info(f"Migrasi selesai: {sum(copied.values())} chunk disalin ke {len(copied)} koleksi, {len(removed)} koleksi sumber dihapus.")
+    return {"copied": copied, "removed": removed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memindahkan indeks vektor ChromaDB ke tata letak lain tanpa embedding ulang.")
+    parser.add_argument("--to", choices=LAYOUTS, default="partitioned", help="Tata letak tujuan.")
+    parser.add_argument("--path", default=CHROMA_DB_PATH, help="Direktori ChromaDB persisten.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Jumlah chunk yang disalin per batch.")
+    parser.add_argument("--keep-source", action="store_true", help="Jangan hapus koleksi sumber setelah disalin.")
+    args = parser.parse_args(argv)
+
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path=args.path)
+    migrate_layout(chroma_client, args.to, args.batch_size, args.keep_source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import logging
+from collections import deque
+from typing import Iterable, List, Set
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_surface_form(text: str) -> str:
+    """Menormalkan teks untuk pencocokan yang tidak peka huruf besar/kecil dan spasi."""
+    return " ".join(text.casefold().split())
+
+
+class EntityMatcher:
+    """
+    Automaton Aho-Corasick untuk mencari banyak nama entitas sekaligus dalam satu teks.
+
+    Automaton dibangun satu kali dari seluruh bentuk permukaan (surface form) entitas,
+    lalu setiap teks cukup dipindai satu kali, berapa pun jumlah polanya. Pencocokan
+    bersifat substring, sama seperti operator `in` pada string Python.
+
+    Args:
+        patterns (Iterable[str]): Pola yang dicari. Indeks pola mengikuti urutan iterasi.
+        normalize (bool): Jika `True`, pola dan teks dinormalkan dengan `casefold()` dan
+            spasi berurutan diringkas menjadi satu spasi sebelum dicocokkan.
+    """
+
+    def __init__(self, patterns: Iterable[str], normalize: bool = False):
+        self.normalize = normalize
+        self.patterns: List[str] = list(patterns)
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        # Tautan ke state terdekat pada rantai fail yang memiliki output (dictionary suffix link).
+        self._output_link: List[int] = [-1]
+        self._always_matched: Set[int] = set()
+
+        for index, pattern in enumerate(self.patterns):
+            if pattern == "":
+                # `"" in text` selalu bernilai True, perilaku ini dipertahankan.
+                self._always_matched.add(index)
+                continue
+            key = normalize_surface_form(pattern) if normalize else pattern
+            if key:
+                self._add(key, index)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, index: int):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._output_link.append(-1)
+            state = next_state
+        self._output[state].append(index)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                fail_state = self._fail[next_state]
+                self._output_link[next_state] = fail_state if self._output[fail_state] else self._output_link[fail_state]
+
+    def find(self, text: str) -> Set[int]:
+        """
+        Mencari pola yang muncul di dalam teks.
+
+        Args:
+            text (str): Teks yang akan dipindai.
+
+        Returns:
+            Set[int]: Indeks pola yang ditemukan setidaknya satu kali.
+        """
+        if self.normalize:
+            text = normalize_surface_form(text)
+
+        found = set(self._always_matched)
+        goto, fail, output, output_link = self._goto, self._fail, self._output, self._output_link
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            match_state = state if output[state] else output_link[state]
+            while match_state > 0:
+                found.update(output[match_state])
+                match_state = output_link[match_state]
+        return found
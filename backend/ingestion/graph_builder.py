@@ -1,44 +1,105 @@
+import asyncio
 import json
 import logging
+import random
 import re
-import time
+from typing import List, Optional, Tuple
 from neo4j import AsyncGraphDatabase
 from config import (
     GRAPH_EXTRACTION_PROMPT,
-    NEO4J_MERGE_QUERY
+    NEO4J_UNWIND_MERGE_QUERY,
+    NEO4J_WRITE_BATCH_SIZE,
+    NEO4J_ENTITY_LABELS,
+    NEO4J_ENTITY_INDEX_QUERY,
+    NEO4J_FULLTEXT_INDEX_QUERY,
+    NEO4J_LEGACY_FULLTEXT_INDEX_DROP_QUERY,
+    NEO4J_DOCUMENT_NODE_INDEX_QUERY,
+    NEO4J_DOCUMENT_NODE_BACKFILL_QUERY,
+    NEO4J_UNWIND_DELETE_QUERY,
+    NEO4J_DELETE_ORPHANS_QUERY,
+    NEO4J_FETCH_DOCUMENT_TRIPLETS_QUERY,
+    GRAPH_EXTRACTION_WINDOW_SIZE,
+    GRAPH_EXTRACTION_WINDOW_OVERLAP,
+    GRAPH_EXTRACTION_MAX_CONCURRENCY,
+    GRAPH_EXTRACTION_BACKOFF_BASE,
+    GRAPH_EXTRACTION_BACKOFF_MAX
 )
+from core.llm_gateway import llm_gateway
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def extract_knowledge_graph_from_text(text: str, llm_model, max_retries: int = 3) -> list:
+def _split_into_windows(text: str) -> List[str]:
     """
-    Mengekstrak triplet pengetahuan (entitas-relasi-entitas) dari teks mentah menggunakan LLM.
+    Memecah teks dokumen menjadi jendela-jendela yang muat dalam satu prompt ekstraksi.
+
+    Args:
+        text (str): Teks lengkap dokumen.
+
+    Returns:
+        List[str]: Daftar jendela teks dengan sedikit tumpang-tindih antar jendela agar
+            relasi yang terpotong di perbatasan tetap dapat ditangkap.
+    """
+    if len(text) <= GRAPH_EXTRACTION_WINDOW_SIZE:
+        return [text]
+    # Diimpor di sini agar `ensure_neo4j_schema` dapat dipakai replika kueri tanpa memuat LangChain.
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=GRAPH_EXTRACTION_WINDOW_SIZE,
+        chunk_overlap=GRAPH_EXTRACTION_WINDOW_OVERLAP,
+        length_function=len,
+    )
+    return splitter.split_text(text)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Menghitung jeda backoff eksponensial dengan jitter penuh untuk percobaan ke-`attempt`."""
+    ceiling = min(GRAPH_EXTRACTION_BACKOFF_MAX, GRAPH_EXTRACTION_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def _deduplicate_triplets(triplet_lists: List[list]) -> list:
+    """
+    Menggabungkan triplet dari seluruh jendela dan membuang duplikat.
+
+    Dua triplet dianggap sama jika subjek, label, relasi, objek, dan label objeknya sama
+    setelah spasi di tepi dibuang. Urutan kemunculan pertama dipertahankan.
+    """
+    seen = set()
+    merged = []
+    for triplets in triplet_lists:
+        for triplet in triplets:
+            key = tuple(str(part).strip() if part is not None else None for part in triplet)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(triplet)
+    return merged
 
-    Fungsi ini dirancang untuk tangguh (robust) terhadap kemungkinan kegagalan API LLM atau
-    respons yang tidak terduga. Ia menggunakan mekanisme coba lagi (retry) dengan penundaan
-    eksponensial dan secara proaktif mencoba membersihkan respons LLM untuk mengekstrak JSON.
+
+async def _extract_window(window: str, llm_model, max_retries: int, window_label: str) -> list:
+    """
+    Mengekstrak triplet dari satu jendela teks dengan mekanisme coba lagi non-blocking.
 
     Args:
-        text (str): Teks mentah yang akan dianalisis.
+        window (str): Jendela teks yang akan dianalisis.
         llm_model: Instance model bahasa yang telah diinisialisasi.
-        max_retries (int): Jumlah maksimum percobaan ulang jika terjadi kegagalan.
+        max_retries (int): Jumlah maksimum percobaan.
+        window_label (str): Label jendela (misalnya "2/7") untuk keperluan logging.
 
     Returns:
-        list: Daftar triplet pengetahuan. Mengembalikan list kosong jika semua percobaan gagal.
+        list: Daftar triplet valid dari jendela ini, atau list kosong jika semua percobaan gagal.
     """
-    if not text.strip():
-        logger.info("Teks kosong, proses ekstraksi knowledge graph dilewati.")
-        return []
+    prompt = GRAPH_EXTRACTION_PROMPT.format(text=window)
 
-    prompt = GRAPH_EXTRACTION_PROMPT.format(text=text)
-    
     for attempt in range(max_retries):
-        logger.info(f"Menghubungi LLM untuk ekstraksi graph (Percobaan {attempt + 1}/{max_retries})...")
+        logger.info(f"Menghubungi LLM untuk ekstraksi graph jendela {window_label} (Percobaan {attempt + 1}/{max_retries})...")
+        raw_response_text = ""
         try:
-            response = await llm_model.ainvoke(prompt)
+            response = await llm_gateway.ainvoke(llm_model, prompt, purpose="extraction")
             raw_response_text = response.content
-            
+
             json_match = re.search(r"```json\n(.*?)\n```", raw_response_text, re.DOTALL)
             if json_match:
                 json_str = json_match.group(1)
@@ -46,35 +107,168 @@ async def extract_knowledge_graph_from_text(text: str, llm_model, max_retries: i
                 json_str = raw_response_text.strip()
 
             structured_data = json.loads(json_str)
-            
+
             if not isinstance(structured_data, list):
                 raise ValueError("Struktur JSON yang di-parse bukan sebuah list.")
 
             validated_data = [item for item in structured_data if isinstance(item, list) and len(item) == 5]
-            
+
             if len(validated_data) != len(structured_data):
-                logger.warning("Beberapa item dalam respons JSON tidak sesuai format dan telah disaring.")
+                logger.warning(f"Beberapa item dalam respons JSON jendela {window_label} tidak sesuai format dan telah disaring.")
 
-            logger.info(f"Berhasil mengekstrak dan memvalidasi {len(validated_data)} triplet pengetahuan.")
             return validated_data
 
         except json.JSONDecodeError:
-            logger.warning(f"Percobaan {attempt + 1} gagal: Gagal mem-parsing JSON dari respons LLM.")
+            logger.warning(f"Percobaan {attempt + 1} untuk jendela {window_label} gagal: Gagal mem-parsing JSON dari respons LLM.")
             logger.debug(f"Respons mentah saat gagal: {raw_response_text}")
         except Exception as e:
-            logger.error(f"Percobaan {attempt + 1} gagal dengan kesalahan tak terduga: {e}", exc_info=True)
+            logger.error(f"Percobaan {attempt + 1} untuk jendela {window_label} gagal dengan kesalahan tak terduga: {e}", exc_info=True)
             logger.debug(f"Respons mentah saat gagal: {raw_response_text}")
 
+        if raw_response_text:
+            # Respons yang tidak dapat dipakai dibuang dari cache prompt agar percobaan
+            # berikutnya benar-benar memanggil LLM lagi.
+            await asyncio.to_thread(llm_gateway.forget, llm_model, prompt)
+
         if attempt < max_retries - 1:
-            sleep_time = 2 ** attempt
-            logger.info(f"Menunggu {sleep_time} detik sebelum mencoba lagi...")
-            time.sleep(sleep_time)
+            sleep_time = _backoff_delay(attempt)
+            logger.info(f"Menunggu {sleep_time:.1f} detik sebelum mencoba lagi jendela {window_label}...")
+            await asyncio.sleep(sleep_time)
 
-    logger.error(f"Gagal mengekstrak data terstruktur setelah {max_retries} percobaan.")
+    logger.error(f"Gagal mengekstrak data terstruktur dari jendela {window_label} setelah {max_retries} percobaan.")
     return []
 
 
-async def store_triplets_in_neo4j(driver: AsyncGraphDatabase.driver, structured_data: list, filename: str):
+async def extract_knowledge_graph_from_text(text: str, llm_model, max_retries: int = 3, max_concurrency: int = GRAPH_EXTRACTION_MAX_CONCURRENCY) -> list:
+    """
+    Mengekstrak triplet pengetahuan (entitas-relasi-entitas) dari teks mentah menggunakan LLM.
+
+    Teks dipecah menjadi beberapa jendela yang diekstrak secara konkuren dengan jumlah
+    permintaan simultan dibatasi oleh `max_concurrency`. Setiap jendela memiliki mekanisme
+    coba lagi dengan backoff eksponensial dan jitter menggunakan `asyncio.sleep`, sehingga
+    event loop tidak pernah terblokir. Triplet dari seluruh jendela digabung dan diduplikasi.
+
+    Args:
+        text (str): Teks mentah yang akan dianalisis.
+        llm_model: Instance model bahasa yang telah diinisialisasi.
+        max_retries (int): Jumlah maksimum percobaan ulang per jendela jika terjadi kegagalan.
+        max_concurrency (int): Jumlah maksimum panggilan LLM yang berjalan bersamaan.
+
+    Returns:
+        list: Daftar triplet pengetahuan. Mengembalikan list kosong jika semua percobaan gagal.
+    """
+    if not text.strip():
+        logger.info("Teks kosong, proses ekstraksi knowledge graph dilewati.")
+        return []
+
+    windows = _split_into_windows(text)
+    logger.info(f"Ekstraksi knowledge graph dijalankan pada {len(windows)} jendela teks (konkurensi maks. {max_concurrency}).")
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(index: int, window: str) -> list:
+        async with semaphore:
+            return await _extract_window(window, llm_model, max_retries, f"{index + 1}/{len(windows)}")
+
+    triplet_lists = await asyncio.gather(*[_run(i, window) for i, window in enumerate(windows)])
+
+    failed_windows = sum(1 for triplets in triplet_lists if not triplets)
+    if failed_windows:
+        logger.warning(f"{failed_windows} dari {len(windows)} jendela tidak menghasilkan triplet.")
+
+    merged = _deduplicate_triplets(triplet_lists)
+    logger.info(f"Berhasil mengekstrak dan memvalidasi {len(merged)} triplet pengetahuan unik.")
+    return merged
+
+
+def _sanitize_label(value: Optional[str], default: str, known_only: bool = True) -> str:
+    """
+    Menormalkan label node menjadi huruf kapital alfanumerik agar aman disisipkan ke Cypher.
+
+    Dengan `known_only=True`, label di luar `NEO4J_ENTITY_LABELS` (label bebas dari LLM)
+    dipetakan ke `default`, sehingga ingesti tidak pernah menambah label atau indeks baru.
+    """
+    label = ''.join(c for c in (value or default).upper() if c.isalnum())
+    if known_only and label not in NEO4J_ENTITY_LABELS:
+        return default
+    return label
+
+
+def _sanitize_triplet(triplet: list, known_labels_only: bool = True) -> Optional[Tuple[str, str, str, str, str]]:
+    """
+    Menormalkan satu triplet menjadi bentuk yang aman untuk kueri Cypher.
+
+    Args:
+        known_labels_only (bool): Memetakan label tak dikenal ke `ENTITY`. Dimatikan saat
+            menghapus triplet lama, yang mungkin tersimpan dengan label bebas dari versi sebelumnya.
+
+    Returns:
+        Optional[Tuple[str, str, str, str, str]]: `(head, head_label, relation, tail, tail_label)`
+            yang telah disanitasi, atau `None` jika label/relasi menjadi kosong.
+    """
+    head, head_label, relation, tail, tail_label = triplet
+    head_label_safe = _sanitize_label(head_label, 'ENTITY', known_labels_only)
+    tail_label_safe = _sanitize_label(tail_label, 'ENTITY', known_labels_only)
+    relation_safe = ''.join(c for c in (relation or 'RELATED_TO').upper() if c.isalnum() or c == '_')
+
+    if not all([head_label_safe, tail_label_safe, relation_safe]):
+        return None
+    return str(head), head_label_safe, relation_safe, str(tail), tail_label_safe
+
+
+def _group_triplets(structured_data: list, known_labels_only: bool = True) -> dict:
+    """
+    Mengelompokkan triplet berdasarkan (label subjek, relasi, label objek).
+
+    Returns:
+        dict: Pemetaan `(head_label, relation, tail_label)` ke daftar baris `{"head", "tail"}`.
+    """
+    groups = {}
+    for triplet in structured_data:
+        sanitized = _sanitize_triplet(triplet, known_labels_only)
+        if sanitized is None:
+            continue
+        head, head_label, relation, tail, tail_label = sanitized
+        groups.setdefault((head_label, relation, tail_label), []).append({"head": head, "tail": tail})
+    return groups
+
+
+async def ensure_neo4j_schema(driver: AsyncGraphDatabase.driver):
+    """
+    Memastikan indeks yang dibutuhkan oleh penulisan triplet dan graph retrieval sudah ada di Neo4j.
+
+    Dipanggil sekali saat startup aplikasi. Perintah `CREATE INDEX ... IF NOT EXISTS`
+    bersifat idempoten sehingga aman dijalankan berulang kali. Node lama yang belum memiliki
+    label dokumen bersama diberi label tersebut per batch. Indeks hanya dibuat di sini,
+    tidak pernah selama ingesti, karena label entitas dibatasi pada `NEO4J_ENTITY_LABELS`.
+
+    Args:
+        driver: Instance driver Neo4j yang aktif.
+    """
+    async with driver.session() as session:
+        for label in NEO4J_ENTITY_LABELS:
+            await session.run(NEO4J_ENTITY_INDEX_QUERY.format(label=label, label_lower=label.lower()))
+        await session.run(NEO4J_LEGACY_FULLTEXT_INDEX_DROP_QUERY)
+        await session.run(NEO4J_FULLTEXT_INDEX_QUERY)
+        await session.run(NEO4J_DOCUMENT_NODE_INDEX_QUERY)
+        labelled = 0
+        while True:
+            result = await session.run(NEO4J_DOCUMENT_NODE_BACKFILL_QUERY, batch_size=NEO4J_WRITE_BATCH_SIZE)
+            record = await result.single()
+            if not record or not record["labelled"]:
+                break
+            labelled += record["labelled"]
+    if labelled:
+        logger.info(f"{labelled} node lama diberi label dokumen bersama.")
+    logger.info(f"Skema Neo4j siap: indeks (name, filename) untuk {len(NEO4J_ENTITY_LABELS)} label entitas, full-text nama, serta indeks filename dokumen.")
+
+
+async def _write_batch(tx, query: str, rows: list, filename: str):
+    """Menjalankan satu batch `UNWIND` di dalam transaksi tulis yang dikelola driver."""
+    result = await tx.run(query, rows=rows, filename=filename)
+    await result.consume()
+
+
+async def store_triplets_in_neo4j(driver: AsyncGraphDatabase.driver, structured_data: list, filename: str, batch_size: int = NEO4J_WRITE_BATCH_SIZE):
     """
     Menyimpan triplet pengetahuan yang telah diekstrak ke dalam database Neo4j secara idempoten.
 
@@ -82,30 +276,126 @@ async def store_triplets_in_neo4j(driver: AsyncGraphDatabase.driver, structured_
     dan relasi hanya jika mereka belum ada. Ini mencegah duplikasi data jika dokumen yang
     sama diproses ulang. Properti `filename` ditambahkan untuk isolasi data antar dokumen.
 
+    Triplet dikelompokkan per (label subjek, relasi, label objek) dan setiap kelompok ditulis
+    dengan kueri `UNWIND $rows` dalam batch berukuran `batch_size`, sehingga ribuan triplet
+    hanya membutuhkan segelintir round trip dan transaksi.
+
     Args:
         driver: Instance driver Neo4j yang aktif.
         structured_data (list): List berisi triplet pengetahuan yang akan disimpan.
         filename (str): Nama file asal data, untuk ditambahkan sebagai properti node.
+        batch_size (int): Jumlah baris maksimum per transaksi `UNWIND`.
     """
     if not structured_data:
         logger.info("Tidak ada data terstruktur untuk disimpan ke Neo4j.")
         return
 
+    groups = _group_triplets(structured_data)
+
+    stored = 0
+    transactions = 0
     async with driver.session() as session:
-        for head, head_label, relation, tail, tail_label in structured_data:
-            head_label = head_label or 'ENTITY'
-            tail_label = tail_label or 'ENTITY'
-            head_label_safe = ''.join(c for c in head_label.upper() if c.isalnum())
-            tail_label_safe = ''.join(c for c in tail_label.upper() if c.isalnum())
-            relation_safe = ''.join(c for c in (relation or 'RELATED_TO').upper() if c.isalnum() or c == '_')
-
-            if not all([head_label_safe, tail_label_safe, relation_safe]):
-                continue
-            
-            query = NEO4J_MERGE_QUERY.format(
-                head_label=head_label_safe,
-                tail_label=tail_label_safe,
-                relation=relation_safe
+        for (head_label, relation, tail_label), rows in groups.items():
+            query = NEO4J_UNWIND_MERGE_QUERY.format(
+                head_label=head_label,
+                tail_label=tail_label,
+                relation=relation
+            )
+            for i in range(0, len(rows), max(1, batch_size)):
+                batch = rows[i:i + batch_size]
+                await session.execute_write(_write_batch, query, batch, filename)
+                stored += len(batch)
+                transactions += 1
+    logger.info(f"Berhasil menyimpan {stored} relasi dari '{filename}' ke Neo4j dalam {transactions} transaksi.")
+
+
+async def fetch_document_triplets(driver: AsyncGraphDatabase.driver, filename: str) -> list:
+    """
+    Membaca seluruh triplet milik sebuah dokumen dari Neo4j.
+
+    Args:
+        driver: Instance driver Neo4j yang aktif.
+        filename (str): Nama file dokumen.
+
+    Returns:
+        list: Daftar triplet `[head, head_label, relation, tail, tail_label]`.
+    """
+    async with driver.session() as session:
+        result = await session.run(NEO4J_FETCH_DOCUMENT_TRIPLETS_QUERY, filename=filename)
+        records = await result.data()
+    return [
+        [record["head"], record["head_label"], record["relation"], record["tail"], record["tail_label"]]
+        for record in records
+    ]
+
+
+async def delete_triplets_from_neo4j(driver: AsyncGraphDatabase.driver, structured_data: list, filename: str, batch_size: int = NEO4J_WRITE_BATCH_SIZE):
+    """
+    Menghapus relasi milik sebuah dokumen lalu membersihkan node yang menjadi yatim.
+
+    Args:
+        driver: Instance driver Neo4j yang aktif.
+        structured_data (list): Triplet yang relasinya akan dihapus.
+        filename (str): Nama file asal data.
+        batch_size (int): Jumlah baris maksimum per transaksi `UNWIND`.
+    """
+    if not structured_data:
+        return
+
+    # Label tidak dipetakan ulang: triplet lama bisa tersimpan dengan label bebas dari versi sebelumnya.
+    groups = _group_triplets(structured_data, known_labels_only=False)
+    labels = {label for head_label, _, tail_label in groups for label in (head_label, tail_label)}
+    async with driver.session() as session:
+        for (head_label, relation, tail_label), rows in groups.items():
+            query = NEO4J_UNWIND_DELETE_QUERY.format(
+                head_label=head_label,
+                tail_label=tail_label,
+                relation=relation
             )
-            await session.run(query, head=str(head), tail=str(tail), filename=filename)
-    logger.info(f"Berhasil menyimpan {len(structured_data)} relasi dari '{filename}' ke Neo4j.")
\ No newline at end of file
+            for i in range(0, len(rows), max(1, batch_size)):
+                await session.execute_write(_write_batch, query, rows[i:i + batch_size], filename)
+        for label in labels:
+            await session.execute_write(_write_batch, NEO4J_DELETE_ORPHANS_QUERY.format(label=label), [], filename)
+    logger.info(f"Berhasil menghapus {len(structured_data)} relasi usang dari '{filename}' di Neo4j.")
+
+
+async def sync_document_triplets(driver: AsyncGraphDatabase.driver, structured_data: list, filename: str, previous_triplets: Optional[list] = None) -> list:
+    """
+    Menyinkronkan knowledge graph sebuah dokumen dengan triplet hasil ekstraksi terbaru.
+
+    Triplet dibandingkan dalam bentuk tersanitasi: hanya triplet baru yang ditulis dan
+    triplet yang tidak lagi muncul dihapus, sedangkan triplet yang sama dibiarkan.
+
+    Args:
+        driver: Instance driver Neo4j yang aktif.
+        structured_data (list): Triplet hasil ekstraksi revisi terbaru.
+        filename (str): Nama file dokumen.
+        previous_triplets (Optional[list]): Triplet tersanitasi dari manifest sebelumnya.
+            Jika `None`, triplet yang tersimpan saat ini dibaca dari Neo4j.
+
+    Returns:
+        list: Triplet tersanitasi yang kini tersimpan, untuk dicatat di manifest.
+    """
+    if previous_triplets is None:
+        previous_triplets = await fetch_document_triplets(driver, filename)
+
+    current = []
+    current_keys = set()
+    for triplet in structured_data:
+        sanitized = _sanitize_triplet(triplet)
+        if sanitized is not None and sanitized not in current_keys:
+            current_keys.add(sanitized)
+            current.append(list(sanitized))
+
+    previous_keys = {tuple(triplet) for triplet in previous_triplets}
+    new_triplets = [triplet for triplet in current if tuple(triplet) not in previous_keys]
+    vanished_triplets = [list(key) for key in previous_keys if key not in current_keys]
+
+    logger.info(
+        f"Diff knowledge graph '{filename}': {len(new_triplets)} triplet baru, "
+        f"{len(vanished_triplets)} dihapus, {len(current) - len(new_triplets)} tidak berubah."
+    )
+    await delete_triplets_from_neo4j(driver, vanished_triplets, filename)
+    if new_triplets:
+        await store_triplets_in_neo4j(driver, new_triplets, filename)
+    return current
@@ -1,6 +1,11 @@
+import asyncio
 import logging
-from typing import List
-from config import CHROMA_COLLECTION_NAME
+from typing import List, Optional
+from core.embedding_service import embed_texts, INGESTION_PRIORITY
+from core.vector_store import get_document_collection, document_filter
+from core.lexical_index import lexical_index
+from core.metrics import span
+from config import LEXICAL_SEARCH_ENABLED
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -9,10 +14,15 @@ async def index_documents(chroma_client, embedding_function, documents: List[str
     """
     Mengindeks potongan teks yang telah diperkaya ke dalam vector store ChromaDB.
 
-    Fungsi ini menggunakan `get_or_create_collection` untuk memastikan semua data dari
-    seluruh dokumen disimpan dalam satu koleksi yang konsisten. Penggunaan `cosine`
+    Fungsi ini menulis ke koleksi milik dokumen (lihat `core.vector_store.get_document_collection`):
+    partisi tersendiri per dokumen, atau koleksi bersama pada tata letak `global`. Penggunaan `cosine`
     sebagai metrik jarak adalah praktik standar untuk model embedding berbasis transformer,
-    karena efektif mengukur kesamaan semantik.
+    karena efektif mengukur kesamaan semantik. Potongan yang sama juga ditambahkan ke
+    indeks leksikal BM25 untuk pencarian hybrid.
+
+    Embedding dihitung melalui layanan embedding dengan prioritas ingesti (di-batch
+    bersama permintaan lain dan tidak memblokir event loop), lalu penulisan ke ChromaDB
+    dijalankan di thread terpisah.
 
     Args:
         chroma_client: Instance client ChromaDB yang aktif.
@@ -28,14 +38,122 @@ async def index_documents(chroma_client, embedding_function, documents: List[str
 
     logger.info(f"Memulai proses indexing untuk {len(documents)} potongan teks dari '{filename}' ke ChromaDB...")
     try:
-        collection = chroma_client.get_or_create_collection(
-            name=CHROMA_COLLECTION_NAME,
-            embedding_function=embedding_function,
-            metadata={"hnsw:space": "cosine"}
-        )
-
-        collection.add(documents=documents, metadatas=metadatas, ids=ids)
+        collection = await asyncio.to_thread(get_document_collection, chroma_client, embedding_function, filename)
+        with span("embedding"):
+            embeddings = await embed_texts(embedding_function, documents, priority=INGESTION_PRIORITY)
+        with span("index_add"):
+            await asyncio.to_thread(collection.add, documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids)
+            if LEXICAL_SEARCH_ENABLED:
+                await asyncio.to_thread(lexical_index.add, ids, documents, [metadata["source_document"] for metadata in metadatas])
         logger.info(f"Berhasil mengindeks {len(documents)} potongan teks dari '{filename}'.")
     except Exception as e:
         logger.error(f"Terjadi kegagalan saat proses indexing untuk '{filename}': {e}", exc_info=True)
         raise
+
+async def get_indexed_chunk_ids(chroma_client, embedding_function, filename: str) -> List[str]:
+    """
+    Mengambil ID seluruh chunk yang saat ini terindeks untuk sebuah dokumen.
+
+    Dipakai sebagai sumber kebenaran ketika manifest dokumen belum ada (misalnya data
+    yang diindeks sebelum manifest diperkenalkan, dengan ID berbasis posisi).
+    """
+    collection = await asyncio.to_thread(get_document_collection, chroma_client, embedding_function, filename, False)
+    if collection is None:
+        return []
+    existing = await asyncio.to_thread(collection.get, where=document_filter(filename), include=[])
+    return existing["ids"]
+
+async def sync_document_index(chroma_client, embedding_function, documents: List[str], metadatas: List[dict], ids: List[str], filename: str, previous_ids: Optional[List[str]] = None) -> dict:
+    """
+    Menyinkronkan isi vector store sebuah dokumen dengan chunk terbarunya secara inkremental.
+
+    Karena ID chunk berbasis hash isi (tanpa footer fakta graf), diff dapat dihitung langsung
+    dari himpunan ID: hanya chunk baru yang di-embed dan ditambahkan, chunk yang hilang
+    dihapus, dan chunk yang tidak berubah tidak di-embed ulang. Metadata posisinya selalu
+    diperbarui; jika hanya footer faktanya yang berubah, teks tersimpannya ikut diganti
+    dengan embedding lama. Indeks leksikal BM25 diperbarui dengan diff yang sama.
+
+    Args:
+        chroma_client: Instance client ChromaDB yang aktif.
+        embedding_function: Fungsi embedding yang akan digunakan oleh ChromaDB.
+        documents (List[str]): Seluruh potongan teks revisi terbaru dokumen.
+        metadatas (List[dict]): Metadata yang sesuai untuk setiap potongan.
+        ids (List[str]): ID berbasis hash isi untuk setiap potongan.
+        filename (str): Nama file asli dokumen.
+        previous_ids (Optional[List[str]]): ID chunk dari manifest sebelumnya. Jika `None`,
+            ID yang terindeks saat ini diambil langsung dari ChromaDB.
+
+    Returns:
+        dict: Statistik diff berisi jumlah `added`, `deleted`, dan `unchanged`.
+    """
+    if previous_ids is None:
+        previous_ids = await get_indexed_chunk_ids(chroma_client, embedding_function, filename)
+
+    previous = set(previous_ids)
+    current = set(ids)
+    new_positions = [i for i, chunk_id in enumerate(ids) if chunk_id not in previous]
+    unchanged_positions = [i for i, chunk_id in enumerate(ids) if chunk_id in previous]
+    vanished_ids = [chunk_id for chunk_id in previous_ids if chunk_id not in current]
+
+    logger.info(
+        f"Diff indeks '{filename}': {len(new_positions)} chunk baru, {len(vanished_ids)} dihapus, "
+        f"{len(unchanged_positions)} tidak berubah."
+    )
+    try:
+        collection = await asyncio.to_thread(get_document_collection, chroma_client, embedding_function, filename)
+        if vanished_ids:
+            await asyncio.to_thread(collection.delete, ids=vanished_ids)
+            if LEXICAL_SEARCH_ENABLED:
+                await asyncio.to_thread(lexical_index.delete, vanished_ids)
+        if unchanged_positions:
+            unchanged_ids = [ids[i] for i in unchanged_positions]
+            stored = await asyncio.to_thread(collection.get, ids=unchanged_ids, include=["documents", "embeddings"])
+            stored_by_id = dict(zip(stored["ids"], zip(stored["documents"], stored["embeddings"])))
+            refreshed_positions = [i for i in unchanged_positions if ids[i] in stored_by_id and stored_by_id[ids[i]][0] != documents[i]]
+            refreshed = set(refreshed_positions)
+            kept_positions = [i for i in unchanged_positions if i not in refreshed]
+            if kept_positions:
+                await asyncio.to_thread(
+                    collection.update,
+                    ids=[ids[i] for i in kept_positions],
+                    metadatas=[metadatas[i] for i in kept_positions]
+                )
+            if refreshed_positions:
+                # Hanya footer fakta graf yang berubah: teks diganti, embedding lama dipakai ulang
+                # (ChromaDB menghitung embedding baru jika `documents` dikirim tanpa `embeddings`).
+                await asyncio.to_thread(
+                    collection.update,
+                    ids=[ids[i] for i in refreshed_positions],
+                    documents=[documents[i] for i in refreshed_positions],
+                    metadatas=[metadatas[i] for i in refreshed_positions],
+                    embeddings=[stored_by_id[ids[i]][1] for i in refreshed_positions]
+                )
+                logger.info(f"{len(refreshed_positions)} chunk '{filename}' diperbarui footer faktanya tanpa embedding ulang.")
+            if LEXICAL_SEARCH_ENABLED:
+                # Chunk lama yang belum ada di indeks leksikal (diindeks sebelum BM25
+                # diperkenalkan) dan chunk yang footernya berubah ditulis ulang tanpa embedding.
+                missing = set(await asyncio.to_thread(lexical_index.missing_ids, unchanged_ids))
+                missing.update(ids[i] for i in refreshed_positions)
+                if missing:
+                    missing_positions = [i for i in unchanged_positions if ids[i] in missing]
+                    await asyncio.to_thread(
+                        lexical_index.add,
+                        [ids[i] for i in missing_positions],
+                        [documents[i] for i in missing_positions],
+                        [filename] * len(missing_positions)
+                    )
+    except Exception as e:
+        logger.error(f"Terjadi kegagalan saat sinkronisasi indeks untuk '{filename}': {e}", exc_info=True)
+        raise
+
+    if new_positions:
+        await index_documents(
+            chroma_client=chroma_client,
+            embedding_function=embedding_function,
+            documents=[documents[i] for i in new_positions],
+            metadatas=[metadatas[i] for i in new_positions],
+            ids=[ids[i] for i in new_positions],
+            filename=filename
+        )
+
+    return {"added": len(new_positions), "deleted": len(vanished_ids), "unchanged": len(unchanged_positions)}
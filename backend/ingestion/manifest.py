@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from config import MANIFEST_DIR, ENRICHMENT_MARKER
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def compute_chunk_id(filename: str, text: str) -> str:
+    """
+    Menghitung ID chunk berbasis hash isi.
+
+    ID tidak lagi bergantung pada posisi chunk, sehingga chunk yang isinya tidak berubah
+    tetap memiliki ID yang sama meskipun posisinya bergeser di revisi dokumen berikutnya.
+    Footer fakta graf (setelah `ENRICHMENT_MARKER`) tidak ikut di-hash: fakta baru tentang
+    sebuah entitas tidak boleh mengubah ID, dan memicu embedding ulang, setiap chunk yang
+    menyebut entitas tersebut.
+
+    Args:
+        filename (str): Nama file asal chunk, agar ID unik antar dokumen.
+        text (str): Isi chunk (boleh sudah diperkaya) yang akan diindeks.
+
+    Returns:
+        str: ID chunk dengan format `<filename>_<16 karakter awal SHA-256 isi>`.
+    """
+    body = text.partition(ENRICHMENT_MARKER)[0]
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+    return f"{filename}_{digest}"
+
+
+def build_chunk_records(filename: str, chunks: List[str]) -> Tuple[List[str], List[str], List[dict]]:
+    """
+    Menyusun ID, dokumen, dan metadata untuk setiap chunk, membuang chunk yang isinya kembar.
+
+    Returns:
+        Tuple[List[str], List[str], List[dict]]: `(ids, documents, metadatas)` dengan urutan
+            mengikuti kemunculan pertama setiap chunk di dokumen.
+    """
+    ids, documents, metadatas = [], [], []
+    seen = set()
+    for index, chunk in enumerate(chunks):
+        chunk_id = compute_chunk_id(filename, chunk)
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        ids.append(chunk_id)
+        documents.append(chunk)
+        metadatas.append({"source_document": filename, "chunk_index": index})
+    return ids, documents, metadatas
+
+
+def _manifest_path(filename: str) -> Path:
+    return Path(MANIFEST_DIR) / f"{filename}.json"
+
+
+def load_manifest(filename: str) -> Optional[dict]:
+    """
+    Memuat manifest dokumen hasil ingesti sebelumnya.
+
+    Returns:
+        Optional[dict]: Manifest berisi `chunk_ids` dan `triplets`, atau `None` jika dokumen
+            belum pernah diindeks dengan manifest (ingesti pertama atau data lama).
+            `chunk_ids` bernilai `None` jika triplet dokumen sudah disimpan tetapi chunk-nya
+            belum pernah berhasil diindeks (lihat `save_manifest_triplets`).
+    """
+    path = _manifest_path(filename)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Manifest untuk '{filename}' tidak dapat dibaca ({e}). Dianggap tidak ada.")
+        return None
+
+
+def _write_manifest(filename: str, chunk_ids: Optional[List[str]], triplets: Optional[list]):
+    path = _manifest_path(filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "filename": filename,
+        "chunk_ids": chunk_ids,
+        "triplets": triplets or [],
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def save_manifest(filename: str, chunk_ids: List[str], triplets: Optional[list]):
+    """
+    Menyimpan manifest dokumen secara atomik.
+
+    Args:
+        filename (str): Nama file dokumen.
+        chunk_ids (List[str]): ID seluruh chunk yang kini terindeks untuk dokumen ini.
+        triplets (Optional[list]): Triplet (tersanitasi) yang kini tersimpan di Neo4j.
+    """
+    _write_manifest(filename, chunk_ids, triplets)
+
+
+def save_manifest_triplets(filename: str, triplets: Optional[list]):
+    """
+    Memperbarui bagian `triplets` manifest tanpa mengubah `chunk_ids`.
+
+    Dipanggil segera setelah triplet ditulis ke Neo4j, karena tahap indeksasi (yang menulis
+    `chunk_ids`) bisa berjalan jauh kemudian di proses lain atau gagal permanen. Dengan begitu
+    manifest selalu mencerminkan isi Neo4j dan ingesti berikutnya menghapus triplet yang benar.
+
+    Args:
+        filename (str): Nama file dokumen.
+        triplets (Optional[list]): Triplet (tersanitasi) yang kini tersimpan di Neo4j.
+    """
+    manifest = load_manifest(filename)
+    _write_manifest(filename, manifest["chunk_ids"] if manifest else None, triplets)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Naikkan nilai ini jika format elemen yang disimpan berubah, agar entri lama diabaikan.
+PARSE_CACHE_VERSION = "1"
+
+
+def compute_cache_key(content: bytes, strategy: str, languages: List[str]) -> str:
+    """
+    Menghitung kunci cache berbasis isi (content-addressed) untuk satu halaman atau file.
+
+    Args:
+        content (bytes): Bytes mentah halaman (PDF satu halaman) atau file utuh.
+        strategy (str): Strategi partisi yang akan dipakai.
+        languages (List[str]): Bahasa OCR yang dipakai.
+
+    Returns:
+        str: Digest SHA-256 dalam bentuk heksadesimal.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{PARSE_CACHE_VERSION}|{strategy}|{','.join(languages)}|".encode("utf-8"))
+    digest.update(content)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Cache hasil partisi di disk dengan eviksi LRU berbasis ukuran total.
+
+    Setiap entri disimpan sebagai file JSON `<dir>/<2 karakter awal>/<kunci>.json`.
+    Waktu modifikasi file diperbarui setiap kali entri dibaca sehingga dapat dipakai
+    sebagai penanda "terakhir digunakan" saat eviksi. Penulisan dilakukan secara atomik
+    (file sementara + `os.replace`) agar aman dipakai beberapa proses sekaligus.
+    """
+
+    def __init__(self, cache_dir: str = PARSE_CACHE_DIR, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _entries(self) -> List[Path]:
+        if not self.cache_dir.exists():
+            return []
+        return list(self.cache_dir.glob("*/*.json"))
+
+    def _ensure_total_bytes(self) -> int:
+        if self._total_bytes is None:
+            self._total_bytes = sum(path.stat().st_size for path in self._entries())
+        return self._total_bytes
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """
+        Mengambil daftar elemen untuk kunci tertentu.
+
+        Returns:
+            Optional[List[dict]]: Elemen yang tersimpan, atau `None` jika tidak ada di cache.
+        """
+        path = self._path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                elements = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return elements
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[dict]]:
+        """Mengambil beberapa entri sekaligus. Hanya kunci yang ditemukan yang dikembalikan."""
+        found = {}
+        for key in keys:
+            elements = self.get(key)
+            if elements is not None:
+                found[key] = elements
+        return found
+
+    def put(self, key: str, elements: List[dict]):
+        """Menyimpan daftar elemen untuk kunci tertentu lalu menjalankan eviksi bila perlu."""
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        payload = json.dumps(elements, ensure_ascii=False)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        previous_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes = self._ensure_total_bytes() + path.stat().st_size - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def put_many(self, items: Dict[str, List[dict]]):
+        """Menyimpan beberapa entri sekaligus."""
+        for key, elements in items.items():
+            self.put(key, elements)
+
+    def _evict(self):
+        """Menghapus entri yang paling lama tidak dipakai hingga ukuran cache di bawah 90% batas."""
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                continue
+        self._total_bytes = total
+        logger.info(f"Eviksi cache parsing: {removed} entri dihapus, ukuran cache kini {total} bytes.")
+
+    def stats(self) -> dict:
+        """Mengembalikan statistik hit/miss cache."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+parse_cache = ParseCache()
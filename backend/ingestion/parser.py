@@ -1,35 +1,350 @@
-from unstructured.partition.auto import partition
+import asyncio
+import io
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from typing import List, Optional, Tuple
+
+from pypdf import PdfReader, PdfWriter
+
+from config import (
+    PARSER_STRATEGY,
+    PARSER_LANGUAGES,
+    PARSER_MAX_WORKERS,
+    PARSER_PAGES_PER_TASK,
+    PARSER_FAST_PATH_ENABLED,
+    PARSER_FAST_STRATEGY,
+    PARSER_MIN_TEXT_CHARS,
+    PARSER_LARGE_IMAGE_PIXELS,
+    PARSE_CACHE_ENABLED
+)
+from ingestion.parse_cache import parse_cache, compute_cache_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def parse_document(file_path: str) -> str:
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _init_parser_worker():
     """
-    Mengekstrak konten teks mentah dari sebuah file dokumen secara komprehensif.
+    Inisialisasi setiap proses worker di dalam pool parsing.
+
+    Proses anak (terutama dengan metode 'spawn' di Windows/macOS) tidak mewarisi
+    konfigurasi Tesseract dari proses utama, sehingga harus dikonfigurasi ulang di sini.
+    """
+    from ingestion.ocr_config import configure_tesseract
+    configure_tesseract()
+
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    """
+    Mengembalikan process pool bersama untuk parsing, dibuat secara lazy saat pertama dipakai.
+
+    Returns:
+        ProcessPoolExecutor: Pool dengan jumlah worker sesuai `PARSER_MAX_WORKERS`.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PARSER_MAX_WORKERS, initializer=_init_parser_worker)
+        logger.info(f"Process pool parsing dibuat dengan {PARSER_MAX_WORKERS} worker.")
+    return _process_pool
+
+
+def shutdown_parser_pool():
+    """Mematikan process pool parsing (dipanggil saat shutdown aplikasi)."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+        logger.info("Process pool parsing berhasil dimatikan.")
+
+
+async def _run_in_parser_pool(func, *args):
+    """
+    Menjalankan `func` di process pool parsing.
+
+    Jika sebuah proses di pool mati mendadak (misalnya dihentikan OOM killer), pool menjadi
+    `BrokenProcessPool` dan seluruh tugas berikutnya ikut gagal. Pool tersebut dibuang,
+    dibuat ulang, lalu tugasnya diulang satu kali.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_parser_pool()
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        logger.warning("Process pool parsing rusak (worker berhenti mendadak). Pool dibuat ulang dan tugas diulang.")
+        # Tugas lain yang gagal bersamaan tidak boleh mematikan pool yang baru dibuat.
+        if _process_pool is pool:
+            shutdown_parser_pool()
+        return await loop.run_in_executor(get_parser_pool(), func, *args)
+
+
+def _element_to_record(element) -> dict:
+    """Mengubah elemen `unstructured` menjadi dict sederhana yang aman untuk di-pickle."""
+    return {"text": element.text, "category": getattr(element, "category", None)}
+
+
+def _max_image_pixels(resources, depth: int = 0) -> int:
+    """
+    Mencari gambar tertanam terbesar (dalam piksel) pada resource sebuah halaman PDF.
+
+    Hanya membaca atribut /Width dan /Height dari XObject tanpa men-decode gambarnya,
+    sehingga sangat murah. Form XObject ditelusuri secara rekursif dengan batas kedalaman.
+    """
+    if resources is None or depth > 3:
+        return 0
+    resources = resources.get_object()
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return 0
+
+    largest = 0
+    xobjects = xobjects.get_object()
+    for name in xobjects:
+        xobject = xobjects[name].get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            largest = max(largest, int(xobject.get("/Width", 0)) * int(xobject.get("/Height", 0)))
+        elif subtype == "/Form":
+            largest = max(largest, _max_image_pixels(xobject.get("/Resources"), depth + 1))
+    return largest
+
+
+def _select_page_strategy(page) -> dict:
+    """
+    Menentukan strategi partisi untuk satu halaman PDF berdasarkan lapisan teksnya.
+
+    Halaman dengan lapisan teks yang memadai dan tanpa gambar besar dipartisi dengan
+    strategi cepat. Selebihnya (halaman pindaian, tanda tangan, infografis) tetap
+    melalui strategi 'hi_res' dengan OCR.
+
+    Args:
+        page: Objek halaman `pypdf`.
+
+    Returns:
+        dict: `{"strategy": str, "text_chars": int, "max_image_pixels": int}`.
+    """
+    if not PARSER_FAST_PATH_ENABLED:
+        return {"strategy": PARSER_STRATEGY, "text_chars": 0, "max_image_pixels": 0}
+
+    try:
+        text_chars = len((page.extract_text() or "").strip())
+        max_image_pixels = _max_image_pixels(page.get("/Resources"))
+    except Exception as e:
+        logger.debug(f"Analisis lapisan teks halaman gagal ({e}). Menggunakan strategi '{PARSER_STRATEGY}'.")
+        return {"strategy": PARSER_STRATEGY, "text_chars": 0, "max_image_pixels": 0}
+
+    if text_chars >= PARSER_MIN_TEXT_CHARS and max_image_pixels < PARSER_LARGE_IMAGE_PIXELS:
+        strategy = PARSER_FAST_STRATEGY
+    else:
+        strategy = PARSER_STRATEGY
+    return {"strategy": strategy, "text_chars": text_chars, "max_image_pixels": max_image_pixels}
+
+
+def _split_pdf_pages(file_path: str) -> List[dict]:
+    """
+    Memecah file PDF menjadi PDF satu halaman dan memilih strategi partisi per halaman.
+
+    Args:
+        file_path (str): Path menuju file PDF.
+
+    Returns:
+        List[dict]: `{"page_number", "pdf_bytes", "strategy", "text_chars", "max_image_pixels"}`
+            untuk setiap halaman, berurutan sesuai nomor halaman.
+    """
+    reader = PdfReader(file_path)
+    pages = []
+    for page_number, page in enumerate(reader.pages, start=1):
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pages.append({"page_number": page_number, "pdf_bytes": buffer.getvalue(), **_select_page_strategy(page)})
+    return pages
 
-    Fungsi ini adalah titik awal dari pipeline ingesti. Ia menggunakan pustaka `unstructured`
-    dengan strategi 'hi_res'. Strategi ini dipilih karena kemampuannya menangani dokumen
-    kompleks (seperti PDF) yang mungkin berisi teks, tabel, dan gambar. 'hi_res' secara
-    otomatis akan menerapkan OCR (Optical Character Recognition) jika diperlukan.
+
+def _partition_pages(pages: List[Tuple[int, bytes]], strategy: str, languages: List[str]) -> List[Tuple[int, List[dict]]]:
+    """
+    Mempartisi sekumpulan halaman PDF dengan strategi yang sama. Dijalankan di dalam proses worker.
+
+    Args:
+        pages (List[Tuple[int, bytes]]): Pasangan (nomor halaman, bytes PDF satu halaman).
+        strategy (str): Strategi partisi `unstructured` ('hi_res' atau 'fast').
+        languages (List[str]): Bahasa untuk OCR.
+
+    Returns:
+        List[Tuple[int, List[dict]]]: Elemen hasil partisi untuk setiap nomor halaman.
+    """
+    from unstructured.partition.pdf import partition_pdf
+
+    results = []
+    for page_number, pdf_bytes in pages:
+        elements = partition_pdf(file=io.BytesIO(pdf_bytes), strategy=strategy, languages=languages)
+        results.append((page_number, [_element_to_record(el) for el in elements]))
+    return results
+
+
+def _partition_file(file_path: str, strategy: str, languages: List[str]) -> List[dict]:
+    """
+    Mempartisi seluruh file dalam satu tugas. Dipakai untuk format non-PDF atau PDF
+    yang tidak dapat dipecah per halaman. Dijalankan di dalam proses worker.
+    """
+    from unstructured.partition.auto import partition
+
+    elements = partition(filename=file_path, strategy=strategy, languages=languages)
+    return [_element_to_record(el) for el in elements]
+
+
+async def _parse_single_file(file_path: str) -> List[dict]:
+    """Mempartisi file non-PDF (atau PDF yang gagal dipecah) sebagai satu tugas, dengan cache."""
+    cache_key = None
+    if PARSE_CACHE_ENABLED:
+        content = await asyncio.to_thread(Path(file_path).read_bytes)
+        cache_key = compute_cache_key(content, PARSER_STRATEGY, PARSER_LANGUAGES)
+        cached_elements = await asyncio.to_thread(parse_cache.get, cache_key)
+        if cached_elements is not None:
+            return [{"page_number": 1, "strategy": PARSER_STRATEGY, "text_chars": None, "max_image_pixels": None, "cached": True, "elements": cached_elements}]
+
+    elements = await _run_in_parser_pool(_partition_file, file_path, PARSER_STRATEGY, PARSER_LANGUAGES)
+    if cache_key:
+        await asyncio.to_thread(parse_cache.put, cache_key, elements)
+    return [{"page_number": 1, "strategy": PARSER_STRATEGY, "text_chars": None, "max_image_pixels": None, "cached": False, "elements": elements}]
+
+
+async def _parse_pages(file_path: str) -> List[dict]:
+    """
+    Mempartisi dokumen di dalam process pool dan mengembalikan hasil per halaman.
+
+    PDF dipecah per halaman dan setiap halaman diberi strategi ('fast' atau 'hi_res').
+    Halaman yang hasil partisinya sudah ada di cache (kunci: hash bytes halaman + strategi
+    + bahasa) langsung dipakai ulang. Sisanya dikelompokkan per strategi menjadi tugas
+    berisi `PARSER_PAGES_PER_TASK` halaman yang dijalankan paralel. Hasilnya digabungkan
+    kembali sesuai urutan halaman.
+
+    Args:
+        file_path (str): Path menuju file yang akan diproses.
+
+    Returns:
+        List[dict]: Daftar `{"page_number", "strategy", "text_chars", "max_image_pixels",
+            "cached", "elements"}` terurut per halaman.
+    """
+    pdf_pages = None
+    if Path(file_path).suffix.lower() == ".pdf":
+        try:
+            pdf_pages = await asyncio.to_thread(_split_pdf_pages, file_path)
+        except Exception as e:
+            logger.warning(f"Gagal memecah PDF per halaman ({e}). Parsing dilakukan untuk seluruh file.")
+
+    if not pdf_pages:
+        return await _parse_single_file(file_path)
+
+    elements_by_page = {}
+    cache_keys = {}
+    if PARSE_CACHE_ENABLED:
+        cache_keys = {
+            page["page_number"]: compute_cache_key(page["pdf_bytes"], page["strategy"], PARSER_LANGUAGES)
+            for page in pdf_pages
+        }
+        cached = await asyncio.to_thread(parse_cache.get_many, cache_keys.values())
+        for page_number, key in cache_keys.items():
+            if key in cached:
+                elements_by_page[page_number] = cached[key]
+        if elements_by_page:
+            logger.info(f"Cache parsing: {len(elements_by_page)}/{len(pdf_pages)} halaman diambil dari cache.")
+
+    batch_size = max(1, PARSER_PAGES_PER_TASK)
+    batches = []
+    for strategy in (PARSER_FAST_STRATEGY, PARSER_STRATEGY):
+        numbered_pages = [
+            (page["page_number"], page["pdf_bytes"])
+            for page in pdf_pages
+            if page["strategy"] == strategy and page["page_number"] not in elements_by_page
+        ]
+        batches.extend(
+            (strategy, numbered_pages[i:i + batch_size]) for i in range(0, len(numbered_pages), batch_size)
+        )
+
+    parsed_by_page = {}
+    if batches:
+        logger.info(f"Mempartisi {sum(len(batch) for _, batch in batches)} halaman dalam {len(batches)} tugas paralel...")
+        batch_results = await asyncio.gather(*[
+            _run_in_parser_pool(_partition_pages, batch, strategy, PARSER_LANGUAGES)
+            for strategy, batch in batches
+        ])
+        parsed_by_page = {
+            page_number: elements
+            for results in batch_results
+            for page_number, elements in results
+        }
+        if cache_keys:
+            await asyncio.to_thread(
+                parse_cache.put_many,
+                {cache_keys[page_number]: elements for page_number, elements in parsed_by_page.items()}
+            )
+
+    pages = []
+    for page in pdf_pages:
+        record = {key: value for key, value in page.items() if key != "pdf_bytes"}
+        record["cached"] = page["page_number"] in elements_by_page
+        record["elements"] = elements_by_page.get(page["page_number"], parsed_by_page.get(page["page_number"], []))
+        pages.append(record)
+    return pages
+
+
+def _summarize_strategies(pages: List[dict]) -> str:
+    """Membuat ringkasan singkat strategi yang dipakai per halaman untuk keperluan logging."""
+    by_strategy = {}
+    for page in pages:
+        by_strategy.setdefault(page["strategy"], []).append(str(page["page_number"]))
+    return "; ".join(f"{strategy}: halaman {', '.join(numbers)}" for strategy, numbers in by_strategy.items())
+
+
+async def parse_document_with_report(file_path: str) -> Tuple[str, List[dict]]:
+    """
+    Mengekstrak teks dokumen sekaligus melaporkan strategi partisi yang dipakai per halaman.
 
     Args:
         file_path (str): Path absolut menuju file yang akan diproses.
 
     Returns:
-        str: Konten teks yang telah diekstrak. Mengembalikan string kosong jika terjadi kegagalan.
+        Tuple[str, List[dict]]: Teks hasil ekstraksi dan laporan per halaman berisi
+            `page_number`, `strategy`, `text_chars`, `max_image_pixels`, `cached`, dan
+            `elements` (jumlah elemen). Mengembalikan `("", [])` jika terjadi kegagalan.
     """
     filename = Path(file_path).name
     logger.info(f"Memulai proses parsing untuk dokumen: '{filename}'...")
     try:
-        # `partition` adalah fungsi utama dari `unstructured` yang secara cerdas memilih
-        # parser yang tepat berdasarkan tipe file. Bahasa 'ind' dan 'eng' 
-        elements = partition(filename=file_path, strategy="hi_res", languages=["ind", "eng"])
-        extracted_text = "\n\n".join([el.text for el in elements])
-        
-        logger.info(f"Berhasil mem-parsing dokumen '{filename}'. Total karakter diekstrak: {len(extracted_text)}")
-        return extracted_text
+        pages = await _parse_pages(file_path)
+        extracted_text = "\n\n".join(el["text"] for page in pages for el in page["elements"])
+        report = [{**page, "elements": len(page["elements"])} for page in pages]
+
+        logger.info(f"Strategi parsing '{filename}': {_summarize_strategies(pages)}")
+        logger.info(f"Berhasil mem-parsing dokumen '{filename}' ({len(pages)} halaman). Total karakter diekstrak: {len(extracted_text)}")
+        return extracted_text, report
     except Exception as e:
         logger.error(f"Terjadi kegagalan saat mem-parsing dokumen '{filename}': {e}", exc_info=True)
-        return ""
+        return "", []
+
+
+async def parse_document(file_path: str) -> str:
+    """
+    Mengekstrak konten teks mentah dari sebuah file dokumen secara komprehensif.
+
+    Fungsi ini adalah titik awal dari pipeline ingesti. Ia menggunakan pustaka `unstructured`
+    dengan strategi 'hi_res' untuk halaman yang membutuhkan OCR (pindaian, gambar besar),
+    sedangkan halaman PDF digital yang lapisan teksnya sudah memadai memakai strategi
+    'fast' tanpa layout model dan OCR.
+
+    Partisi dijalankan di dalam process pool (per halaman untuk PDF) sehingga event loop
+    tidak pernah terblokir dan dokumen besar diproses paralel di seluruh core CPU.
+
+    Args:
+        file_path (str): Path absolut menuju file yang akan diproses.
+
+    Returns:
+        str: Konten teks yang telah diekstrak. Mengembalikan string kosong jika terjadi kegagalan.
+    """
+    extracted_text, _ = await parse_document_with_report(file_path)
+    return extracted_text
@@ -1,14 +1,162 @@
+import asyncio
 import logging
 import shutil
 from pathlib import Path
+from typing import List, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from ingestion.parser import parse_document
-from ingestion.graph_builder import extract_knowledge_graph_from_text, store_triplets_in_neo4j
-from ingestion.indexer import index_documents
+from ingestion.graph_builder import extract_knowledge_graph_from_text, sync_document_triplets
+from ingestion.indexer import sync_document_index
+from ingestion.manifest import build_chunk_records, load_manifest, save_manifest, save_manifest_triplets
+from retrieval.retrieval_cache import retrieval_cache
+from retrieval.graph_cache import graph_cache
+from ingestion.entity_matcher import EntityMatcher
+from core.metrics import span, start_trace
+from config import CHUNK_SIZE, CHUNK_OVERLAP, ENRICHMENT_CASE_INSENSITIVE, ENRICHMENT_MARKER
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _enrich_chunks(chunks: List[str], structured_data: list, case_insensitive: bool = ENRICHMENT_CASE_INSENSITIVE) -> List[str]:
+    """
+    Menyuntikkan fakta dari knowledge graph ke setiap potongan teks yang menyebut entitasnya.
+
+    Sebuah fakta dilampirkan ke potongan teks jika subjek atau objeknya muncul di dalam
+    potongan tersebut. Seluruh nama entitas dikompilasi satu kali menjadi automaton
+    Aho-Corasick sehingga setiap potongan cukup dipindai sekali, dan setiap baris fakta
+    hanya diformat satu kali lalu dipakai ulang.
+
+    Args:
+        chunks (List[str]): Potongan teks hasil chunking.
+        structured_data (list): Triplet pengetahuan hasil ekstraksi.
+        case_insensitive (bool): Jika True, pencocokan tidak peka huruf besar/kecil dan spasi.
+
+    Returns:
+        List[str]: Potongan teks yang telah diperkaya, dengan urutan yang sama seperti `chunks`.
+    """
+    fact_lines = []
+    surface_forms = {}
+    triplets_by_form = []
+    for index, (head, _, relation, tail, _) in enumerate(structured_data):
+        fact_lines.append(f"- Fakta Terkait: {head} -> {str(relation).replace('_', ' ').title()} -> {tail}\n")
+        for form in (str(head), str(tail)):
+            if form not in surface_forms:
+                surface_forms[form] = len(surface_forms)
+                triplets_by_form.append([])
+            triplets_by_form[surface_forms[form]].append(index)
+
+    matcher = EntityMatcher(surface_forms, normalize=case_insensitive)
+
+    enriched_chunks = []
+    for chunk in chunks:
+        matched_triplets = set()
+        for form_index in matcher.find(chunk):
+            matched_triplets.update(triplets_by_form[form_index])
+
+        if matched_triplets:
+            enrichment_text = "".join(fact_lines[i] for i in sorted(matched_triplets))
+            enriched_chunks.append(f"{chunk}{ENRICHMENT_MARKER}{enrichment_text}")
+        else:
+            enriched_chunks.append(chunk)
+    return enriched_chunks
+
+
+async def parse_stage(file_path: str) -> str:
+    """Tahap 1: mengekstrak teks bersih dari file, dengan dukungan OCR."""
+    with span("parse"):
+        return await parse_document(file_path)
+
+
+async def extract_stage(text_content: str, filename: str, neo4j_driver, llm_model, previous_triplets: Optional[list], strict: bool = False) -> Tuple[Optional[list], Optional[list]]:
+    """
+    Tahap 2: mengekstrak knowledge graph dan menyinkronkannya ke Neo4j.
+
+    Secara default kegagalan ekstraksi tidak menghentikan pipeline; dokumen tetap diindeks
+    dengan teks asli. Dengan `strict=True` exception diteruskan agar tahap dapat diulang.
+
+    Returns:
+        Tuple[Optional[list], Optional[list]]: Triplet hasil ekstraksi dan triplet yang
+            tersimpan di Neo4j untuk dokumen ini (untuk manifest).
+    """
+    logger.info(f"Memulai ekstraksi knowledge graph untuk '{filename}'...")
+    structured_data = None
+    stored_triplets = previous_triplets
+    try:
+        with span("kg_extraction"):
+            structured_data = await extract_knowledge_graph_from_text(text_content, llm_model=llm_model)
+        if structured_data:
+            with span("neo4j_write"):
+                stored_triplets = await sync_document_triplets(
+                    driver=neo4j_driver,
+                    structured_data=structured_data,
+                    filename=filename,
+                    previous_triplets=stored_triplets
+                )
+            # Manifest langsung diselaraskan dengan Neo4j, tidak menunggu tahap indeksasi.
+            await asyncio.to_thread(save_manifest_triplets, filename, stored_triplets)
+        else:
+            logger.info(f"Tidak ada data terstruktur yang diekstrak untuk '{filename}'. Melanjutkan dengan teks asli.")
+    except Exception as e:
+        if strict:
+            raise
+        logger.error(f"Gagal saat ekstraksi knowledge graph untuk '{filename}': {e}. Proses ingesti tetap dilanjutkan.", exc_info=True)
+    return structured_data, stored_triplets
+
+
+def chunk_stage(text_content: str, filename: str, structured_data: Optional[list]) -> List[str]:
+    """Tahap 3: memecah teks menjadi potongan dan memperkayanya dengan konteks graf."""
+    logger.info(f"Memecah teks dari '{filename}' menjadi beberapa potongan (chunks)...")
+    with span("chunking"):
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len,
+        )
+        chunks = text_splitter.split_text(text_content)
+    logger.info(f"Teks berhasil dipecah menjadi {len(chunks)} potongan.")
+
+    if not structured_data:
+        return chunks
+    logger.info(f"Memperkaya {len(chunks)} potongan teks dengan konteks dari knowledge graph...")
+    with span("enrichment"):
+        enriched_chunks = _enrich_chunks(chunks, structured_data)
+    logger.info(f"Pengayaan konteks selesai. Total potongan diperkaya: {len(enriched_chunks)}")
+    return enriched_chunks
+
+
+async def index_stage(filename: str, enriched_chunks: List[str], stored_triplets: Optional[list], previous_ids: Optional[List[str]], chroma_client, embedding_function) -> dict:
+    """
+    Tahap 4: menyinkronkan potongan teks ke vector store dan indeks leksikal, menyimpan
+    manifest, lalu memperbarui cache retrieval dan cache graf milik proses ini.
+
+    Tahap ini harus berjalan di proses API, karena ChromaDB persisten, model embedding,
+    dan cache retrieval hidup di proses tersebut.
+
+    Returns:
+        dict: Ringkasan diff (`added`, `deleted`, `unchanged`).
+    """
+    ids, documents, metadatas = build_chunk_records(filename, enriched_chunks)
+
+    diff = await sync_document_index(
+        chroma_client=chroma_client,
+        embedding_function=embedding_function,
+        documents=documents,
+        metadatas=metadatas,
+        ids=ids,
+        filename=filename,
+        previous_ids=previous_ids
+    )
+    save_manifest(filename, chunk_ids=ids, triplets=stored_triplets)
+    retrieval_cache.invalidate_document(filename)
+    if stored_triplets is not None:
+        # Graf dokumen di cache adjacency langsung diganti dengan triplet terbaru, tanpa membaca ulang Neo4j.
+        graph_cache.populate(filename, ((head, relation, tail) for head, _, relation, tail, _ in stored_triplets))
+    else:
+        graph_cache.invalidate(filename)
+    logger.info(f"Indeks '{filename}' diperbarui: {diff['added']} ditambahkan, {diff['deleted']} dihapus, {diff['unchanged']} tidak berubah.")
+    return diff
+
+
 async def process_document(file_path: str, neo4j_driver, chroma_client, embedding_function, llm_model):
     """
     Mengorkestrasi pipeline ingesti dokumen dari awal hingga akhir.
@@ -27,6 +175,13 @@ async def process_document(file_path: str, neo4j_driver, chroma_client, embeddin
     5. Indeksasi: Melakukan vektorisasi pada potongan yang telah diperkaya dan
        menyimpannya ke dalam ChromaDB untuk pencarian semantik.
 
+    Ingesti ulang bersifat inkremental: ID chunk berbasis hash isi dan manifest dokumen
+    dipakai untuk menghitung diff, sehingga hanya chunk dan triplet yang berubah yang
+    ditulis atau dihapus di ChromaDB dan Neo4j.
+
+    Setiap fase juga tersedia sebagai fungsi tahap tersendiri (`parse_stage`, `extract_stage`,
+    `chunk_stage`, `index_stage`) yang dipakai oleh worker antrean ingesti.
+
     Args:
         file_path (str): Path absolut ke file yang akan diproses.
         neo4j_driver: Instance driver Neo4j yang aktif.
@@ -36,68 +191,36 @@ async def process_document(file_path: str, neo4j_driver, chroma_client, embeddin
     """
     filename = Path(file_path).name
     try:
-        logger.info(f"Memulai pipeline ingesti untuk '{filename}'...")
-        
-        # --- Fase 1: Parsing Dokumen ---
-        text_content = await parse_document(file_path)
-        if not text_content or not text_content.strip():
-            logger.warning(f"Teks tidak ditemukan atau kosong untuk '{filename}'. Pipeline dihentikan untuk file ini.")
-            return
-
-        # --- Fase 2: Ekstraksi dan Penyimpanan Knowledge Graph ---
-        logger.info(f"Memulai ekstraksi knowledge graph untuk '{filename}'...")
-        structured_data = None
-        try:
-            structured_data = await extract_knowledge_graph_from_text(text_content, llm_model=llm_model)
-            if structured_data:
-                await store_triplets_in_neo4j(driver=neo4j_driver, structured_data=structured_data, filename=filename)
-            else:
-                logger.info(f"Tidak ada data terstruktur yang diekstrak untuk '{filename}'. Melanjutkan dengan teks asli.")
-        except Exception as e:
-            logger.error(f"Gagal saat ekstraksi knowledge graph untuk '{filename}': {e}. Proses ingesti tetap dilanjutkan.", exc_info=True)
-
-        # --- Fase 3: Pemecahan Teks (Chunking) ---
-        logger.info(f"Memecah teks dari '{filename}' menjadi beberapa potongan (chunks)...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,    
-            chunk_overlap=200,  
-            length_function=len,
-        )
-        chunks = text_splitter.split_text(text_content)
-        logger.info(f"Teks berhasil dipecah menjadi {len(chunks)} potongan.")
+        with start_trace("ingestion", filename):
+            logger.info(f"Memulai pipeline ingesti untuk '{filename}'...")
+            manifest = load_manifest(filename)
+            if manifest:
+                logger.info(f"Manifest ditemukan untuk '{filename}'. Ingesti ulang akan diproses secara inkremental.")
 
-        # --- Fase 4: Pengayaan Potongan Teks dengan Konteks Graf ---
-        enriched_chunks = chunks
-        if structured_data:
-            logger.info(f"Memperkaya {len(chunks)} potongan teks dengan konteks dari knowledge graph...")
-            temp_enriched_chunks = []
-            for chunk in chunks:
-                enrichment_text = ""
-                for head, _, relation, tail, _ in structured_data:
-                    if str(head) in chunk or str(tail) in chunk:
-                        enrichment_text += f"- Fakta Terkait: {head} -> {relation.replace('_', ' ').title()} -> {tail}\n"
-                
-                if enrichment_text:
-                    temp_enriched_chunks.append(f"{chunk}\n\n[Konteks dari Knowledge Graph]:\n{enrichment_text}")
-                else:
-                    temp_enriched_chunks.append(chunk)
-            enriched_chunks = temp_enriched_chunks
-            logger.info(f"Pengayaan konteks selesai. Total potongan diperkaya: {len(enriched_chunks)}")
-
-        # --- Fase 5: Pengindeksan ke Vector Store ---
-        ids = [f"{filename}_{i}" for i in range(len(enriched_chunks))]
-        metadatas = [{"source_document": filename} for _ in enriched_chunks]
-        
-        await index_documents(
-            chroma_client=chroma_client,
-            embedding_function=embedding_function,
-            documents=enriched_chunks,
-            metadatas=metadatas,
-            ids=ids,
-            filename=filename
-        )
-        
-        logger.info(f"Pipeline ingesti untuk '{filename}' selesai dengan sukses.")
+            # --- Fase 1: Parsing Dokumen ---
+            text_content = await parse_stage(file_path)
+            if not text_content or not text_content.strip():
+                logger.warning(f"Teks tidak ditemukan atau kosong untuk '{filename}'. Pipeline dihentikan untuk file ini.")
+                return
+
+            # --- Fase 2: Ekstraksi dan Penyimpanan Knowledge Graph ---
+            structured_data, stored_triplets = await extract_stage(
+                text_content, filename, neo4j_driver, llm_model,
+                previous_triplets=manifest["triplets"] if manifest else None
+            )
+
+            # --- Fase 3 & 4: Pemecahan Teks (Chunking) dan Pengayaan dengan Konteks Graf ---
+            enriched_chunks = chunk_stage(text_content, filename, structured_data)
+
+            # --- Fase 5: Pengindeksan ke Vector Store ---
+            await index_stage(
+                filename, enriched_chunks, stored_triplets,
+                previous_ids=manifest["chunk_ids"] if manifest else None,
+                chroma_client=chroma_client,
+                embedding_function=embedding_function
+            )
+
+            logger.info(f"Pipeline ingesti untuk '{filename}' selesai dengan sukses.")
 
     except Exception as e:
         logger.error(f"Terjadi kesalahan fatal dalam pipeline untuk '{filename}': {e}", exc_info=True)
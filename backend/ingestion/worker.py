@@ -0,0 +1,306 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from config import (
+    NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD,
+    LLM_MODEL_NAME, GOOGLE_API_KEY,
+    JOB_ARTIFACT_DIR,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL_SECONDS,
+    JOB_HEARTBEAT_INTERVAL_SECONDS
+)
+from core.job_queue import job_queue, WORKER_STAGES
+from core.metrics import current_trace, replay_summary, start_trace
+from ingestion.manifest import load_manifest
+from ingestion.pipeline import parse_stage, extract_stage, chunk_stage, index_stage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _artifact_path(job_id: str, stage: str) -> Path:
+    return Path(JOB_ARTIFACT_DIR) / job_id / f"{stage}.json"
+
+
+def _save_artifact(job_id: str, stage: str, data: dict):
+    """Menyimpan hasil sebuah tahap secara atomik agar tahap berikutnya dapat diulang tanpa mengulang tahap ini."""
+    path = _artifact_path(job_id, stage)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _load_artifact(job_id: str, stage: str) -> dict:
+    with open(_artifact_path(job_id, stage), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove_artifacts(job_id: str):
+    shutil.rmtree(Path(JOB_ARTIFACT_DIR) / job_id, ignore_errors=True)
+
+
+async def run_worker_stages(job: dict, neo4j_driver, llm_model):
+    """
+    Menjalankan tahap parse, extract, dan chunk untuk satu job, melanjutkan dari tahap yang
+    belum selesai. Setelah ketiganya selesai, job menunggu tahap indeksasi di proses API.
+
+    Args:
+        job (dict): Job yang sudah diambil dari antrean.
+        neo4j_driver: Instance driver Neo4j milik worker.
+        llm_model: Model bahasa untuk ekstraksi knowledge graph.
+    """
+    job_id, filename = job["id"], job["filename"]
+    results = {}
+    trace = current_trace()
+
+    for stage in WORKER_STAGES:
+        stage_state = job["stages"][stage]
+        if stage_state["status"] == "done":
+            continue
+
+        await asyncio.to_thread(job_queue.start_stage, job_id, stage)
+        started = time.perf_counter()
+        checkpoint = trace.checkpoint() if trace else None
+        try:
+            if stage == "parse":
+                text_content = await parse_stage(job["file_path"])
+                if not text_content or not text_content.strip():
+                    logger.warning(f"Teks tidak ditemukan atau kosong untuk '{filename}'. Job {job_id} dihentikan.")
+                    await asyncio.to_thread(job_queue.set_status, job_id, "failed", "Teks tidak ditemukan atau kosong.")
+                    return
+                results[stage] = {"text": text_content}
+                details = {"characters": len(text_content)}
+            elif stage == "extract":
+                text_content = (results.get("parse") or _load_artifact(job_id, "parse"))["text"]
+                manifest = load_manifest(filename)
+                # Percobaan terakhir tidak strict: jika ekstraksi tetap gagal, dokumen diindeks dengan teks asli.
+                strict = stage_state.get("attempts", 0) + 1 < JOB_MAX_ATTEMPTS
+                structured_data, stored_triplets = await extract_stage(
+                    text_content, filename, neo4j_driver, llm_model,
+                    previous_triplets=manifest["triplets"] if manifest else None,
+                    strict=strict
+                )
+                results[stage] = {"structured_data": structured_data, "stored_triplets": stored_triplets}
+                details = {"triplets": len(structured_data or [])}
+            else:
+                text_content = (results.get("parse") or _load_artifact(job_id, "parse"))["text"]
+                structured_data = (results.get("extract") or _load_artifact(job_id, "extract"))["structured_data"]
+                chunks = chunk_stage(text_content, filename, structured_data)
+                results[stage] = {"chunks": chunks}
+                details = {"chunks": len(chunks)}
+
+            await asyncio.to_thread(_save_artifact, job_id, stage, results[stage])
+            if trace:
+                # Span milik tahap ini dititipkan di detail job agar proses API dapat
+                # memasukkannya ke /metrics (lihat `run_index_stage`).
+                details["trace"] = {**trace.summary(checkpoint), "pid": os.getpid()}
+        except Exception as e:
+            retry = await asyncio.to_thread(job_queue.fail_stage, job_id, stage, str(e), "queued")
+            logger.error(f"Tahap '{stage}' untuk '{filename}' (job {job_id}) gagal: {e}. {'Akan diulang.' if retry else 'Job gagal.'}", exc_info=True)
+            return
+
+        await asyncio.to_thread(job_queue.finish_stage, job_id, stage, (time.perf_counter() - started) * 1000, **details)
+        logger.info(f"Tahap '{stage}' untuk '{filename}' (job {job_id}) selesai.")
+
+    await asyncio.to_thread(job_queue.set_status, job_id, "pending_index")
+
+
+async def run_index_stage(job: dict, chroma_client, embedding_function):
+    """
+    Menjalankan tahap indeksasi untuk job yang tahap worker-nya sudah selesai, lalu
+    menandai job berhasil dan membersihkan artefaknya.
+    """
+    job_id, filename = job["id"], job["filename"]
+    await asyncio.to_thread(job_queue.start_stage, job_id, "index")
+    started = time.perf_counter()
+    try:
+        chunks = (await asyncio.to_thread(_load_artifact, job_id, "chunk"))["chunks"]
+        stored_triplets = (await asyncio.to_thread(_load_artifact, job_id, "extract"))["stored_triplets"]
+        manifest = load_manifest(filename)
+        diff = await index_stage(
+            filename, chunks, stored_triplets,
+            previous_ids=manifest["chunk_ids"] if manifest else None,
+            chroma_client=chroma_client,
+            embedding_function=embedding_function
+        )
+    except Exception as e:
+        retry = await asyncio.to_thread(job_queue.fail_stage, job_id, "index", str(e), "pending_index")
+        logger.error(f"Tahap 'index' untuk '{filename}' (job {job_id}) gagal: {e}. {'Akan diulang.' if retry else 'Job gagal.'}", exc_info=True)
+        return
+
+    await asyncio.to_thread(job_queue.finish_stage, job_id, "index", (time.perf_counter() - started) * 1000, **diff)
+    for stage in WORKER_STAGES:
+        worker_trace = job["stages"][stage].get("trace")
+        # Tahap yang dijalankan di proses ini (INGESTION_WORKERS=0) sudah tercatat langsung.
+        if worker_trace and worker_trace.get("pid") != os.getpid():
+            replay_summary(worker_trace)
+    await asyncio.to_thread(job_queue.set_status, job_id, "succeeded")
+    await asyncio.to_thread(_remove_artifacts, job_id)
+    logger.info(f"Pipeline ingesti untuk '{filename}' (job {job_id}) selesai dengan sukses.")
+
+
+async def _heartbeat(job_id: str):
+    """Memperpanjang lease job secara berkala selama job masih dikerjakan."""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL_SECONDS)
+        try:
+            if not await asyncio.to_thread(job_queue.heartbeat, job_id):
+                logger.warning(f"Lease job {job_id} sudah tidak dimiliki proses ini (lease habis dan job dipulihkan).")
+                return
+        except Exception as e:
+            logger.warning(f"Gagal memperpanjang lease job {job_id}: {e}")
+
+
+async def _poll(claim: Callable[[], Optional[dict]], handle, should_stop: Callable[[], bool], on_idle: Optional[Callable[[], None]] = None):
+    while not should_stop():
+        job = await asyncio.to_thread(claim)
+        if job is None:
+            if on_idle is not None:
+                await asyncio.to_thread(on_idle)
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+            continue
+        heartbeat = asyncio.create_task(_heartbeat(job["id"]))
+        try:
+            with start_trace("ingestion", job["id"]):
+                await handle(job)
+        except Exception as e:
+            logger.error(f"Kesalahan tak terduga saat memproses job {job['id']}: {e}", exc_info=True)
+        finally:
+            heartbeat.cancel()
+
+
+async def worker_loop(worker: str, neo4j_driver, llm_model, should_stop: Callable[[], bool]):
+    """Mengambil job berstatus `queued` dan menjalankan tahap-tahap worker hingga dihentikan."""
+    await _poll(
+        lambda: job_queue.claim("queued", "running", worker),
+        lambda job: run_worker_stages(job, neo4j_driver, llm_model),
+        should_stop
+    )
+
+
+async def index_loop(chroma_client, embedding_function, should_stop: Callable[[], bool], on_idle: Optional[Callable[[], None]] = None):
+    """
+    Mengambil job berstatus `pending_index` dan menjalankan tahap indeksasi di proses API.
+
+    `on_idle` dipanggil setiap kali antrean kosong (misalnya untuk menjalankan ulang worker yang mati).
+    """
+    await _poll(
+        lambda: job_queue.claim("pending_index", "indexing", f"api-{os.getpid()}"),
+        lambda job: run_index_stage(job, chroma_client, embedding_function),
+        should_stop,
+        on_idle
+    )
+
+
+async def recovery_loop(should_stop: Callable[[], bool]):
+    """
+    Memulihkan job yang ditinggalkan prosesnya (lease habis atau pemiliknya mati) secara
+    berkala, termasuk job milik proses API atau host lain yang berbagi antrean yang sama.
+    """
+    while not should_stop():
+        try:
+            await asyncio.to_thread(job_queue.recover)
+        except Exception as e:
+            logger.error(f"Gagal memulihkan job ingesti yang terputus: {e}", exc_info=True)
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL_SECONDS)
+
+
+async def _run_worker_process(worker: str, stop_event):
+    # Diimpor di sini agar hanya dimuat di proses worker.
+    from neo4j import AsyncGraphDatabase
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from ingestion.parser import shutdown_parser_pool
+
+    neo4j_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+    llm_model = ChatGoogleGenerativeAI(model=LLM_MODEL_NAME, google_api_key=GOOGLE_API_KEY, temperature=0.1)
+    logger.info(f"Worker ingesti '{worker}' siap (pid {os.getpid()}).")
+    try:
+        await worker_loop(worker, neo4j_driver, llm_model, stop_event.is_set)
+    finally:
+        await neo4j_driver.close()
+        shutdown_parser_pool()
+        logger.info(f"Worker ingesti '{worker}' berhenti.")
+
+
+def run_worker_process(worker: str, stop_event):
+    """Entry point proses worker ingesti."""
+    from ingestion.ocr_config import configure_tesseract
+
+    configure_tesseract()
+    asyncio.run(_run_worker_process(worker, stop_event))
+
+
+class IngestionWorkerPool:
+    """
+    Kumpulan proses worker ingesti dengan ukuran tetap.
+
+    Proses dibuat dengan metode `spawn` (aman dipakai bersama thread dan event loop di
+    proses API) dan bukan daemon, sehingga setiap worker tetap dapat memakai process pool
+    parser-nya sendiri. Worker yang mati secara tak terduga dijalankan ulang oleh `ensure_alive`,
+    dan job yang sedang dipegangnya langsung dikembalikan ke antrean.
+
+    Args:
+        size (int): Jumlah proses worker.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * size
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=run_worker_process,
+            args=(f"worker-{index}", self._stop_event),
+            name=f"ingestion-worker-{index}",
+            daemon=False
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        for index in range(self.size):
+            self._spawn(index)
+        logger.info(f"{self.size} proses worker ingesti dijalankan.")
+
+    def ensure_alive(self):
+        """
+        Menjalankan ulang worker yang sudah berhenti, kecuali pool sedang dihentikan, lalu
+        memulihkan job yang masih tercatat dipegang worker tersebut.
+        """
+        if self._stop_event.is_set():
+            return
+        dead_pids = []
+        for index, process in enumerate(self._processes):
+            if process is not None and not process.is_alive():
+                logger.warning(f"Worker ingesti '{process.name}' berhenti (exit code {process.exitcode}), menjalankan ulang.")
+                dead_pids.append(process.pid)
+                self._spawn(index)
+        if dead_pids:
+            job_queue.recover(dead_pids=dead_pids)
+
+    def alive(self) -> int:
+        return sum(1 for process in self._processes if process is not None and process.is_alive())
+
+    def stop(self, timeout: float = 10.0):
+        """Menghentikan seluruh worker. Job yang terputus dipulihkan oleh proses berikutnya yang menjalankan `recover`."""
+        self._stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        logger.info("Seluruh worker ingesti telah dihentikan.")
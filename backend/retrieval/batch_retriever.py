@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from typing import List
+
+from config import (
+    FINAL_ANSWER_PROMPT,
+    VECTOR_SEARCH_TOP_K,
+    HYBRID_CANDIDATES,
+    LEXICAL_SEARCH_ENABLED,
+    GRAPH_RETRIEVAL_ENABLED,
+    SPECULATIVE_RETRIEVAL_ENABLED,
+    BATCH_REPHRASE_CONCURRENCY,
+    BATCH_RETRIEVAL_CONCURRENCY,
+    BATCH_GENERATION_CONCURRENCY
+)
+from core.metrics import span, traced
+from core.llm_gateway import llm_gateway
+from .qa_chain import vector_search_many, lexical_search
+from .fusion import reciprocal_rank_fusion
+from .graph_retriever import graph_search
+from .conversational_logic import rephrase_question_with_history, needs_rephrasing
+from .hybrid_retriever import build_retrieval, NO_CONTEXT_ANSWER
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def _gather_or_empty(coroutines, label: str) -> list:
+    """Menjalankan coroutine secara konkuren; hasil yang gagal diganti list kosong."""
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    cleaned = []
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"{label} gagal: {result}", exc_info=result)
+            result = []
+        cleaned.append(result)
+    return cleaned
+
+
+async def _bounded(semaphore: asyncio.Semaphore, coroutine):
+    """Menjalankan coroutine setelah mendapat slot dari semaphore."""
+    async with semaphore:
+        return await coroutine
+
+
+async def retrieve_contexts(queries: List[str], filename_sets: List[List[str]], chroma_client, embedding_function, neo4j_driver=None,
+                            retrieval_concurrency: int = BATCH_RETRIEVAL_CONCURRENCY) -> List[dict]:
+    """
+    Versi batch dari `retrieve_context`.
+
+    Pencarian vektor seluruh kueri dijalankan bersama (`vector_search_many`), sedangkan
+    pencarian leksikal dan graph retrieval per kueri berjalan konkuren dengan paling banyak
+    `retrieval_concurrency` pencarian sekaligus. Hasil per kueri digabung dengan RRF seperti
+    pada jalur kueri tunggal.
+
+    Returns:
+        List[dict]: Hasil retrieval per kueri (`hits`, `graph_facts`, `context`, `error`).
+            `error` terisi hanya untuk kueri yang pencarian vektornya gagal.
+    """
+    if not queries:
+        return []
+
+    try:
+        vector_results = await vector_search_many(queries, filename_sets, chroma_client, embedding_function, k=HYBRID_CANDIDATES)
+    except Exception as e:
+        # Embedding kueri gagal: seluruh kueri terdampak.
+        logger.error(f"Pencarian vektor batch gagal: {e}", exc_info=True)
+        vector_results = [e] * len(queries)
+
+    retrieval_semaphore = asyncio.Semaphore(max(1, retrieval_concurrency))
+
+    lexical_results = [[] for _ in queries]
+    if LEXICAL_SEARCH_ENABLED:
+        lexical_results = await _gather_or_empty(
+            (_bounded(retrieval_semaphore, lexical_search(query, filenames, k=HYBRID_CANDIDATES)) for query, filenames in zip(queries, filename_sets)),
+            "Pencarian leksikal"
+        )
+
+    graph_results = [[] for _ in queries]
+    if GRAPH_RETRIEVAL_ENABLED and neo4j_driver is not None:
+        graph_results = await _gather_or_empty(
+            (_bounded(retrieval_semaphore, traced("graph_search", graph_search(query, filenames, neo4j_driver))) for query, filenames in zip(queries, filename_sets)),
+            "Graph retrieval"
+        )
+
+    retrievals = []
+    for vector_hits, lexical_hits, graph_facts in zip(vector_results, lexical_results, graph_results):
+        if isinstance(vector_hits, Exception):
+            retrievals.append({"hits": [], "graph_facts": [], "context": "", "error": f"Pencarian vektor gagal: {vector_hits}"})
+            continue
+        retrieval = build_retrieval(reciprocal_rank_fusion([vector_hits, lexical_hits], limit=VECTOR_SEARCH_TOP_K), graph_facts)
+        retrieval["error"] = None
+        retrievals.append(retrieval)
+    return retrievals
+
+
+async def get_answers_batch(items: List[dict], chat_model, chroma_client, embedding_function, neo4j_driver=None,
+                            rephrase_concurrency: int = BATCH_REPHRASE_CONCURRENCY,
+                            generation_concurrency: int = BATCH_GENERATION_CONCURRENCY) -> List[dict]:
+    """
+    Menjawab banyak pertanyaan sekaligus dengan berbagi kerja embedding dan retrieval.
+
+    1.  Formulasi ulang dijalankan konkuren (dibatasi semaphore); pertanyaan yang dinilai
+        sudah mandiri tidak dikirim ke LLM.
+    2.  Retrieval seluruh pertanyaan dilakukan dengan `retrieve_contexts`.
+    3.  Jawaban dibangkitkan konkuren dengan batas konkurensi tersendiri.
+
+    Kegagalan satu pertanyaan tidak menggagalkan pertanyaan lain.
+
+    Args:
+        items (List[dict]): Pertanyaan dengan kunci `query`, `filenames`, dan opsional
+            `chat_history` serta `conversation_id`.
+        chat_model: Instance model bahasa generatif.
+        chroma_client: Instance client ChromaDB.
+        embedding_function: Fungsi embedding yang digunakan.
+        neo4j_driver: Instance driver Neo4j untuk graph retrieval (opsional).
+
+    Returns:
+        List[dict]: Hasil per pertanyaan dengan urutan yang sama seperti `items`, masing-masing
+            berisi `query`, `rephrased_query`, `answer`, dan `error` (`None` jika berhasil).
+    """
+    results = [{"query": item["query"], "rephrased_query": None, "answer": None, "error": None} for item in items]
+
+    rephrase_semaphore = asyncio.Semaphore(max(1, rephrase_concurrency))
+
+    async def rephrase(item: dict):
+        chat_history = item.get("chat_history")
+        if not chat_history or (SPECULATIVE_RETRIEVAL_ENABLED and not needs_rephrasing(item["query"], chat_history)):
+            return item["query"]
+        async with rephrase_semaphore:
+            return await rephrase_question_with_history(item["query"], chat_history, chat_model, item.get("conversation_id"))
+
+    rephrased = await asyncio.gather(*(rephrase(item) for item in items), return_exceptions=True)
+    ready: List[int] = []
+    for index, query in enumerate(rephrased):
+        if isinstance(query, Exception):
+            results[index]["error"] = f"Formulasi ulang gagal: {query}"
+            continue
+        results[index]["rephrased_query"] = query
+        ready.append(index)
+
+    retrievals = await retrieve_contexts(
+        [results[i]["rephrased_query"] for i in ready],
+        [items[i]["filenames"] for i in ready],
+        chroma_client, embedding_function, neo4j_driver
+    )
+
+    generation_semaphore = asyncio.Semaphore(max(1, generation_concurrency))
+
+    async def generate(index: int, retrieval: dict):
+        if retrieval["error"]:
+            results[index]["error"] = retrieval["error"]
+            return
+        if not retrieval["context"]:
+            results[index]["answer"] = NO_CONTEXT_ANSWER
+            return
+        prompt = FINAL_ANSWER_PROMPT.format(context=retrieval["context"], rephrased_query=results[index]["rephrased_query"])
+        try:
+            async with generation_semaphore:
+                with span("generation"):
+                    response = await llm_gateway.ainvoke(chat_model, prompt, purpose="answer")
+            results[index]["answer"] = response.content
+        except Exception as e:
+            logger.error(f"Pembangkitan jawaban untuk pertanyaan #{index} gagal: {e}", exc_info=True)
+            results[index]["error"] = f"Pembangkitan jawaban gagal: {e}"
+
+    await asyncio.gather(*(generate(index, retrieval) for index, retrieval in zip(ready, retrievals)))
+    failed = sum(1 for result in results if result["error"])
+    logger.info(f"Kueri batch selesai: {len(items)} pertanyaan, {failed} gagal.")
+    return results
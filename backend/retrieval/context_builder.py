@@ -0,0 +1,200 @@
+import re
+from typing import List, Optional, Tuple
+
+from config import (
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_FACT_BUDGET_SHARE,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_MIN_OVERLAP_CHARS,
+    CHUNK_OVERLAP,
+    ENRICHMENT_MARKER
+)
+from core.tokens import estimate_tokens
+from .graph_retriever import format_graph_facts
+
+FACTS_HEADER = "[Fakta dari Knowledge Graph]:"
+
+
+def split_enrichment(document: str) -> Tuple[str, List[str]]:
+    """Memisahkan isi chunk dari baris-baris fakta graf di footer-nya."""
+    body, marker, footer = document.partition(ENRICHMENT_MARKER)
+    if not marker:
+        return document.strip(), []
+    return body.strip(), [line for line in footer.splitlines() if line.strip()]
+
+
+def _token_set(text: str) -> frozenset:
+    return frozenset(re.findall(r"\w+", text.casefold()))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap_length(first: str, second: str, min_overlap: int, max_overlap: int = CHUNK_OVERLAP) -> int:
+    """
+    Mengembalikan panjang terpanjang akhiran `first` yang sama persis dengan awalan `second`.
+
+    Kandidat diperiksa dari yang terpanjang (`max_overlap`, yaitu tumpang tindih yang dibuat
+    chunker) ke yang terpendek, karena teks yang berulang dapat cocok di beberapa panjang
+    dan hanya yang terpanjang yang benar-benar merupakan bagian bersama.
+
+    Returns:
+        int: Panjang tumpang tindih, atau 0 jika kurang dari `min_overlap`.
+    """
+    for length in range(min(len(first), len(second), max_overlap), min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def merge_overlapping(passages: List[dict], min_overlap: int = CONTEXT_MIN_OVERLAP_CHARS) -> List[dict]:
+    """
+    Menggabungkan potongan dari dokumen yang sama yang saling bersambung.
+
+    Chunk bertetangga berbagi hingga `CHUNK_OVERLAP` karakter; jika akhir satu potongan
+    sama persis dengan awal potongan lain, keduanya digabung menjadi satu teks tanpa
+    pengulangan. Posisi hasil gabungan mengikuti potongan yang lebih dulu muncul.
+
+    Args:
+        passages (List[dict]): Potongan dengan kunci `source` dan `body`.
+
+    Returns:
+        List[dict]: Potongan setelah digabung, dengan kunci tambahan `merged` (jumlah chunk).
+    """
+    merged = [{**passage, "merged": passage.get("merged", 1)} for passage in passages]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(len(merged)):
+                if i == j or merged[i]["source"] != merged[j]["source"]:
+                    continue
+                overlap = _overlap_length(merged[i]["body"], merged[j]["body"], min_overlap)
+                if not overlap:
+                    continue
+                keep, drop = (i, j) if i < j else (j, i)
+                merged[keep] = {
+                    **merged[keep],
+                    "body": merged[i]["body"] + merged[j]["body"][overlap:],
+                    "merged": merged[i]["merged"] + merged[j]["merged"]
+                }
+                del merged[drop]
+                changed = True
+                break
+            if changed:
+                break
+    return merged
+
+
+def mmr_order(passages: List[dict], lambda_mult: float = CONTEXT_MMR_LAMBDA) -> List[int]:
+    """
+    Mengurutkan potongan dengan Maximal Marginal Relevance.
+
+    Skor setiap langkah adalah `lambda * relevansi - (1 - lambda) * kemiripan maksimum`
+    dengan potongan yang sudah dipilih, di mana kemiripan diukur dengan Jaccard token.
+
+    Returns:
+        List[int]: Indeks potongan sesuai urutan pemilihan.
+    """
+    remaining = list(range(len(passages)))
+    selected: List[int] = []
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda i: lambda_mult * passages[i]["relevance"] - (1 - lambda_mult) * max(
+                (_jaccard(passages[i]["tokens"], passages[j]["tokens"]) for j in selected), default=0.0
+            )
+        )
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def _take_within_budget(lines: List[str], budget: int) -> List[str]:
+    taken = []
+    for line in lines:
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        taken.append(line)
+        budget -= cost
+    return taken
+
+
+def build_context(hits: List[dict], graph_facts: Optional[List[tuple]] = None, token_budget: int = CONTEXT_TOKEN_BUDGET) -> dict:
+    """
+    Menyusun konteks jawaban akhir dari hasil retrieval dalam anggaran token.
+
+    1.  Footer fakta graf dipisahkan dari setiap chunk; seluruh baris fakta (termasuk hasil
+        graph retrieval) dideduplikasi dan ditulis sekali di bagian akhir.
+    2.  Potongan diurutkan dengan MMR agar potongan yang hampir identik tidak menghabiskan anggaran.
+    3.  Potongan ditambahkan sesuai urutan MMR selama konteks (setelah potongan bersambung
+        digabung) masih muat dalam anggaran.
+
+    Args:
+        hits (List[dict]): Hasil pencarian terurut dari yang paling relevan, dengan kunci
+            `id`, `document`, `metadata`, dan opsional `rrf_score`.
+        graph_facts (Optional[List[tuple]]): Triplet `(head, relation, tail)` dari graph retrieval.
+        token_budget (int): Batas estimasi token untuk seluruh konteks.
+
+    Returns:
+        dict: `{"context": str, "report": dict}` dengan ukuran konteks sebelum dan sesudah penyusunan.
+    """
+    passages = []
+    fact_lines = []
+    # Skor RRF hanya dipakai jika tersedia untuk semua hit; selain itu relevansi diturunkan dari peringkat.
+    use_rrf = all("rrf_score" in hit for hit in hits)
+    for rank, hit in enumerate(hits):
+        body, facts = split_enrichment(hit["document"])
+        fact_lines.extend(facts)
+        passages.append({
+            "id": hit["id"],
+            "source": (hit.get("metadata") or {}).get("source_document"),
+            "body": body,
+            "relevance": hit["rrf_score"] if use_rrf else 1.0 / (rank + 1),
+            "tokens": _token_set(body)
+        })
+    if graph_facts:
+        fact_lines.extend(format_graph_facts(graph_facts).splitlines())
+    unique_facts = list(dict.fromkeys(fact_lines))
+
+    # Normalisasi relevansi ke [0, 1] agar sebanding dengan kemiripan Jaccard.
+    top_relevance = max((passage["relevance"] for passage in passages), default=0.0) or 1.0
+    for passage in passages:
+        passage["relevance"] /= top_relevance
+
+    fact_budget = int(token_budget * CONTEXT_FACT_BUDGET_SHARE)
+    facts = _take_within_budget(unique_facts, fact_budget)
+    facts_text = f"{FACTS_HEADER}\n" + "\n".join(facts) if facts else ""
+    passage_budget = token_budget - estimate_tokens(facts_text)
+
+    selected: List[dict] = []
+    merged: List[dict] = []
+    for index in mmr_order(passages):
+        candidate = merge_overlapping(selected + [passages[index]])
+        if estimate_tokens("\n\n".join(passage["body"] for passage in candidate)) > passage_budget:
+            continue
+        selected.append(passages[index])
+        merged = candidate
+
+    context = "\n\n".join([passage["body"] for passage in merged] + ([facts_text] if facts_text else []))
+    original = "\n\n".join(hit["document"] for hit in hits)
+    if graph_facts:
+        original += f"\n\n{FACTS_HEADER}\n{format_graph_facts(graph_facts)}"
+
+    return {
+        "context": context.strip(),
+        "report": {
+            "original_tokens": estimate_tokens(original),
+            "context_tokens": estimate_tokens(context),
+            "passages": len(selected),
+            "dropped_passages": len(passages) - len(selected),
+            "merged_passages": len(selected) - len(merged),
+            "facts": len(facts),
+            "duplicate_facts": len(fact_lines) - len(unique_facts),
+            "dropped_facts": len(unique_facts) - len(facts)
+        }
+    }
@@ -1,9 +1,85 @@
 import logging
-from config import REPHRASE_QUESTION_PROMPT
+import re
+from typing import Optional
+from config import (
+    REPHRASE_QUESTION_PROMPT,
+    REPHRASE_MIN_CONTENT_TOKENS,
+    REPHRASE_SKIP_OVERLAP,
+    REPHRASE_EQUIVALENCE_THRESHOLD,
+    HISTORY_VERBATIM_MESSAGES
+)
+from core.metrics import span
+from core.llm_gateway import llm_gateway
+from .graph_retriever import query_tokens
+from .history_compactor import history_compactor, format_message
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Kata ganti dan kata rujukan yang menandakan pertanyaan bergantung pada riwayat percakapan.
+# Diperiksa sebelum filter stopword, sehingga kata penunjuk umum (itu, ini) tetap terdeteksi.
+_ANAPHORA = {
+    "dia", "ia", "beliau", "mereka", "tersebut", "sana", "situ", "begitu", "demikian",
+    "itu", "ini", "tadi", "sebelumnya", "lain",
+    "he", "she", "him", "her", "his", "hers", "they", "them", "their", "it", "its",
+    "this", "that", "these", "those", "there",
+}
+# Kata berakhiran "-nya" yang bukan kata ganti.
+_NYA_EXCEPTIONS = {"hanya", "punya", "tanya", "bertanya", "menanya", "nya"}
+
+def _has_anaphora(query: str) -> bool:
+    """Memeriksa apakah pertanyaan mengandung kata ganti atau rujukan ke giliran sebelumnya."""
+    for token in re.findall(r"\w+", query.casefold()):
+        if token in _ANAPHORA:
+            return True
+        if token.endswith("nya") and token not in _NYA_EXCEPTIONS and len(token) > 4:
+            return True
+    return False
+
+def needs_rephrasing(query: str, chat_history: list) -> bool:
+    """
+    Heuristik murah untuk memutuskan apakah pertanyaan perlu diformulasi ulang oleh LLM.
+
+    Pertanyaan dianggap sudah mandiri jika tidak mengandung kata rujukan (dia, tersebut,
+    -nya, ...) dan memiliki cukup banyak kata bermakna, atau sebagian besar kata bermaknanya
+    sudah muncul di riwayat percakapan (pengguna mengulang istilah secara eksplisit).
+
+    Args:
+        query (str): Pertanyaan dari pengguna.
+        chat_history (list): Riwayat percakapan sebelumnya.
+
+    Returns:
+        bool: `True` jika formulasi ulang diperlukan.
+    """
+    if not chat_history:
+        return False
+    if _has_anaphora(query):
+        return True
+
+    tokens = query_tokens(query)
+    if len(tokens) >= REPHRASE_MIN_CONTENT_TOKENS:
+        return False
+    if not tokens:
+        return True
+    # Hanya giliran terakhir yang diperiksa agar biaya heuristik tidak tumbuh seiring panjang sesi.
+    history_tokens = set(query_tokens(_format_chat_history(chat_history[-HISTORY_VERBATIM_MESSAGES:])))
+    overlap = sum(1 for token in tokens if token in history_tokens) / len(tokens)
+    return overlap < REPHRASE_SKIP_OVERLAP
+
+def is_equivalent_query(original: str, rephrased: str, threshold: float = REPHRASE_EQUIVALENCE_THRESHOLD) -> bool:
+    """
+    Memeriksa apakah hasil formulasi ulang secara praktis sama dengan pertanyaan asli.
+
+    Kemiripan diukur dengan indeks Jaccard atas kata-kata bermakna, sehingga perubahan
+    tanda baca, huruf besar/kecil, atau kata tanya tidak dianggap sebagai perbedaan.
+    """
+    original_tokens = set(query_tokens(original))
+    rephrased_tokens = set(query_tokens(rephrased))
+    if not original_tokens and not rephrased_tokens:
+        return original.strip().casefold() == rephrased.strip().casefold()
+    union = original_tokens | rephrased_tokens
+    return len(original_tokens & rephrased_tokens) / len(union) >= threshold
+
 def _format_chat_history(chat_history: list[dict]) -> str:
     """
     Memformat riwayat percakapan dari struktur list-of-dict menjadi string tunggal.
@@ -20,14 +96,9 @@ def _format_chat_history(chat_history: list[dict]) -> str:
     if not chat_history:
         return ""
     
-    formatted_history = []
-    for message in chat_history:
-        role = "Human" if message["role"] == "user" else "AI"
-        formatted_history.append(f"{role}: {message['content']}")
-    
-    return "\n".join(formatted_history)
+    return "\n".join(format_message(message) for message in chat_history)
 
-async def rephrase_question_with_history(query: str, chat_history: list, chat_model) -> str:
+async def rephrase_question_with_history(query: str, chat_history: list, chat_model, conversation_id: Optional[str] = None) -> str:
     """
     Memformulasikan ulang pertanyaan pengguna menjadi pertanyaan mandiri (standalone).
 
@@ -40,6 +111,8 @@ async def rephrase_question_with_history(query: str, chat_history: list, chat_mo
         query (str): Pertanyaan lanjutan dari pengguna.
         chat_history (list): Riwayat percakapan sebelumnya untuk memberikan konteks.
         chat_model: Instance model bahasa yang telah diinisialisasi.
+        conversation_id (Optional[str]): ID percakapan untuk ringkasan riwayat di server.
+            Riwayat selalu dipadatkan ke dalam anggaran token (lihat `history_compactor`).
 
     Returns:
         str: Pertanyaan yang telah diformulasikan ulang. Mengembalikan pertanyaan asli
@@ -49,12 +122,18 @@ async def rephrase_question_with_history(query: str, chat_history: list, chat_mo
         logger.info("Tidak ada riwayat percakapan, mengembalikan kueri asli.")
         return query
 
-    formatted_history = _format_chat_history(chat_history)
+    formatted_history, report = history_compactor.compact(chat_history, conversation_id, chat_model)
+    if report["saved_tokens"]:
+        logger.info(
+            f"Riwayat percakapan dipadatkan dari ~{report['original_tokens']} menjadi ~{report['compacted_tokens']} token "
+            f"({report['summarized_messages']} pesan diringkas, {report['dropped_messages']} pesan dibuang)."
+        )
     prompt = REPHRASE_QUESTION_PROMPT.format(chat_history=formatted_history, query=query)
 
     try:
         logger.info("Memulai formulasi ulang pertanyaan dengan konteks riwayat...")
-        response = await chat_model.ainvoke(prompt)
+        with span("rephrase"):
+            response = await llm_gateway.ainvoke(chat_model, prompt, purpose="rephrase")
         
         standalone_question = response.content.strip()
         
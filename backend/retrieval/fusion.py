@@ -0,0 +1,34 @@
+from typing import List, Optional
+
+from config import RRF_K
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], k: int = RRF_K, limit: Optional[int] = None) -> List[dict]:
+    """
+    Menggabungkan beberapa daftar hasil peringkat dengan Reciprocal Rank Fusion (RRF).
+
+    Setiap hasil mendapat skor `sum(1 / (k + rank))` dari seluruh daftar tempat ia muncul,
+    sehingga hasil yang konsisten berperingkat tinggi di beberapa retriever naik ke atas
+    tanpa perlu menyelaraskan skala skor BM25 dan jarak cosine.
+
+    Args:
+        result_lists (List[List[dict]]): Daftar hasil dari tiap retriever, masing-masing
+            terurut dari yang paling relevan dan memiliki kunci `id`.
+        k (int): Konstanta peredam RRF.
+        limit (Optional[int]): Jumlah hasil maksimum yang dikembalikan.
+
+    Returns:
+        List[dict]: Hasil gabungan terurut berdasarkan skor RRF, dengan tambahan kunci
+            `rrf_score`. Jika sebuah hasil muncul di beberapa daftar, atribut dari
+            kemunculan pertamanya yang dipertahankan.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            entry = fused.get(hit["id"])
+            if entry is None:
+                entry = fused[hit["id"]] = {**hit, "rrf_score": 0.0}
+            entry["rrf_score"] += 1.0 / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda hit: hit["rrf_score"], reverse=True)
+    return ranked[:limit] if limit is not None else ranked
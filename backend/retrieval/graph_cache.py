@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    NEO4J_FETCH_DOCUMENT_TRIPLETS_QUERY,
+    GRAPH_CACHE_MAX_DOCUMENTS,
+    GRAPH_CACHE_TTL_SECONDS,
+    MANIFEST_DIR
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DocumentGraph:
+    """
+    Representasi adjacency ringkas dari knowledge graph satu dokumen.
+
+    Nama entitas dan tipe relasi di-intern menjadi ID integer. Edge disimpan dalam array
+    `head`, `relation`, dan `tail`, sedangkan adjacency (tak berarah) disimpan dalam format
+    CSR (`offsets` + `incident_edges`), sehingga kueri lingkungan dan jalur cukup berupa
+    traversal array di memori tanpa round trip ke Neo4j.
+
+    Args:
+        triplets (Iterable[Tuple[str, str, str]]): Triplet `(head, relation, tail)`.
+    """
+
+    def __init__(self, triplets: Iterable[Tuple[str, str, str]]):
+        self._entity_ids: Dict[str, int] = {}
+        self.entities: List[str] = []
+        relation_ids: Dict[str, int] = {}
+        self.relations: List[str] = []
+        self.heads = array("I")
+        self.relation_of = array("I")
+        self.tails = array("I")
+
+        seen = set()
+        for head, relation, tail in triplets:
+            edge = (self._intern_entity(str(head)), self._intern(relation_ids, self.relations, str(relation)), self._intern_entity(str(tail)))
+            if edge in seen:
+                continue
+            seen.add(edge)
+            self.heads.append(edge[0])
+            self.relation_of.append(edge[1])
+            self.tails.append(edge[2])
+
+        self._build_adjacency()
+        self._build_token_index()
+
+    @staticmethod
+    def _intern(ids: Dict[str, int], values: List[str], value: str) -> int:
+        interned = ids.get(value)
+        if interned is None:
+            interned = ids[value] = len(values)
+            values.append(value)
+        return interned
+
+    def _intern_entity(self, name: str) -> int:
+        return self._intern(self._entity_ids, self.entities, name)
+
+    def _build_adjacency(self):
+        degree = [0] * (len(self.entities) + 1)
+        for head, tail in zip(self.heads, self.tails):
+            degree[head + 1] += 1
+            degree[tail + 1] += 1
+        for i in range(1, len(degree)):
+            degree[i] += degree[i - 1]
+        self.offsets = array("I", degree)
+
+        cursor = list(degree[:-1])
+        self.incident_edges = array("I", [0] * degree[-1])
+        for edge, (head, tail) in enumerate(zip(self.heads, self.tails)):
+            self.incident_edges[cursor[head]] = edge
+            cursor[head] += 1
+            self.incident_edges[cursor[tail]] = edge
+            cursor[tail] += 1
+
+    def _build_token_index(self):
+        from .graph_retriever import query_tokens
+
+        self._entity_tokens = []
+        self._token_index: Dict[str, List[int]] = {}
+        for entity_id, name in enumerate(self.entities):
+            tokens = set(query_tokens(name))
+            self._entity_tokens.append(len(tokens))
+            for token in tokens:
+                self._token_index.setdefault(token, []).append(entity_id)
+
+    def __len__(self) -> int:
+        return len(self.heads)
+
+    def entity_id(self, name: str) -> Optional[int]:
+        """Mengembalikan ID entitas untuk nama tertentu, atau `None` jika tidak ada."""
+        return self._entity_ids.get(name)
+
+    def edge(self, edge: int) -> Tuple[str, str, str]:
+        """Mengembalikan edge sebagai triplet `(head, relation, tail)`."""
+        return self.entities[self.heads[edge]], self.relations[self.relation_of[edge]], self.entities[self.tails[edge]]
+
+    def _incident(self, entity_id: int):
+        return self.incident_edges[self.offsets[entity_id]:self.offsets[entity_id + 1]]
+
+    def _other_end(self, edge: int, entity_id: int) -> int:
+        return self.tails[edge] if self.heads[edge] == entity_id else self.heads[edge]
+
+    def find_entities(self, tokens: List[str], limit: int) -> List[int]:
+        """
+        Mencari entitas yang namanya memuat token-token kueri.
+
+        Entitas diberi skor berdasarkan proporsi token namanya yang muncul di kueri,
+        lalu jumlah token yang cocok.
+
+        Args:
+            tokens (List[str]): Token kueri (lihat `graph_retriever.query_tokens`).
+            limit (int): Jumlah entitas maksimum.
+
+        Returns:
+            List[int]: ID entitas terurut dari yang paling cocok.
+        """
+        matches: Dict[int, int] = {}
+        for token in set(tokens):
+            for entity_id in self._token_index.get(token, ()):
+                matches[entity_id] = matches.get(entity_id, 0) + 1
+        ranked = sorted(
+            matches.items(),
+            key=lambda item: (item[1] / max(1, self._entity_tokens[item[0]]), item[1]),
+            reverse=True
+        )
+        return [entity_id for entity_id, _ in ranked[:limit]]
+
+    def neighborhood(self, entity_ids: List[int], hops: int, max_facts: int) -> List[Tuple[str, str, str]]:
+        """
+        Mengambil edge dalam jarak `hops` dari entitas awal dengan BFS.
+
+        Returns:
+            List[Tuple[str, str, str]]: Triplet unik, terurut dari yang paling dekat.
+        """
+        visited = set(entity_ids)
+        frontier = list(entity_ids)
+        edges = []
+        seen_edges = set()
+        for _ in range(hops):
+            next_frontier = []
+            for entity_id in frontier:
+                for edge in self._incident(entity_id):
+                    if edge not in seen_edges:
+                        seen_edges.add(edge)
+                        edges.append(edge)
+                        if len(edges) >= max_facts:
+                            return [self.edge(e) for e in edges]
+                    other = self._other_end(edge, entity_id)
+                    if other not in visited:
+                        visited.add(other)
+                        next_frontier.append(other)
+            frontier = next_frontier
+        return [self.edge(e) for e in edges]
+
+    def shortest_path(self, source: int, target: int, max_hops: int = 4) -> List[Tuple[str, str, str]]:
+        """
+        Mencari jalur terpendek (tak berarah) antara dua entitas.
+
+        Returns:
+            List[Tuple[str, str, str]]: Edge di sepanjang jalur, atau list kosong jika tidak
+                ada jalur dalam `max_hops` langkah.
+        """
+        if source == target:
+            return []
+        parents = {source: None}
+        queue = deque([(source, 0)])
+        while queue:
+            entity_id, depth = queue.popleft()
+            if depth >= max_hops:
+                continue
+            for edge in self._incident(entity_id):
+                other = self._other_end(edge, entity_id)
+                if other in parents:
+                    continue
+                parents[other] = (entity_id, edge)
+                if other == target:
+                    path = []
+                    node = other
+                    while parents[node] is not None:
+                        node, path_edge = parents[node]
+                        path.append(self.edge(path_edge))
+                    return list(reversed(path))
+                queue.append((other, depth + 1))
+        return []
+
+
+def document_version(filename: str) -> Optional[int]:
+    """
+    Mengembalikan versi graf dokumen: waktu modifikasi manifest-nya (ns), atau `None` jika
+    dokumen belum memiliki manifest. Manifest ditulis ulang setiap kali dokumen diindeks,
+    oleh proses API mana pun yang menjalankan tahap indeksasi.
+    """
+    try:
+        return (Path(MANIFEST_DIR) / f"{filename}.json").stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class GraphAdjacencyCache:
+    """
+    Cache in-process berisi `DocumentGraph` per dokumen dengan eviksi LRU per dokumen.
+
+    Graf dimuat secara lazy dari Neo4j saat pertama dibutuhkan (pemuatan bersamaan untuk
+    dokumen yang sama digabung menjadi satu kueri), atau diisi langsung oleh pipeline
+    ingesti. Ingesti ulang di proses ini mengganti isi cache dokumen tersebut; ingesti ulang
+    di proses lain terdeteksi dari versi manifest dokumen (`document_version`) yang berbeda
+    dari versi saat graf disimpan. Graf juga dimuat ulang setelah `ttl_seconds`.
+
+    Args:
+        max_documents (int): Jumlah dokumen maksimum yang grafnya disimpan di memori.
+        ttl_seconds (float): Umur maksimum graf di cache; 0 menonaktifkan TTL.
+    """
+
+    def __init__(self, max_documents: int = GRAPH_CACHE_MAX_DOCUMENTS, ttl_seconds: float = GRAPH_CACHE_TTL_SECONDS):
+        self.max_documents = max(1, max_documents)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # filename -> (graf, versi manifest, waktu disimpan)
+        self._graphs: "OrderedDict[str, Tuple[DocumentGraph, Optional[int], float]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str, version: Optional[int] = None) -> Optional[DocumentGraph]:
+        """
+        Mengambil graf dokumen dari cache tanpa memuatnya dari Neo4j.
+
+        Graf yang melewati TTL, atau yang versinya berbeda dari `version` (jika diberikan),
+        dianggap tidak ada.
+        """
+        with self._lock:
+            entry = self._graphs.get(filename)
+            if entry is None:
+                return None
+            graph, cached_version, stored_at = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                return None
+            if version is not None and version != cached_version:
+                return None
+            self._graphs.move_to_end(filename)
+            return graph
+
+    def populate(self, filename: str, triplets: Iterable[Tuple[str, str, str]], version: Optional[int] = None) -> DocumentGraph:
+        """
+        Membangun dan menyimpan graf dokumen dari triplet `(head, relation, tail)`.
+
+        Args:
+            version (Optional[int]): Versi manifest yang sesuai dengan triplet ini; jika
+                tidak diberikan, versi manifest saat ini yang dipakai.
+        """
+        graph = DocumentGraph(triplets)
+        if version is None:
+            version = document_version(filename)
+        with self._lock:
+            self._graphs[filename] = (graph, version, time.monotonic())
+            self._graphs.move_to_end(filename)
+            while len(self._graphs) > self.max_documents:
+                evicted, _ = self._graphs.popitem(last=False)
+                logger.debug(f"Graf dokumen '{evicted}' dikeluarkan dari cache adjacency.")
+        return graph
+
+    def invalidate(self, filename: str):
+        """Membuang graf dokumen dari cache (misalnya saat dokumen diindeks ulang)."""
+        with self._lock:
+            self._graphs.pop(filename, None)
+
+    async def load(self, filename: str, neo4j_driver) -> DocumentGraph:
+        """
+        Mengambil graf dokumen dari cache, atau memuatnya dari Neo4j jika belum ada.
+
+        Args:
+            filename (str): Nama file dokumen.
+            neo4j_driver: Instance driver Neo4j yang aktif.
+
+        Returns:
+            DocumentGraph: Graf dokumen (bisa kosong jika dokumen tidak memiliki triplet).
+        """
+        version = await asyncio.to_thread(document_version, filename)
+        graph = self.get(filename, version)
+        if graph is not None:
+            self.hits += 1
+            return graph
+        self.misses += 1
+
+        pending = self._loading.get(filename)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[filename] = future
+        try:
+            async with neo4j_driver.session() as session:
+                result = await session.run(NEO4J_FETCH_DOCUMENT_TRIPLETS_QUERY, filename=filename)
+                records = await result.data()
+            graph = self.populate(filename, ((r["head"], r["relation"], r["tail"]) for r in records), version)
+            logger.info(f"Graf dokumen '{filename}' dimuat dari Neo4j: {len(graph)} edge, {len(graph.entities)} entitas.")
+            future.set_result(graph)
+            return graph
+        except Exception as e:
+            future.set_exception(e)
+            # Menandai exception sudah diambil agar tidak muncul peringatan jika tidak ada penunggu lain.
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(filename, None)
+
+    def stats(self) -> dict:
+        """Mengembalikan statistik hit/miss dan jumlah dokumen di cache."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "documents": len(self._graphs)}
+
+
+graph_cache = GraphAdjacencyCache()
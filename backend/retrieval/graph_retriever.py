@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import re
+from typing import List
+
+from config import (
+    NEO4J_FULLTEXT_INDEX_NAME,
+    NEO4J_GRAPH_NEIGHBORHOOD_QUERY,
+    GRAPH_RETRIEVAL_HOPS,
+    GRAPH_RETRIEVAL_MAX_ENTITIES,
+    GRAPH_RETRIEVAL_MAX_FACTS,
+    GRAPH_CACHE_ENABLED
+)
+from .graph_cache import graph_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Template Cypher per jumlah hop dibentuk sekali saat modul dimuat dan dipakai ulang.
+_NEIGHBORHOOD_QUERIES = {hops: NEO4J_GRAPH_NEIGHBORHOOD_QUERY.format(hops=hops) for hops in (1, 2)}
+
+# Kata tanya dan kata fungsi yang tidak berguna sebagai kandidat nama entitas.
+_STOPWORDS = {
+    "apa", "siapa", "dimana", "mana", "kapan", "bagaimana", "mengapa", "kenapa", "berapa",
+    "yang", "dan", "atau", "dari", "pada", "untuk", "dengan", "dalam", "oleh", "ini", "itu",
+    "adalah", "tersebut", "ada", "apakah", "sebagai", "the", "and", "who", "what", "where",
+    "when", "which", "how", "does", "did", "was", "were", "are", "for", "with",
+}
+
+
+def query_tokens(text: str) -> List[str]:
+    """
+    Mengambil token kandidat nama entitas dari teks.
+
+    Hanya token alfanumerik yang dipakai; kata tanya/fungsi dan token yang terlalu pendek dibuang.
+    """
+    return [
+        token for token in dict.fromkeys(re.findall(r"\w+", text.casefold()))
+        if len(token) >= 3 and token not in _STOPWORDS
+    ]
+
+
+def build_fulltext_search(query: str) -> str:
+    """
+    Mengubah pertanyaan menjadi kueri Lucene untuk full-text index nama entitas.
+
+    Karena hanya token alfanumerik yang dipakai, tidak ada karakter khusus Lucene yang
+    perlu di-escape. Token-token digabung dengan OR.
+    """
+    return " OR ".join(query_tokens(query))
+
+
+def format_graph_facts(triplets: List[tuple]) -> str:
+    """Memformat triplet (head, relation, tail) menjadi baris fakta seperti pada pengayaan chunk."""
+    return "".join(
+        f"- Fakta Terkait: {head} -> {str(relation).replace('_', ' ').title()} -> {tail}\n"
+        for head, relation, tail in triplets
+    )
+
+
+async def _cached_graph_search(query: str, filenames: List[str], neo4j_driver, hops: int) -> List[tuple]:
+    """
+    Menjalankan graph retrieval pada cache adjacency per dokumen.
+
+    Graf dokumen yang belum ada di cache dimuat dari Neo4j secara bersamaan. Entitas dicari
+    melalui indeks token lokal, lalu lingkungan `hops`-nya diambil dengan BFS di memori.
+    """
+    graphs = await asyncio.gather(*(graph_cache.load(filename, neo4j_driver) for filename in filenames))
+    tokens = query_tokens(query)
+
+    triplets = {}
+    for graph in graphs:
+        entity_ids = graph.find_entities(tokens, GRAPH_RETRIEVAL_MAX_ENTITIES)
+        if not entity_ids:
+            continue
+        for triplet in graph.neighborhood(entity_ids, max(hops, 1), GRAPH_RETRIEVAL_MAX_FACTS):
+            triplets.setdefault(triplet, None)
+    return list(triplets)[:GRAPH_RETRIEVAL_MAX_FACTS]
+
+
+async def graph_search(query: str, filenames: List[str], neo4j_driver, hops: int = GRAPH_RETRIEVAL_HOPS) -> List[tuple]:
+    """
+    Mengambil fakta dari knowledge graph yang relevan dengan pertanyaan.
+
+    Entitas yang disebut dalam pertanyaan dicari melalui full-text index Neo4j (tanpa
+    panggilan LLM), dibatasi pada dokumen yang dipilih, lalu lingkungan 1-2 hop-nya
+    diambil dalam satu kueri berparameter. Dengan begitu jawaban multi-hop dapat
+    didukung tanpa menambah satu langkah LLM serial ke latensi. Jika `GRAPH_CACHE_ENABLED`
+    aktif, langkah yang sama dijalankan pada cache adjacency di memori (lihat `graph_cache`).
+
+    Args:
+        query (str): Pertanyaan yang sudah diformulasi ulang.
+        filenames (List[str]): Daftar file yang menjadi target pencarian.
+        neo4j_driver: Instance driver Neo4j yang aktif.
+        hops (int): Kedalaman lingkungan yang diambil (1 atau 2).
+
+    Returns:
+        List[tuple]: Daftar triplet `(head, relation, tail)` yang unik.
+    """
+    search = build_fulltext_search(query)
+    if not search or not filenames or neo4j_driver is None:
+        return []
+
+    if GRAPH_CACHE_ENABLED:
+        triplets = await _cached_graph_search(query, filenames, neo4j_driver, hops)
+        logger.info(f"Graph retrieval (cache adjacency) menemukan {len(triplets)} fakta untuk kueri '{query}'.")
+        return triplets
+
+    cypher = _NEIGHBORHOOD_QUERIES[min(max(hops, 1), 2)]
+    async with neo4j_driver.session() as session:
+        result = await session.run(
+            cypher,
+            index_name=NEO4J_FULLTEXT_INDEX_NAME,
+            search=search,
+            filenames=filenames,
+            max_entities=GRAPH_RETRIEVAL_MAX_ENTITIES,
+            max_facts=GRAPH_RETRIEVAL_MAX_FACTS
+        )
+        records = await result.data()
+
+    triplets = list(dict.fromkeys((record["head"], record["relation"], record["tail"]) for record in records))
+    logger.info(f"Graph retrieval menemukan {len(triplets)} fakta untuk kueri '{query}'.")
+    return triplets
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    HISTORY_SUMMARY_PROMPT,
+    HISTORY_VERBATIM_MESSAGES,
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_SUMMARY_MAX_CONVERSATIONS,
+    HISTORY_SUMMARY_TTL_SECONDS
+)
+from core.cache import TTLCache
+from core.tokens import estimate_tokens
+from core.metrics import span
+from core.llm_gateway import llm_gateway
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def format_message(message: Dict[str, str]) -> str:
+    """Memformat satu pesan riwayat menjadi baris `Human: ...` atau `AI: ...`."""
+    role = "Human" if message["role"] == "user" else "AI"
+    return f"{role}: {message['content']}"
+
+
+def _fingerprint(message: Dict[str, str]) -> str:
+    return hashlib.sha1(f"{message.get('role')}\x00{message.get('content')}".encode("utf-8")).hexdigest()[:16]
+
+
+class HistoryCompactor:
+    """
+    Memadatkan riwayat percakapan untuk prompt formulasi ulang.
+
+    Hanya `verbatim_messages` pesan terakhir yang disertakan apa adanya. Pesan yang lebih lama
+    dilipat ke dalam ringkasan berjalan yang disimpan per `conversation_id`. Ringkasan
+    diperbarui secara inkremental di background (LLM hanya menerima ringkasan lama dan pesan
+    yang belum diringkas), sehingga permintaan yang sedang berjalan tidak pernah menunggu
+    peringkasan. Sampai ringkasan menyusul, pesan yang belum diringkas tetap disertakan
+    selama anggaran token masih cukup.
+
+    Args:
+        verbatim_messages (int): Jumlah pesan terakhir yang selalu disertakan apa adanya.
+        token_budget (int): Batas estimasi token untuk ringkasan + pesan verbatim.
+        max_conversations (int): Jumlah ringkasan percakapan maksimum di memori.
+        ttl_seconds (float): Masa berlaku ringkasan sejak terakhir diperbarui.
+    """
+
+    def __init__(self, verbatim_messages: int = HISTORY_VERBATIM_MESSAGES, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 max_conversations: int = HISTORY_SUMMARY_MAX_CONVERSATIONS, ttl_seconds: float = HISTORY_SUMMARY_TTL_SECONDS):
+        self.verbatim_messages = max(1, verbatim_messages)
+        self.token_budget = max(1, token_budget)
+        self._summaries = TTLCache(maxsize=max_conversations, ttl_seconds=ttl_seconds)
+        self._updates: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.original_tokens = 0
+        self.compacted_tokens = 0
+        self.summaries_generated = 0
+        self.summary_failures = 0
+
+    def _summary_state(self, conversation_id: str, older: List[Dict[str, str]]) -> dict:
+        """Mengambil ringkasan yang masih konsisten dengan riwayat yang dikirim klien."""
+        state = self._summaries.get(conversation_id)
+        if state and 0 < state["count"] <= len(older) and _fingerprint(older[state["count"] - 1]) == state["tail"]:
+            return state
+        # Riwayat di klien berubah (misalnya percakapan direset) atau belum pernah diringkas.
+        return {"summary": "", "count": 0, "tail": ""}
+
+    def _fit_to_budget(self, summary: str, messages: List[Dict[str, str]]) -> Tuple[List[str], int]:
+        """Menyusun baris riwayat dari yang terbaru ke terlama hingga anggaran token habis."""
+        budget = self.token_budget
+        summary_line = f"Summary of earlier conversation: {summary}" if summary else ""
+        if estimate_tokens(summary_line) > budget // 2:
+            summary_line = summary_line[:(budget // 2) * 4]
+        remaining = budget - estimate_tokens(summary_line)
+
+        lines = []
+        for message in reversed(messages):
+            line = format_message(message)
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                if not lines and remaining > 0:
+                    # Pesan terbaru selalu disertakan, dipotong bila perlu.
+                    lines.append(line[:remaining * 4])
+                break
+            lines.append(line)
+            remaining -= cost
+        lines.reverse()
+        dropped = len(messages) - len(lines)
+        return ([summary_line] if summary_line else []) + lines, dropped
+
+    def compact(self, chat_history: Optional[List[Dict[str, str]]], conversation_id: Optional[str] = None, chat_model=None) -> Tuple[str, dict]:
+        """
+        Menghasilkan riwayat ringkas untuk prompt formulasi ulang.
+
+        Args:
+            chat_history (Optional[List[Dict[str, str]]]): Riwayat percakapan lengkap dari klien.
+            conversation_id (Optional[str]): ID percakapan. Tanpa ID, pesan lama yang tidak
+                muat dalam anggaran token dibuang alih-alih diringkas.
+            chat_model: Model yang dipakai untuk memperbarui ringkasan di background.
+
+        Returns:
+            Tuple[str, dict]: Riwayat terformat dan laporan ukuran (`original_tokens`,
+                `compacted_tokens`, `saved_tokens`, `summarized_messages`, `dropped_messages`).
+        """
+        history = chat_history or []
+        older, recent = history[:-self.verbatim_messages], history[-self.verbatim_messages:]
+
+        state = {"summary": "", "count": 0, "tail": ""}
+        if conversation_id:
+            state = self._summary_state(conversation_id, older)
+            if len(older) > state["count"] and chat_model is not None:
+                self._schedule_update(conversation_id, state, older, chat_model)
+
+        lines, dropped = self._fit_to_budget(state["summary"], older[state["count"]:] + recent)
+        formatted = "\n".join(lines)
+
+        original_tokens = sum(estimate_tokens(format_message(message)) + 1 for message in history)
+        compacted_tokens = estimate_tokens(formatted)
+        with self._lock:
+            self.requests += 1
+            self.original_tokens += original_tokens
+            self.compacted_tokens += compacted_tokens
+
+        return formatted, {
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "saved_tokens": max(0, original_tokens - compacted_tokens),
+            "summarized_messages": state["count"],
+            "dropped_messages": dropped
+        }
+
+    def _schedule_update(self, conversation_id: str, state: dict, older: List[Dict[str, str]], chat_model):
+        task = self._updates.get(conversation_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.get_running_loop().create_task(self._update_summary(conversation_id, state, list(older), chat_model))
+        self._updates[conversation_id] = task
+        task.add_done_callback(lambda _: self._updates.pop(conversation_id, None))
+
+    async def _update_summary(self, conversation_id: str, state: dict, older: List[Dict[str, str]], chat_model):
+        """Melipat pesan yang belum diringkas ke dalam ringkasan berjalan."""
+        new_lines = "\n".join(format_message(message) for message in older[state["count"]:])
+        prompt = HISTORY_SUMMARY_PROMPT.format(
+            summary=state["summary"] or "(none)",
+            new_lines=new_lines,
+            max_words=max(50, int(self.token_budget * 0.4))
+        )
+        try:
+            with span("history_summary"):
+                response = await llm_gateway.ainvoke(chat_model, prompt, purpose="summary")
+            summary = response.content.strip()
+        except Exception as e:
+            self.summary_failures += 1
+            logger.error(f"Gagal memperbarui ringkasan percakapan '{conversation_id}': {e}", exc_info=True)
+            return
+
+        self._summaries.set(conversation_id, {"summary": summary, "count": len(older), "tail": _fingerprint(older[-1])})
+        self.summaries_generated += 1
+        logger.info(f"Ringkasan percakapan '{conversation_id}' diperbarui hingga {len(older)} pesan.")
+
+    def stats(self) -> dict:
+        """Mengembalikan statistik ukuran prompt riwayat dan jumlah ringkasan."""
+        with self._lock:
+            saved = self.original_tokens - self.compacted_tokens
+            return {
+                "requests": self.requests,
+                "original_tokens": self.original_tokens,
+                "compacted_tokens": self.compacted_tokens,
+                "saved_tokens": max(0, saved),
+                "saved_ratio": saved / self.original_tokens if self.original_tokens else 0.0,
+                "summaries_generated": self.summaries_generated,
+                "summary_failures": self.summary_failures,
+                "conversations": len(self._summaries)
+            }
+
+
+history_compactor = HistoryCompactor()
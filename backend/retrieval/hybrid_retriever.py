@@ -1,13 +1,249 @@
+import asyncio
 import logging
-from typing import List, Dict, Optional
-from .qa_chain import vector_search_tool
-from .conversational_logic import rephrase_question_with_history
-from config import FINAL_ANSWER_PROMPT
+import time
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from .qa_chain import vector_search, lexical_search
+from .fusion import reciprocal_rank_fusion
+from .graph_retriever import graph_search, format_graph_facts
+from .conversational_logic import rephrase_question_with_history, needs_rephrasing, is_equivalent_query
+from .context_builder import build_context
+from core.metrics import span, traced
+from core.llm_gateway import llm_gateway
+from config import (
+    FINAL_ANSWER_PROMPT,
+    VECTOR_SEARCH_TOP_K,
+    HYBRID_CANDIDATES,
+    LEXICAL_SEARCH_ENABLED,
+    GRAPH_RETRIEVAL_ENABLED,
+    SPECULATIVE_RETRIEVAL_ENABLED,
+    CONTEXT_BUILDER_ENABLED
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def get_answer(query: str, filenames: List[str], chat_history: Optional[List[Dict[str, str]]], chat_model, chroma_client, embedding_function) -> str:
+async def hybrid_search(query: str, filenames: List[str], chroma_client, embedding_function, k: int = VECTOR_SEARCH_TOP_K) -> List[dict]:
+    """
+    Menjalankan pencarian vektor dan pencarian leksikal BM25 secara konkuren lalu menggabungkannya.
+
+    Pencarian vektor unggul untuk kemiripan makna, sedangkan BM25 menangkap identifier
+    eksak yang sering terlewat oleh embedding. Kedua daftar kandidat digabung dengan
+    Reciprocal Rank Fusion. Kegagalan salah satu retriever tidak menggagalkan yang lain.
+
+    Args:
+        query (str): Kueri pencarian yang sudah diformulasi ulang.
+        filenames (List[str]): Daftar file yang menjadi target pencarian.
+        chroma_client: Instance client ChromaDB.
+        embedding_function: Fungsi embedding yang digunakan.
+        k (int): Jumlah hasil akhir setelah penggabungan.
+
+    Returns:
+        List[dict]: Hasil gabungan terurut berdasarkan skor RRF.
+    """
+    searches = [vector_search(query, filenames, chroma_client, embedding_function, k=HYBRID_CANDIDATES)]
+    if LEXICAL_SEARCH_ENABLED:
+        searches.append(lexical_search(query, filenames, k=HYBRID_CANDIDATES))
+
+    result_lists = []
+    for name, results in zip(("vektor", "leksikal"), await asyncio.gather(*searches, return_exceptions=True)):
+        if isinstance(results, Exception):
+            logger.error(f"Pencarian {name} gagal: {results}", exc_info=results)
+            continue
+        logger.info(f"Pencarian {name} menemukan {len(results)} kandidat.")
+        result_lists.append(results)
+
+    return reciprocal_rank_fusion(result_lists, limit=k)
+
+async def retrieve_context(query: str, filenames: List[str], chroma_client, embedding_function, neo4j_driver=None) -> dict:
+    """
+    Mengumpulkan konteks untuk jawaban akhir dari pencarian hybrid dan knowledge graph.
+
+    Pencarian teks (vektor + BM25) dan graph retrieval dijalankan paralel dengan
+    `asyncio.gather`, sehingga fakta graf tidak menambah latensi serial.
+
+    Args:
+        query (str): Kueri yang sudah diformulasi ulang.
+        filenames (List[str]): Daftar file yang menjadi target pencarian.
+        chroma_client: Instance client ChromaDB.
+        embedding_function: Fungsi embedding yang digunakan.
+        neo4j_driver: Instance driver Neo4j. Jika `None`, graph retrieval dilewati.
+
+    Returns:
+        dict: `{"hits": List[dict], "graph_facts": List[tuple], "context": str}`, ditambah
+            `context_report` jika penyusun konteks aktif.
+    """
+    searches = [hybrid_search(query, filenames, chroma_client, embedding_function)]
+    if GRAPH_RETRIEVAL_ENABLED and neo4j_driver is not None:
+        searches.append(traced("graph_search", graph_search(query, filenames, neo4j_driver)))
+
+    results = await asyncio.gather(*searches, return_exceptions=True)
+    hits = results[0]
+    if isinstance(hits, Exception):
+        logger.error(f"Pencarian hybrid gagal: {hits}", exc_info=hits)
+        hits = []
+    graph_facts = results[1] if len(results) > 1 else []
+    if isinstance(graph_facts, Exception):
+        logger.error(f"Graph retrieval gagal: {graph_facts}", exc_info=graph_facts)
+        graph_facts = []
+
+    return build_retrieval(hits, graph_facts)
+
+def build_retrieval(hits: List[dict], graph_facts: List[tuple]) -> dict:
+    """
+    Menyusun hasil retrieval dan teks konteks dari hit pencarian dan fakta graf.
+
+    Jika `CONTEXT_BUILDER_ENABLED` aktif, konteks disusun oleh `build_context` (penggabungan
+    chunk bersambung, deduplikasi fakta, seleksi MMR, dan anggaran token).
+    """
+    if CONTEXT_BUILDER_ENABLED and hits:
+        with span("context_build"):
+            built = build_context(hits, graph_facts)
+        report = built["report"]
+        logger.info(
+            f"Konteks disusun: {report['context_tokens']} dari {report['original_tokens']} token, "
+            f"{report['passages']} potongan ({report['merged_passages']} digabung, {report['dropped_passages']} dibuang), "
+            f"{report['duplicate_facts']} fakta duplikat dihapus."
+        )
+        return {"hits": hits, "graph_facts": graph_facts, "context": built["context"], "context_report": report}
+
+    context = "\n\n".join(hit["document"] for hit in hits)
+    if graph_facts:
+        context += f"\n\n[Fakta dari Knowledge Graph]:\n{format_graph_facts(graph_facts)}"
+    return {"hits": hits, "graph_facts": graph_facts, "context": context.strip()}
+
+NO_CONTEXT_ANSWER = "Maaf, saya tidak dapat menemukan informasi yang relevan dengan pertanyaan Anda di dalam dokumen yang tersedia."
+_GENERATION_ERROR_ANSWER = "Mohon maaf, terjadi kesalahan internal saat saya mencoba merumuskan jawaban."
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+class SpeculationStats:
+    """
+    Penghitung hasil retrieval spekulatif untuk setiap giliran percakapan lanjutan.
+
+    Outcome yang dicatat:
+    - `skipped`: formulasi ulang dilewati karena heuristik menilai pertanyaan sudah mandiri.
+    - `hit`: hasil retrieval spekulatif dipakai karena kueri hasil formulasi ulang setara.
+    - `miss`: hasil spekulatif dibuang dan retrieval diulang dengan kueri baru.
+    """
+
+    OUTCOMES = ("skipped", "hit", "miss")
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.OUTCOMES, 0)
+
+    def record(self, outcome: str):
+        self.counts[outcome] += 1
+
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        return {
+            **self.counts,
+            "total": total,
+            # Proporsi giliran yang tidak menunggu LLM formulasi ulang sebelum retrieval.
+            "speculative_rate": (self.counts["skipped"] + self.counts["hit"]) / total if total else 0.0
+        }
+
+speculation_stats = SpeculationStats()
+
+def _consume_task_result(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Retrieval spekulatif yang dibuang gagal: {task.exception()}")
+
+def _discard_task(task: asyncio.Task):
+    """
+    Membatalkan task yang hasilnya tidak lagi dibutuhkan tanpa menunggunya selesai.
+
+    Exception-nya (jika task sempat gagal sebelum dibatalkan) tetap diambil lewat callback,
+    sehingga asyncio tidak mencatat "Task exception was never retrieved".
+    """
+    task.cancel()
+    task.add_done_callback(_consume_task_result)
+
+async def _rephrase_and_retrieve(query: str, filenames: List[str], chat_history, chat_model, chroma_client, embedding_function, neo4j_driver, timings: dict, conversation_id: Optional[str] = None) -> Tuple[str, dict]:
+    """
+    Menjalankan formulasi ulang dan retrieval, secara spekulatif jika diaktifkan.
+
+    Tanpa mode spekulatif, kedua langkah berjalan serial. Dengan mode spekulatif, formulasi
+    ulang dilewati jika `needs_rephrasing` menilainya tidak perlu; jika perlu, retrieval
+    dengan kueri asli dijalankan paralel dengan panggilan LLM formulasi ulang, dan hasilnya
+    hanya dipakai bila kueri baru setara dengan kueri asli.
+
+    Returns:
+        Tuple[str, dict]: Kueri final dan hasil `retrieve_context`.
+    """
+    started = time.perf_counter()
+    if not (SPECULATIVE_RETRIEVAL_ENABLED and chat_history):
+        rephrased_query = await rephrase_question_with_history(query, chat_history, chat_model, conversation_id)
+        timings["rephrase_ms"] = _elapsed_ms(started)
+        if rephrased_query.lower() != query.lower():
+            logger.info(f"Pertanyaan diformulasi ulang menjadi: '{rephrased_query}'")
+        return rephrased_query, await retrieve_context(rephrased_query, filenames, chroma_client, embedding_function, neo4j_driver)
+
+    if not needs_rephrasing(query, chat_history):
+        logger.info("Pertanyaan dinilai sudah mandiri, formulasi ulang dilewati.")
+        speculation_stats.record("skipped")
+        timings["speculation"] = "skipped"
+        return query, await retrieve_context(query, filenames, chroma_client, embedding_function, neo4j_driver)
+
+    speculative = asyncio.create_task(retrieve_context(query, filenames, chroma_client, embedding_function, neo4j_driver))
+    try:
+        rephrased_query = await rephrase_question_with_history(query, chat_history, chat_model, conversation_id)
+    except BaseException:
+        _discard_task(speculative)
+        raise
+    timings["rephrase_ms"] = _elapsed_ms(started)
+
+    if is_equivalent_query(query, rephrased_query):
+        logger.info("Kueri hasil formulasi ulang setara dengan kueri asli, hasil retrieval spekulatif dipakai.")
+        speculation_stats.record("hit")
+        timings["speculation"] = "hit"
+        return rephrased_query, await speculative
+
+    logger.info(f"Pertanyaan diformulasi ulang menjadi: '{rephrased_query}'. Retrieval spekulatif dibuang.")
+    _discard_task(speculative)
+    speculation_stats.record("miss")
+    timings["speculation"] = "miss"
+    return rephrased_query, await retrieve_context(rephrased_query, filenames, chroma_client, embedding_function, neo4j_driver)
+
+async def prepare_answer(query: str, filenames: List[str], chat_history: Optional[List[Dict[str, str]]], chat_model, chroma_client, embedding_function, neo4j_driver=None, conversation_id: Optional[str] = None) -> dict:
+    """
+    Menjalankan langkah formulasi ulang dan pengambilan konteks, lalu menyusun prompt akhir.
+
+    Dipakai bersama oleh `get_answer` dan `stream_answer`, sehingga keduanya menghasilkan
+    prompt yang identik.
+
+    Returns:
+        dict: `{"rephrased_query", "hits", "graph_facts", "prompt", "timings"}`. `prompt`
+            bernilai `None` jika tidak ada konteks yang ditemukan.
+    """
+    logger.info(f"Memulai alur RAG untuk kueri: '{query}' pada file: {filenames}")
+    timings = {}
+
+    started = time.perf_counter()
+    rephrased_query, retrieval = await _rephrase_and_retrieve(
+        query, filenames, chat_history, chat_model, chroma_client, embedding_function, neo4j_driver, timings, conversation_id
+    )
+    # Waktu hingga konteks siap (formulasi ulang + retrieval, yang bisa saling tumpang tindih).
+    timings["context_ms"] = _elapsed_ms(started)
+
+    context = retrieval["context"]
+    prompt = None
+    if context:
+        logger.info(f"Berhasil mengambil konteks yang diperkaya. Panjang: {len(context)} karakter.")
+        prompt = FINAL_ANSWER_PROMPT.format(context=context, rephrased_query=rephrased_query)
+    else:
+        logger.warning(f"Pencarian konteks untuk '{rephrased_query}' tidak menemukan konteks.")
+
+    return {
+        "rephrased_query": rephrased_query,
+        "hits": retrieval["hits"],
+        "graph_facts": retrieval["graph_facts"],
+        "prompt": prompt,
+        "timings": timings
+    }
+
+async def get_answer(query: str, filenames: List[str], chat_history: Optional[List[Dict[str, str]]], chat_model, chroma_client, embedding_function, neo4j_driver=None, conversation_id: Optional[str] = None) -> str:
     """
     Mengorkestrasi alur RAG (Retrieval-Augmented Generation) untuk menghasilkan jawaban.
 
@@ -15,9 +251,11 @@ async def get_answer(query: str, filenames: List[str], chat_history: Optional[Li
     1.  **Formulasi Ulang (Rephrase):** Jika ada riwayat percakapan, pertanyaan pengguna
         difokuskan ulang menjadi pertanyaan mandiri yang mengandung semua konteks relevan.
         Ini krusial untuk menangani pertanyaan lanjutan (e.g., "bagaimana dengan dia?").
+        Dalam mode spekulatif, langkah ini dilewati atau dijalankan paralel dengan retrieval.
     2.  **Pengambilan (Retrieve):** Mengambil konteks yang relevan dari dokumen yang dipilih
-        menggunakan pencarian vektor. Konteks ini sudah diperkaya dengan informasi dari
-        knowledge graph pada tahap ingesti.
+        menggunakan pencarian hybrid (vektor + BM25 yang digabung dengan RRF). Konteks ini
+        sudah diperkaya dengan informasi dari knowledge graph pada tahap ingesti, dan
+        dilengkapi fakta multi-hop dari Neo4j yang diambil secara paralel.
     3.  **Pembangkitan (Generate):** Menghasilkan jawaban akhir menggunakan LLM berdasarkan
         pertanyaan yang telah diformulasi ulang dan konteks yang kaya.
 
@@ -28,29 +266,77 @@ async def get_answer(query: str, filenames: List[str], chat_history: Optional[Li
         chat_model: Instance model bahasa generatif.
         chroma_client: Instance client ChromaDB.
         embedding_function: Fungsi embedding yang digunakan.
+        neo4j_driver: Instance driver Neo4j untuk graph retrieval (opsional).
+        conversation_id (Optional[str]): ID percakapan untuk ringkasan riwayat di server (opsional).
 
     Returns:
         str: Jawaban akhir yang dihasilkan oleh model, atau pesan error jika gagal.
     """
-    logger.info(f"Memulai alur RAG untuk kueri: '{query}' pada file: {filenames}")
-
-    rephrased_query = await rephrase_question_with_history(query, chat_history, chat_model)
-    if rephrased_query.lower() != query.lower():
-        logger.info(f"Pertanyaan diformulasi ulang menjadi: '{rephrased_query}'")
-    context = await vector_search_tool(rephrased_query, filenames, chroma_client, embedding_function)
-    if not context:
-        logger.warning(f"Pencarian vektor untuk '{rephrased_query}' tidak menemukan konteks.")
-        return "Maaf, saya tidak dapat menemukan informasi yang relevan dengan pertanyaan Anda di dalam dokumen yang tersedia."
-
-    logger.info(f"Berhasil mengambil konteks yang diperkaya. Panjang: {len(context)} karakter.")
+    prepared = await prepare_answer(query, filenames, chat_history, chat_model, chroma_client, embedding_function, neo4j_driver, conversation_id)
+    if prepared["prompt"] is None:
+        return NO_CONTEXT_ANSWER
 
     logger.info("Menghasilkan jawaban akhir dari konteks yang diperkaya...")
-    final_prompt = FINAL_ANSWER_PROMPT.format(context=context, rephrased_query=rephrased_query)
-
     try:
-        final_response = await chat_model.ainvoke(final_prompt)
+        with span("generation"):
+            final_response = await llm_gateway.ainvoke(chat_model, prepared["prompt"], purpose="answer")
         logger.info("Jawaban akhir berhasil dibuat.")
         return final_response.content
     except Exception as e:
         logger.error(f"Terjadi kesalahan saat pembuatan jawaban akhir: {e}", exc_info=True)
-        return "Mohon maaf, terjadi kesalahan internal saat saya mencoba merumuskan jawaban."
+        return _GENERATION_ERROR_ANSWER
+
+async def stream_answer(query: str, filenames: List[str], chat_history: Optional[List[Dict[str, str]]], chat_model, chroma_client, embedding_function, neo4j_driver=None, conversation_id: Optional[str] = None) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Versi streaming dari `get_answer` yang menghasilkan event secara bertahap.
+
+    Urutan event:
+    1.  `context`: kueri hasil formulasi ulang dan ID chunk sumber, dikirim segera setelah
+        retrieval selesai (sebelum LLM mulai menjawab).
+    2.  `token`: potongan teks jawaban dari `chat_model.astream`, satu event per potongan.
+    3.  `done`: metadata waktu per tahap, termasuk waktu hingga token pertama.
+    Jika pembangkitan gagal di tengah jalan, event `error` dikirim sebelum `done`.
+
+    Args:
+        Sama seperti `get_answer`.
+
+    Yields:
+        Tuple[str, dict]: Pasangan `(nama_event, data)`.
+    """
+    started = time.perf_counter()
+    prepared = await prepare_answer(query, filenames, chat_history, chat_model, chroma_client, embedding_function, neo4j_driver, conversation_id)
+    timings = prepared["timings"]
+
+    yield "context", {
+        "rephrased_query": prepared["rephrased_query"],
+        "sources": [
+            {"id": hit["id"], "source_document": (hit.get("metadata") or {}).get("source_document")}
+            for hit in prepared["hits"]
+        ],
+        "graph_facts": len(prepared["graph_facts"])
+    }
+
+    if prepared["prompt"] is None:
+        yield "token", {"text": NO_CONTEXT_ANSWER}
+    else:
+        logger.info("Menghasilkan jawaban akhir (streaming) dari konteks yang diperkaya...")
+        generation_started = time.perf_counter()
+        try:
+            with span("generation"):
+                async for chunk in llm_gateway.astream(chat_model, prepared["prompt"], purpose="answer"):
+                    text = chunk.content if isinstance(chunk.content, str) else "".join(
+                        part.get("text", "") if isinstance(part, dict) else str(part) for part in chunk.content
+                    )
+                    if not text:
+                        continue
+                    if "time_to_first_token_ms" not in timings:
+                        timings["time_to_first_token_ms"] = _elapsed_ms(started)
+                    yield "token", {"text": text}
+            logger.info("Jawaban akhir (streaming) berhasil dibuat.")
+        except Exception as e:
+            logger.error(f"Terjadi kesalahan saat streaming jawaban akhir: {e}", exc_info=True)
+            yield "error", {"message": _GENERATION_ERROR_ANSWER}
+        timings["generation_ms"] = _elapsed_ms(generation_started)
+
+    timings["total_ms"] = _elapsed_ms(started)
+    yield "done", {"timings": timings}
@@ -1,10 +1,153 @@
+import asyncio
 import logging
 from typing import List
-from config import CHROMA_COLLECTION_NAME
+from config import VECTOR_SEARCH_TOP_K, RETRIEVAL_CACHE_ENABLED
+from core.embedding_service import embed_texts, QUERY_PRIORITY, INGESTION_PRIORITY
+from core.vector_store import query_documents
+from core.lexical_index import lexical_index
+from core.metrics import span
+from .retrieval_cache import retrieval_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+async def _embed_query(query: str, embedding_function):
+    """Mengambil embedding kueri dari cache, atau menghitungnya dengan prioritas kueri."""
+    if RETRIEVAL_CACHE_ENABLED:
+        cached = retrieval_cache.get_embedding(query)
+        if cached is not None:
+            return cached
+
+    # Embedding kueri dihitung melalui layanan embedding dengan prioritas kueri,
+    # sehingga tidak mengantre di belakang embedding dari proses ingesti.
+    with span("query_embedding"):
+        embedding = (await embed_texts(embedding_function, [query], priority=QUERY_PRIORITY))[0]
+    if RETRIEVAL_CACHE_ENABLED:
+        retrieval_cache.set_embedding(query, embedding)
+    return embedding
+
+async def vector_search(query: str, filenames: List[str], chroma_client, embedding_function, k: int = VECTOR_SEARCH_TOP_K) -> List[dict]:
+    """
+    Melakukan pencarian vektor di ChromaDB dan mengembalikan hasil terstruktur.
+
+    Embedding kueri dan hasil pencarian di-cache (lihat `retrieval_cache`), sehingga kueri
+    populer melewati forward pass model embedding maupun pencarian HNSW. Pencarian hanya
+    menyentuh partisi dokumen yang dipilih (lihat `core.vector_store.query_documents`).
+
+    Args:
+        query (str): Pertanyaan atau kueri pencarian yang sudah diformulasi ulang.
+        filenames (List[str]): Daftar nama file yang menjadi target pencarian.
+        chroma_client: Instance client ChromaDB.
+        embedding_function: Fungsi embedding yang digunakan.
+        k (int): Jumlah hasil teratas yang diambil.
+
+    Returns:
+        List[dict]: Hasil berurutan berdasarkan kemiripan, masing-masing berisi `id`,
+            `document`, `metadata`, dan `distance`.
+    """
+    embedding = await _embed_query(query, embedding_function)
+
+    cache_key = versions = None
+    if RETRIEVAL_CACHE_ENABLED:
+        cache_key = retrieval_cache.result_key(embedding, filenames, k)
+        versions = await asyncio.to_thread(retrieval_cache.document_versions, filenames)
+        cached_results = retrieval_cache.get_results(cache_key, versions)
+        if cached_results is not None:
+            logger.info("Hasil pencarian vektor diambil dari cache.")
+            return cached_results
+
+    with span("vector_search"):
+        hits = (await query_documents(chroma_client, embedding_function, [embedding], filenames, k))[0]
+
+    if cache_key is not None:
+        retrieval_cache.set_results(cache_key, hits, versions)
+    return hits
+
+async def vector_search_many(queries: List[str], filename_sets: List[List[str]], chroma_client, embedding_function, k: int = VECTOR_SEARCH_TOP_K, priority: int = INGESTION_PRIORITY) -> List[List[dict]]:
+    """
+    Versi batch dari `vector_search` untuk banyak kueri sekaligus.
+
+    Seluruh kueri yang embedding-nya belum ada di cache di-embed dalam satu panggilan
+    (satu forward pass per micro-batch), lalu kueri yang hasilnya belum ada di cache
+    dikelompokkan berdasarkan daftar file sehingga setiap partisi dokumen dalam kelompok
+    cukup dikueri sekali dengan banyak `query_embeddings`.
+
+    Args:
+        queries (List[str]): Kueri pencarian.
+        filename_sets (List[List[str]]): Daftar file target untuk masing-masing kueri.
+        chroma_client: Instance client ChromaDB.
+        embedding_function: Fungsi embedding yang digunakan.
+        k (int): Jumlah hasil teratas per kueri.
+        priority (int): Prioritas embedding. Default-nya prioritas ingesti agar beban batch
+            tidak menyerobot kueri interaktif.
+
+    Returns:
+        List[List[dict]]: Hasil per kueri, dengan urutan yang sama seperti `queries`. Jika
+            pencarian sebuah kelompok dokumen gagal, kueri di kelompok itu berisi exception-nya
+            sehingga kelompok lain tetap mendapat hasil.
+    """
+    embeddings = [retrieval_cache.get_embedding(query) if RETRIEVAL_CACHE_ENABLED else None for query in queries]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        unique_queries = list(dict.fromkeys(queries[i] for i in missing))
+        with span("query_embedding"):
+            computed = dict(zip(unique_queries, await embed_texts(embedding_function, unique_queries, priority=priority)))
+        for i in missing:
+            embeddings[i] = computed[queries[i]]
+        if RETRIEVAL_CACHE_ENABLED:
+            for query, embedding in computed.items():
+                retrieval_cache.set_embedding(query, embedding)
+
+    results: List[List[dict]] = [None] * len(queries)
+    cache_keys = [None] * len(queries)
+    versions = {}
+    if RETRIEVAL_CACHE_ENABLED:
+        file_groups = {tuple(sorted(set(filenames))) for filenames in filename_sets}
+        versions = await asyncio.to_thread(lambda: {group: retrieval_cache.document_versions(group) for group in file_groups})
+    groups = {}
+    for i, (embedding, filenames) in enumerate(zip(embeddings, filename_sets)):
+        if RETRIEVAL_CACHE_ENABLED:
+            cache_keys[i] = retrieval_cache.result_key(embedding, filenames, k)
+            cached = retrieval_cache.get_results(cache_keys[i], versions[tuple(sorted(set(filenames)))])
+            if cached is not None:
+                results[i] = cached
+                continue
+        groups.setdefault(tuple(sorted(set(filenames))), []).append(i)
+
+    if groups:
+        async def query_group(filenames: tuple, indices: List[int]):
+            group_hits = await query_documents(chroma_client, embedding_function, [embeddings[i] for i in indices], filenames, k)
+            for position, i in enumerate(indices):
+                results[i] = group_hits[position]
+                if cache_keys[i] is not None:
+                    retrieval_cache.set_results(cache_keys[i], results[i], versions[filenames])
+
+        with span("vector_search"):
+            outcomes = await asyncio.gather(*(query_group(filenames, indices) for filenames, indices in groups.items()), return_exceptions=True)
+        for (filenames, indices), outcome in zip(groups.items(), outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Pencarian vektor untuk dokumen {list(filenames)} gagal: {outcome}", exc_info=outcome)
+                for i in indices:
+                    results[i] = outcome
+        logger.info(f"Pencarian vektor batch: {len(queries)} kueri, {len(missing)} di-embed, {len(groups)} kelompok dokumen.")
+    return results
+
+async def lexical_search(query: str, filenames: List[str], k: int = VECTOR_SEARCH_TOP_K) -> List[dict]:
+    """
+    Melakukan pencarian leksikal BM25 pada indeks FTS5, dibatasi pada dokumen yang dipilih.
+
+    Args:
+        query (str): Kueri pencarian.
+        filenames (List[str]): Daftar nama file yang menjadi target pencarian.
+        k (int): Jumlah hasil teratas yang diambil.
+
+    Returns:
+        List[dict]: Hasil berurutan berdasarkan skor BM25, masing-masing berisi `id`,
+            `document`, `metadata`, dan `score`.
+    """
+    with span("lexical_search"):
+        return await asyncio.to_thread(lexical_index.search, query, filenames, k)
+
 async def vector_search_tool(query: str, filenames: List[str], chroma_client, embedding_function) -> str:
     """
     Melakukan pencarian vektor di ChromaDB untuk mengambil potongan teks relevan.
@@ -26,29 +169,16 @@ async def vector_search_tool(query: str, filenames: List[str], chroma_client, em
     """
     logger.info(f"Menjalankan pencarian vektor untuk kueri: '{query}'")
     logger.info(f"Pencarian dibatasi pada file: {filenames}")
-    
+
     try:
-        # Mengambil atau membuat koleksi di ChromaDB.
-        chroma_collection = chroma_client.get_or_create_collection(
-            name=CHROMA_COLLECTION_NAME,
-            embedding_function=embedding_function,
-            metadata={"hnsw:space": "cosine"} 
-        )
-
-        # Melakukan kueri dengan filter 'where' untuk membatasi pencarian
-        # hanya pada dokumen yang metadatanya cocok dengan 'filenames'.
-        results = chroma_collection.query(
-            query_texts=[query], 
-            n_results=5, # Mengambil 5 hasil teratas
-            where={"source_document": {"$in": filenames}}
-        )
-        
-        if not results or not results["documents"] or not results["documents"][0]:
+        hits = await vector_search(query, filenames, chroma_client, embedding_function)
+
+        if not hits:
             logger.warning("Pencarian vektor tidak menemukan dokumen yang cocok.")
             return ""
-            
+
         # Menggabungkan semua potongan dokumen yang ditemukan menjadi satu konteks besar.
-        vector_context = "\n\n".join(results["documents"][0])
+        vector_context = "\n\n".join(hit["document"] for hit in hits)
         logger.info(f"Pencarian vektor selesai. Panjang konteks: {len(vector_context)} karakter.")
         return vector_context
     except Exception as e:
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import struct
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from core.cache import TTLCache
+from .graph_cache import document_version
+from config import (
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    RETRIEVAL_CACHE_MAX_QUERIES,
+    RETRIEVAL_CACHE_MAX_RESULTS
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Menormalkan teks kueri (huruf kecil, spasi diringkas) sebagai kunci cache embedding."""
+    return " ".join(query.casefold().split())
+
+
+def _embedding_digest(embedding) -> str:
+    """Menghitung digest dari vektor embedding (list maupun array NumPy)."""
+    values = [float(value) for value in embedding]
+    return hashlib.sha1(struct.pack(f"{len(values)}f", *values)).hexdigest()
+
+
+def _copy_hit(hit: dict) -> dict:
+    """Menyalin satu hit beserta metadata-nya agar perubahan oleh pemanggil tidak mengubah isi cache."""
+    copied = dict(hit)
+    if isinstance(copied.get("metadata"), dict):
+        copied["metadata"] = dict(copied["metadata"])
+    return copied
+
+
+class RetrievalCache:
+    """
+    Cache dua tingkat untuk pencarian vektor.
+
+    1. Teks kueri yang dinormalkan -> embedding kueri (melewati forward pass model).
+    2. (digest embedding, daftar file terurut, k) -> hasil pencarian (melewati pencarian HNSW).
+
+    Setiap entri hasil dicatat pada indeks per dokumen, sehingga seluruh hasil yang
+    melibatkan sebuah dokumen dapat dibuang ketika dokumen tersebut diindeks ulang atau dihapus.
+    Selain itu setiap entri menyimpan versi manifest dokumen-dokumennya (`document_versions`,
+    dibaca sebelum pencarian dimulai) dan hanya dipakai selama versinya masih sama. Dengan
+    begitu ingesti ulang di proses mana pun, maupun pencarian yang sedang berjalan saat
+    dokumen diindeks ulang, tidak menghasilkan hit lama.
+    Hasil disimpan sebagai salinan dan dikembalikan sebagai salinan baru, sehingga pemanggil
+    bebas mengubah hit (misalnya saat fusion atau penyusunan konteks).
+    """
+
+    def __init__(self, ttl_seconds: float = RETRIEVAL_CACHE_TTL_SECONDS, max_queries: int = RETRIEVAL_CACHE_MAX_QUERIES, max_results: int = RETRIEVAL_CACHE_MAX_RESULTS):
+        self._lock = threading.RLock()
+        self._keys_by_document = {}
+        self.embeddings = TTLCache(max_queries, ttl_seconds)
+        self.results = TTLCache(max_results, ttl_seconds, on_evict=self._forget_result_key, lock=self._lock)
+
+    def _forget_result_key(self, key: Tuple, _value):
+        with self._lock:
+            for filename in key[1]:
+                keys = self._keys_by_document.get(filename)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys_by_document[filename]
+
+    def get_embedding(self, query: str):
+        """Mengambil embedding kueri dari cache, atau `None` jika belum ada."""
+        return self.embeddings.get(normalize_query(query))
+
+    def set_embedding(self, query: str, embedding):
+        """Menyimpan embedding untuk teks kueri."""
+        self.embeddings.set(normalize_query(query), embedding)
+
+    @staticmethod
+    def result_key(embedding, filenames: Iterable[str], k: int) -> Tuple:
+        """Menyusun kunci cache hasil dari embedding kueri, daftar file, dan jumlah hasil."""
+        return _embedding_digest(embedding), tuple(sorted(set(filenames))), k
+
+    @staticmethod
+    def document_versions(filenames: Iterable[str]) -> Tuple:
+        """Membaca versi manifest (lihat `graph_cache.document_version`) setiap dokumen, terurut seperti kunci hasil."""
+        return tuple(document_version(filename) for filename in sorted(set(filenames)))
+
+    def get_results(self, key: Tuple, versions: Optional[Tuple] = None) -> Optional[List[dict]]:
+        """
+        Mengambil salinan hasil pencarian untuk kunci tertentu, atau `None` jika tidak ada
+        atau jika versi dokumennya berbeda dari `versions`.
+        """
+        cached = self.results.get(key)
+        if cached is None:
+            return None
+        cached_versions, hits = cached
+        if versions is not None and versions != cached_versions:
+            return None
+        return [_copy_hit(hit) for hit in hits]
+
+    def set_results(self, key: Tuple, results: List[dict], versions: Optional[Tuple] = None):
+        """
+        Menyimpan hasil pencarian dan mendaftarkannya pada indeks per dokumen.
+
+        `versions` harus dibaca sebelum pencarian dijalankan, agar hasil dari pencarian yang
+        tumpang tindih dengan indeksasi ulang langsung dianggap kedaluwarsa.
+        """
+        with self._lock:
+            self.results.set(key, (versions, tuple(_copy_hit(hit) for hit in results)))
+            for filename in key[1]:
+                self._keys_by_document.setdefault(filename, set()).add(key)
+
+    def invalidate_document(self, filename: str):
+        """Membuang seluruh hasil pencarian yang melibatkan sebuah dokumen."""
+        with self._lock:
+            keys = list(self._keys_by_document.get(filename, ()))
+            for key in keys:
+                self.results.pop(key)
+        if keys:
+            logger.info(f"Cache retrieval: {len(keys)} hasil yang melibatkan '{filename}' dibuang.")
+
+    def stats(self) -> dict:
+        """Mengembalikan statistik hit/miss kedua tingkat cache."""
+        return {"query_embeddings": self.embeddings.stats(), "search_results": self.results.stats()}
+
+
+retrieval_cache = RetrievalCache()
@@ -0,0 +1,18 @@
+from retrieval.context_builder import merge_overlapping
+
+# Teks berulang: akhiran chunk pertama cocok dengan awalan chunk kedua pada beberapa panjang.
+TEXT = ("Proyek Atlas dipimpin oleh Rina. " * 40)[:1000]
+
+
+def test_chunk_bertetangga_digabung_pada_tumpang_tindih_terpanjang():
+    first, second = TEXT[:600], TEXT[400:1000]
+    merged = merge_overlapping([{"source": "a.pdf", "body": first}, {"source": "a.pdf", "body": second}])
+    assert len(merged) == 1
+    assert merged[0]["body"] == TEXT
+    assert len(merged[0]["body"]) == 1000
+    assert merged[0]["merged"] == 2
+
+
+def test_dokumen_berbeda_tidak_digabung():
+    merged = merge_overlapping([{"source": "a.pdf", "body": TEXT[:600]}, {"source": "b.pdf", "body": TEXT[400:]}])
+    assert len(merged) == 2
@@ -0,0 +1,28 @@
+import pytest
+
+from retrieval.conversational_logic import needs_rephrasing
+
+HISTORY = [
+    {"role": "user", "content": "Apa tujuan proyek Atlas?"},
+    {"role": "assistant", "content": "Proyek Atlas bertujuan membangun platform analitik data terpadu."},
+]
+
+
+@pytest.mark.parametrize("query", [
+    "Siapa ketua proyek itu?",
+    "Kapan proyek ini dimulai?",
+    "Bagaimana dengan proyek lain?",
+    "Berapa anggaran yang disebut tadi?",
+    "Apa hasil proyek sebelumnya?",
+    "Siapa yang memimpinnya?",
+])
+def test_rujukan_ke_riwayat_perlu_diformulasi_ulang(query):
+    assert needs_rephrasing(query, HISTORY)
+
+
+def test_pertanyaan_mandiri_tidak_diformulasi_ulang():
+    assert not needs_rephrasing("Siapa ketua proyek Atlas di divisi riset data?", HISTORY)
+
+
+def test_tanpa_riwayat_tidak_diformulasi_ulang():
+    assert not needs_rephrasing("Siapa ketua proyek itu?", [])
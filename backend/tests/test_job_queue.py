@@ -0,0 +1,163 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from config import JOB_LEASE_SECONDS
+from core.job_queue import JobQueue, QueueFullError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def _set(queue, job_id, **fields):
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    queue._connection().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_claim_mencatat_pemilik_dan_lease(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    claimed = queue.claim("queued", "running", "worker-1")
+    assert claimed["id"] == job["id"]
+    assert claimed["status"] == "running"
+    assert claimed["worker"] == "worker-1"
+    assert claimed["lease_expires_at"] > time.time()
+    assert queue.claim("queued", "running", "worker-2") is None
+
+
+def test_heartbeat_memperpanjang_lease_milik_proses_ini(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.claim("queued", "running", "worker-1")
+    _set(queue, job["id"], lease_expires_at=time.time() + 1)
+    assert queue.heartbeat(job["id"])
+    assert queue.get(job["id"])["lease_expires_at"] > time.time() + JOB_LEASE_SECONDS - 5
+
+
+def test_heartbeat_ditolak_setelah_job_dipulihkan(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.claim("queued", "running", "worker-1")
+    _set(queue, job["id"], lease_expires_at=time.time() - 1)
+    assert queue.recover() == 1
+    assert not queue.heartbeat(job["id"])
+
+
+def test_recover_tidak_menyentuh_job_yang_masih_hidup(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.claim("queued", "running", "worker-1")
+    assert queue.recover() == 0
+    assert queue.get(job["id"])["status"] == "running"
+
+
+def test_recover_lease_habis_menghitung_percobaan_tahap_berjalan(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.claim("queued", "running", "worker-1")
+    queue.start_stage(job["id"], "parse")
+    queue.finish_stage(job["id"], "parse", 1.0)
+    queue.start_stage(job["id"], "extract")
+    _set(queue, job["id"], lease_expires_at=time.time() - 1)
+
+    assert queue.recover() == 1
+    recovered = queue.get(job["id"])
+    assert recovered["status"] == "queued"
+    assert recovered["worker"] is None and recovered["lease_expires_at"] is None
+    assert recovered["stages"]["parse"]["status"] == "done"
+    assert recovered["stages"]["extract"]["status"] == "retrying"
+    assert recovered["stages"]["extract"]["attempts"] == 1
+
+
+def test_recover_proses_pemilik_mati(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.claim("queued", "running", "worker-1")
+    _set(queue, job["id"], worker_pid=_dead_pid())
+    assert queue.recover() == 1
+    assert queue.get(job["id"])["status"] == "queued"
+
+
+def test_recover_dead_pids_untuk_tahap_indeksasi(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.set_status(job["id"], "pending_index")
+    claimed = queue.claim("pending_index", "indexing", "api")
+    assert queue.recover(dead_pids=[claimed["worker_pid"]]) == 1
+    recovered = queue.get(job["id"])
+    assert recovered["status"] == "pending_index"
+    assert recovered["stages"]["index"]["attempts"] == 1
+
+
+def test_recover_setelah_seluruh_tahap_worker_selesai_tanpa_menghitung_percobaan(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.claim("queued", "running", "worker-1")
+    for stage in ("parse", "extract", "chunk"):
+        queue.finish_stage(job["id"], stage, 1.0)
+    _set(queue, job["id"], lease_expires_at=time.time() - 1)
+
+    assert queue.recover() == 1
+    recovered = queue.get(job["id"])
+    assert recovered["status"] == "pending_index"
+    assert all(state.get("attempts", 0) == 0 for state in recovered["stages"].values())
+
+
+def test_fail_stage_menunda_percobaan_ulang_lalu_gagal(queue):
+    job = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.claim("queued", "running", "worker-1")
+
+    assert queue.fail_stage(job["id"], "parse", "error 1", "queued", max_attempts=2)
+    retried = queue.get(job["id"])
+    assert retried["status"] == "queued"
+    assert retried["available_at"] > time.time()
+    assert retried["worker"] is None
+    # Job belum boleh diambil lagi sebelum backoff-nya lewat.
+    assert queue.claim("queued", "running", "worker-1") is None
+
+    _set(queue, job["id"], available_at=0)
+    queue.claim("queued", "running", "worker-1")
+    assert not queue.fail_stage(job["id"], "parse", "error 2", "queued", max_attempts=2)
+    failed = queue.get(job["id"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "error 2"
+    assert failed["stages"]["parse"]["attempts"] == 2
+
+
+def test_job_berikutnya_untuk_file_sama_menunggu_job_sebelumnya(queue):
+    first = queue.enqueue("a.pdf", "/tmp/a.pdf")
+    queue.enqueue("a.pdf", "/tmp/a.pdf")
+    other = queue.enqueue("b.pdf", "/tmp/b.pdf")
+    assert queue.claim("queued", "running", "w")["id"] == first["id"]
+    assert queue.claim("queued", "running", "w")["id"] == other["id"]
+    assert queue.claim("queued", "running", "w") is None
+
+
+def test_enqueue_changed_melewati_isi_identik(queue):
+    moved = []
+    (first, duplicate), = queue.enqueue_changed([("a.pdf", "/up/h1/a.pdf", "h1")], before_insert=moved.extend)
+    assert not duplicate and moved == [0]
+
+    scheduled = queue.enqueue_changed(
+        [("a.pdf", "/up/h1/a.pdf", "h1"), ("b.pdf", "/up/h2/b.pdf", "h2")], before_insert=moved.extend
+    )
+    assert scheduled[0] == (first, True)
+    assert not scheduled[1][1] and scheduled[1][0]["filename"] == "b.pdf"
+    assert moved == [0, 1]
+
+
+def test_enqueue_changed_mengulang_isi_identik_setelah_gagal(queue):
+    (job, _), = queue.enqueue_changed([("a.pdf", "/up/h1/a.pdf", "h1")])
+    queue.set_status(job["id"], "failed", "error")
+    (retried, duplicate), = queue.enqueue_changed([("a.pdf", "/up/h1/a.pdf", "h1")])
+    assert not duplicate and retried["id"] != job["id"]
+
+
+def test_enqueue_changed_antrean_penuh_tidak_memindahkan_file(queue):
+    moved = []
+    with pytest.raises(QueueFullError):
+        queue.enqueue_changed([("a.pdf", "/up/h1/a.pdf", "h1"), ("b.pdf", "/up/h2/b.pdf", "h2")],
+                              max_pending=1, before_insert=moved.extend)
+    assert moved == [] and queue.counts() == {}
@@ -3,7 +3,7 @@
 import { useState, useCallback } from 'react';
 import toast from 'react-hot-toast';
 import { useDropzone } from 'react-dropzone';
-import { uploadFile } from '@/lib/api';
+import { uploadFiles } from '@/lib/api';
 import { FileUp } from 'lucide-react';
 import { Document } from '@/app/page';
 
@@ -29,12 +29,12 @@ const FileUploader: React.FC<FileUploaderProps> = ({ setUploadedFiles }) => {
     const newFiles: Document[] = acceptedFiles.map(file => ({ name: file.name, status: 'processing' }));
     setUploadedFiles(prev => [...prev, ...newFiles]);
 
-    const uploadPromises = acceptedFiles.map(file => 
-      uploadFile(file, () => {}).then(
-        () => ({ name: file.name, status: 'completed' as const }),
-        (error) => ({ name: file.name, status: 'error' as const, error })
-      )
+    // All files go in one request so the backend can enqueue them together.
+    const batch: Promise<UploadResult[]> = uploadFiles(acceptedFiles).then(
+      () => acceptedFiles.map(file => ({ name: file.name, status: 'completed' as const })),
+      (error) => acceptedFiles.map(file => ({ name: file.name, status: 'error' as const, error }))
     );
+    const uploadPromises = acceptedFiles.map((_, index) => batch.then(results => results[index]));
 
     toast.promise(
       Promise.allSettled(uploadPromises).then(results => {
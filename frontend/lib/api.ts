@@ -33,6 +33,37 @@ export const uploadFile = async (file: File, onProgress: (progress: number) => v
   return response.json();
 };
 
+export interface UploadResult {
+  filename: string;
+  job_id: string;
+  status: string;
+  duplicate: boolean;
+  message: string;
+}
+
+/**
+ * Uploads several files in a single request; the backend enqueues them together.
+ * @param files The files to upload.
+ * @returns One result per file, in upload order.
+ */
+export const uploadFiles = async (files: File[]): Promise<UploadResult[]> => {
+  const formData = new FormData();
+  files.forEach(file => formData.append('files', file));
+
+  const response = await fetch(`${API_BASE_URL}/uploadfiles/`, {
+    method: 'POST',
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.detail || 'File upload failed');
+  }
+
+  const data = await response.json();
+  return data.files;
+};
+
 /**
  * Posts a query to the backend and returns the answer.
  * @param query The user's question.